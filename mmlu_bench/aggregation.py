@@ -0,0 +1,491 @@
+"""Report statistics aggregated chunk by chunk, out of core.
+
+``ResultsAggregator`` keeps only the counts, sums, minima and maxima the
+report needs per model and subset, plus a ``QuantileSketch`` per latency
+metric, so its memory does not grow with the number of samples.
+``stream_chunks`` feeds it from a run's ``results.jsonl`` streams a chunk
+of rows at a time, keeping only the columns the report reads, so a run
+can be reported without loading its results into one DataFrame.
+``result_chunks`` reads the rows with all their columns, in the order of
+the combined results files, so those are written the same way.
+"""
+
+import re
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .stats import accuracy_intervals, bootstrap_accuracies, bootstrap_intervals, percentile_intervals
+from .utils import RESULTS_STREAM
+
+GROUP_KEYS = ["model_name", "dataset_subset"]
+
+# Result columns the report reads; stream chunks keep only these
+REPORT_COLUMNS = [
+    "model_name", "dataset_subset", "sample_index", "top1_accuracy", "inference_time_s", "error",
+    "run_order", "cpu_mode", "latency_s", "ttft_s", "decode_time_per_token_s", "tokenize_time_s",
+    "input_tokens", "output_tokens", "response_cache_hit", "effective_shots", "num_shots",
+    "batch_rows", "oom_retries", "tuned_batch_size", "prefix_cache_hit", "prefill_tokens_saved",
+    "pipeline_model_stall_s", "pipeline_queue_depth"
+]
+
+# Report columns that hold labels or flags rather than numbers
+_NON_NUMERIC_COLUMNS = {"model_name", "dataset_subset", "error", "cpu_mode", "response_cache_hit", "prefix_cache_hit"}
+
+# Find a row's key without parsing the whole line; json.dumps escapes quotes
+# inside string values, so these only match the row's own fields
+_MODEL_NAME = re.compile(r'"model_name":\s*"((?:[^"\\]|\\.)*)"')
+_SAMPLE_INDEX = re.compile(r'"sample_index":\s*(-?\d+)')
+
+class QuantileSketch:
+    """Approximate quantiles of non-negative values in constant memory.
+
+    Values are counted in log-spaced bins, each 1% wider than the one
+    before, from 1 µs to about two days. A quantile is reported as the
+    geometric centre of its bin, so it is within 0.5% of the exact value,
+    and it is clipped to the smallest and largest value seen.
+    """
+
+    MIN_VALUE = 1e-6
+    GROWTH = 1.01
+    N_BINS = 2600
+
+    def __init__(self):
+        # Bin 0 counts values below MIN_VALUE, the last bin values beyond the range
+        self.counts = np.zeros(self.N_BINS + 2, dtype=np.int64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values: Any) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        scaled = np.maximum(values, self.MIN_VALUE) / self.MIN_VALUE
+        bins = np.floor(np.log(scaled) / np.log(self.GROWTH)).astype(np.int64) + 1
+        bins[values < self.MIN_VALUE] = 0
+        self.counts += np.bincount(np.minimum(bins, self.N_BINS + 1), minlength=self.N_BINS + 2)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def quantile(self, q: float) -> float:
+        """The value at rank ``q * (n - 1)``, as ``Series.quantile`` places it; NaN when empty."""
+        total = int(self.counts.sum())
+        if total == 0:
+            return float('nan')
+        position = int(np.searchsorted(np.cumsum(self.counts), q * (total - 1), side='right'))
+        value = self.MIN_VALUE * self.GROWTH ** (position - 0.5)
+        return min(max(value, self.min), self.max)
+
+class _StreamIndex(NamedTuple):
+    """Where each complete row of a results stream starts, and its key."""
+    offsets: np.ndarray
+    # Code of each row's model in ``model_names``, -1 for rows without a key
+    models: np.ndarray
+    samples: np.ndarray
+    model_names: List[str]
+
+def _complete_lines(path: Path) -> Iterator[Tuple[int, str]]:
+    """Byte offsets and text of the non-empty lines of a results stream, without a last line cut short by a crash."""
+    with open(path, 'rb') as f:
+        offset = 0
+        for raw in f:
+            line = raw.decode('utf-8').strip()
+            if line.endswith("}"):
+                yield offset, line
+            offset += len(raw)
+
+def _index_stream(path: Path) -> _StreamIndex:
+    """Indexes the rows of ``_complete_lines(path)`` without parsing them."""
+    model_codes = {}
+    # One compact offset and (model code, sample index) pair per row
+    offsets, models, samples = array('q'), array('q'), array('q')
+    for position, (offset, line) in enumerate(_complete_lines(path)):
+        offsets.append(offset)
+        model, sample = _MODEL_NAME.search(line), _SAMPLE_INDEX.search(line)
+        if model is None or sample is None:
+            # Never matches another row
+            models.append(-1)
+            samples.append(-1 - position)
+            continue
+        models.append(model_codes.setdefault(model.group(1), len(model_codes)))
+        samples.append(int(sample.group(1)))
+
+    return _StreamIndex(
+        np.frombuffer(offsets, dtype=np.int64),
+        np.frombuffer(models, dtype=np.int64),
+        np.frombuffer(samples, dtype=np.int64),
+        [json.loads(f'"{name}"') for name in model_codes]
+    )
+
+def _latest_rows(index: _StreamIndex) -> Optional[np.ndarray]:
+    """Mask over the rows of a stream ``index`` keeping the last row of each (model, sample index).
+
+    Rows are only repeated when a resumed run recomputes failed samples.
+    Returns None when nothing is repeated.
+    """
+    superseded = pd.DataFrame({'model': index.models, 'sample': index.samples}).duplicated(keep='last').to_numpy()
+    return ~superseded if superseded.any() else None
+
+def stream_chunks(run_dir: Path, subsets: List[str], chunk_rows: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Yields the latest result rows of a run's subset streams, ``chunk_rows`` at a time.
+
+    Chunks only hold ``REPORT_COLUMNS``; generated texts and prompts are
+    dropped as each line is parsed.
+    """
+    for subset in subsets:
+        path = Path(run_dir) / subset / RESULTS_STREAM
+        if not path.exists():
+            continue
+        keep = _latest_rows(_index_stream(path))
+        rows = []
+        for position, (_, line) in enumerate(_complete_lines(path)):
+            if keep is not None and not keep[position]:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            rows.append({column: row.get(column) for column in REPORT_COLUMNS})
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame(rows, columns=REPORT_COLUMNS)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+def result_columns(run_dir: Path, subsets: List[str]) -> List[str]:
+    """Every column of a run's result rows, in the order ``utils.load_streamed_results`` gives them."""
+    columns = {}
+    for subset in subsets:
+        path = Path(run_dir) / subset / RESULTS_STREAM
+        if not path.exists():
+            continue
+        for _, line in _complete_lines(path):
+            try:
+                columns.update(dict.fromkeys(json.loads(line)))
+            except json.JSONDecodeError:
+                continue
+    return list(columns)
+
+def result_chunks(
+    run_dir: Path,
+    subsets: List[str],
+    model_names: List[str],
+    chunk_rows: int = 50_000
+) -> Iterator[pd.DataFrame]:
+    """Yields the latest result rows of a run with all their columns, ``chunk_rows`` at a time.
+
+    Rows come in the order of ``utils.load_streamed_results``: by subset,
+    sample index and position of the model in ``model_names``. Only the row
+    keys are sorted in memory; the rows of each chunk are then read back by
+    their byte offsets.
+    """
+    model_order = {name: i for i, name in enumerate(model_names)}
+    for subset in subsets:
+        path = Path(run_dir) / subset / RESULTS_STREAM
+        if not path.exists():
+            continue
+        index = _index_stream(path)
+        keep = _latest_rows(index)
+        positions = np.arange(len(index.offsets)) if keep is None else np.flatnonzero(keep)
+        ranks = np.array([model_order.get(name, len(model_order)) for name in index.model_names] + [len(model_order)])
+        # np.lexsort is stable and sorts by its last key first
+        positions = positions[np.lexsort((ranks[index.models[positions]], index.samples[positions]))]
+
+        with open(path, 'rb') as f:
+            for start in range(0, len(positions), chunk_rows):
+                rows = []
+                for offset in index.offsets[positions[start:start + chunk_rows]]:
+                    f.seek(offset)
+                    try:
+                        rows.append(json.loads(f.readline()))
+                    except json.JSONDecodeError:
+                        continue
+                if rows:
+                    yield pd.DataFrame(rows)
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    return numerator / denominator.where(denominator > 0)
+
+class ResultsAggregator:
+    """Accumulates the report's per-model and per-subset statistics from chunks of result rows.
+
+    Chunks may come from ``stream_chunks`` or be slices of a results
+    DataFrame; together they must hold each (model, subset, sample index)
+    once. Each ``add`` folds a chunk into small per-group tables, and the
+    ``*_summary`` methods turn those into the report's tables.
+    """
+
+    def __init__(self, warmup_samples: int = 0):
+        self.warmup_samples = warmup_samples
+        self.n_rows = 0
+        # Subsets in the order they were first seen
+        self.subsets = {}
+        # Section name -> per-group partial aggregates
+        self.partials = {}
+        # (model, subset, cpu mode) -> {column: QuantileSketch}
+        self.sketches = {}
+
+    def _accumulate(self, section: str, partial: pd.DataFrame, combine: Any) -> None:
+        if partial.empty:
+            return
+        stored = self.partials.get(section)
+        if stored is not None:
+            levels = list(range(partial.index.nlevels))
+            partial = pd.concat([stored, partial]).groupby(level=levels).agg(combine)
+        self.partials[section] = partial
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """Folds a chunk of result rows into the aggregates."""
+        if chunk.empty:
+            return
+        # Columns a chunk lacks, or only holds nulls in, become NaN
+        chunk = chunk.reindex(columns=REPORT_COLUMNS).astype(
+            {column: float for column in REPORT_COLUMNS if column not in _NON_NUMERIC_COLUMNS}
+        )
+        self.n_rows += len(chunk)
+        self.subsets.update(dict.fromkeys(chunk['dataset_subset'].unique()))
+
+        scored = chunk[chunk['top1_accuracy'].notna()]
+        self._accumulate('accuracy', scored.assign(
+            inference_time_sq=scored['inference_time_s'] ** 2
+        ).groupby(GROUP_KEYS).agg(
+            n_samples=('top1_accuracy', 'count'),
+            correct=('top1_accuracy', 'sum'),
+            time_n=('inference_time_s', 'count'),
+            time_sum=('inference_time_s', 'sum'),
+            time_sq_sum=('inference_time_sq', 'sum')
+        ), 'sum')
+
+        self._add_latency(chunk)
+
+        fitted = chunk[chunk['effective_shots'] < chunk['num_shots']]
+        self._accumulate('effective_shots', fitted.groupby(GROUP_KEYS).agg(
+            n_samples=('effective_shots', 'count'),
+            shots_sum=('effective_shots', 'sum'),
+            min_effective_shots=('effective_shots', 'min')
+        ), {'n_samples': 'sum', 'shots_sum': 'sum', 'min_effective_shots': 'min'})
+
+        batched = chunk[chunk['batch_rows'].notna()]
+        self._accumulate('batch_sizes', batched.assign(split=batched['oom_retries'] > 0).groupby(GROUP_KEYS).agg(
+            n_samples=('batch_rows', 'count'),
+            rows_sum=('batch_rows', 'sum'),
+            max_batch_rows=('batch_rows', 'max'),
+            samples_split_by_oom=('split', 'sum'),
+            tuned_batch_size=('tuned_batch_size', 'max')
+        ), {'n_samples': 'sum', 'rows_sum': 'sum', 'max_batch_rows': 'max',
+            'samples_split_by_oom': 'sum', 'tuned_batch_size': 'max'})
+
+        cached = chunk[chunk['prefix_cache_hit'].notna()]
+        self._accumulate('prefix_cache', cached.assign(hit=cached['prefix_cache_hit'].astype(bool)).groupby("model_name").agg(
+            hits=('hit', 'sum'),
+            n_samples=('hit', 'count'),
+            prefill_tokens_saved=('prefill_tokens_saved', 'sum')
+        ), 'sum')
+
+        piped = chunk[chunk['pipeline_model_stall_s'].notna()]
+        self._accumulate('pipeline', piped.groupby(GROUP_KEYS).agg(
+            n_samples=('pipeline_model_stall_s', 'count'),
+            model_stall_s=('pipeline_model_stall_s', 'sum'),
+            inference_time_s=('inference_time_s', 'sum'),
+            depth_sum=('pipeline_queue_depth', 'sum'),
+            depth_n=('pipeline_queue_depth', 'count'),
+            max_queue_depth=('pipeline_queue_depth', 'max')
+        ), {'n_samples': 'sum', 'model_stall_s': 'sum', 'inference_time_s': 'sum',
+            'depth_sum': 'sum', 'depth_n': 'sum', 'max_queue_depth': 'max'})
+
+        responses = chunk[chunk['response_cache_hit'].notna()]
+        self._accumulate('response_cache', responses.assign(hit=responses['response_cache_hit'].astype(bool)).groupby("model_name").agg(
+            hits=('hit', 'sum'),
+            n_samples=('hit', 'count')
+        ), 'sum')
+
+    def _add_latency(self, chunk: pd.DataFrame) -> None:
+        """Latency of samples computed in this run: no response cache hits, errors or warm-up samples."""
+        timed = chunk[chunk['latency_s'].notna() & chunk['error'].isna()]
+        timed = timed[~timed['response_cache_hit'].fillna(False).astype(bool)]
+        if self.warmup_samples:
+            timed = timed[timed['run_order'] >= self.warmup_samples]
+        if timed.empty:
+            return
+
+        keys = GROUP_KEYS + ['cpu_mode']
+        timed = timed.assign(cpu_mode=timed['cpu_mode'].fillna(""))
+        grouped = timed.groupby(keys)
+        self._accumulate('latency', grouped.agg(
+            n_samples=('latency_s', 'count'),
+            decode_sum=('decode_time_per_token_s', 'sum'),
+            decode_n=('decode_time_per_token_s', 'count'),
+            tokenize_sum=('tokenize_time_s', 'sum'),
+            tokenize_n=('tokenize_time_s', 'count'),
+            input_tokens=('input_tokens', 'sum'),
+            output_tokens=('output_tokens', 'sum'),
+            inference_time_s=('inference_time_s', 'sum')
+        ), 'sum')
+
+        columns = {column: timed[column].to_numpy(dtype=float) for column in ('latency_s', 'ttft_s')}
+        for key, positions in grouped.indices.items():
+            sketches = self.sketches.setdefault(key, {column: QuantileSketch() for column in columns})
+            for column, values in columns.items():
+                sketches[column].add(values[positions])
+
+    def model_summary(self) -> Optional[pd.DataFrame]:
+        """Accuracy over all samples of each model, and the mean and standard deviation of its inference time."""
+        accuracy = self.partials.get('accuracy')
+        if accuracy is None:
+            return None
+        totals = accuracy.groupby(level="model_name").sum()
+        mean_time = _ratio(totals['time_sum'], totals['time_n'])
+        variance = _ratio(totals['time_sq_sum'] - totals['time_sum'] * mean_time, totals['time_n'] - 1)
+        return pd.DataFrame({
+            'avg_inference_time_s': mean_time,
+            'top1_accuracy': totals['correct'] / totals['n_samples'],
+            'std_dev_time': np.sqrt(variance.clip(lower=0)),
+            'n_samples': totals['n_samples']
+        }).reset_index()
+
+    def accuracy_summary(
+        self,
+        confidence: float = 0.95,
+        method: str = 'wilson',
+        seed: Optional[int] = None
+    ) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        """Accuracy with confidence intervals per model and subset, and per model across subsets.
+
+        The per-subset intervals use ``method``. Across subsets each model
+        gets its micro average (pooled over all samples) and macro average
+        (mean of its subset accuracies), both with percentile intervals from
+        one vectorized bootstrap that resamples every subset independently.
+        """
+        accuracy = self.partials.get('accuracy')
+        if accuracy is None:
+            return None, None
+        correct = accuracy['correct'].to_numpy()
+        totals = accuracy['n_samples'].to_numpy()
+        resamples = bootstrap_accuracies(correct, totals, seed=seed)
+
+        if method == 'bootstrap':
+            low, high = bootstrap_intervals(correct, totals, confidence, resamples)
+        else:
+            low, high = accuracy_intervals(correct, totals, confidence, method, seed)
+        per_subset = pd.DataFrame({
+            'n_samples': totals,
+            'top1_accuracy': correct / totals * 100,
+            'ci_low': low * 100,
+            'ci_high': high * 100,
+            'ci_half_width': (high - low) / 2 * 100
+        }, index=accuracy.index).reset_index()
+
+        rows = []
+        models = accuracy.index.get_level_values("model_name")
+        for model_name in models.unique():
+            columns = np.flatnonzero(models == model_name)
+            micro = resamples[:, columns] @ totals[columns] / totals[columns].sum()
+            macro = resamples[:, columns].mean(axis=1)
+            (micro_low, macro_low), (micro_high, macro_high) = percentile_intervals(np.column_stack([micro, macro]), confidence)
+            rows.append({
+                "model_name": model_name,
+                "n_subsets": len(columns),
+                "n_samples": int(totals[columns].sum()),
+                "micro_accuracy": correct[columns].sum() / totals[columns].sum() * 100,
+                "micro_ci_low": micro_low * 100,
+                "micro_ci_high": micro_high * 100,
+                "macro_accuracy": np.mean(correct[columns] / totals[columns]) * 100,
+                "macro_ci_low": macro_low * 100,
+                "macro_ci_high": macro_high * 100
+            })
+        return per_subset, pd.DataFrame(rows)
+
+    def latency_summary(self) -> Optional[pd.DataFrame]:
+        """Latency percentiles and token throughput per model and subset (and CPU mode, when recorded)."""
+        latency = self.partials.get('latency')
+        if latency is None:
+            return None
+        quantiles = pd.DataFrame([
+            {
+                'latency_p50_s': sketches['latency_s'].quantile(0.5),
+                'latency_p90_s': sketches['latency_s'].quantile(0.9),
+                'latency_p99_s': sketches['latency_s'].quantile(0.99),
+                'ttft_p50_s': sketches['ttft_s'].quantile(0.5),
+                'ttft_p99_s': sketches['ttft_s'].quantile(0.99)
+            }
+            for sketches in (self.sketches[key] for key in latency.index)
+        ], index=latency.index)
+
+        summary = pd.concat([latency[['n_samples']], quantiles], axis=1)
+        summary['decode_ms_per_token'] = _ratio(latency['decode_sum'], latency['decode_n']) * 1000
+        summary['tokenize_ms'] = _ratio(latency['tokenize_sum'], latency['tokenize_n']) * 1000
+        # Per-sample inference times are shares of their batch, so they sum to wall time
+        summary['input_tokens_per_s'] = _ratio(latency['input_tokens'], latency['inference_time_s'])
+        summary['output_tokens_per_s'] = _ratio(latency['output_tokens'], latency['inference_time_s'])
+        summary = summary.reset_index()
+        if (summary['cpu_mode'] == "").all():
+            summary = summary.drop(columns=['cpu_mode'])
+        return summary
+
+    def effective_shots_summary(self) -> Optional[pd.DataFrame]:
+        """Prompts that lost few-shot examples to fit the context window, per model and subset."""
+        shots = self.partials.get('effective_shots')
+        if shots is None:
+            return None
+        return pd.DataFrame({
+            'n_samples': shots['n_samples'],
+            'mean_effective_shots': shots['shots_sum'] / shots['n_samples'],
+            'min_effective_shots': shots['min_effective_shots'].astype(int)
+        }).reset_index()
+
+    def batch_size_summary(self) -> Optional[pd.DataFrame]:
+        """Batch sizes and out-of-memory splits per model and subset."""
+        batches = self.partials.get('batch_sizes')
+        if batches is None:
+            return None
+        summary = pd.DataFrame({
+            'n_samples': batches['n_samples'],
+            'mean_batch_rows': batches['rows_sum'] / batches['n_samples'],
+            'max_batch_rows': batches['max_batch_rows'].astype(int),
+            'samples_split_by_oom': batches['samples_split_by_oom'].astype(int)
+        })
+        if batches['tuned_batch_size'].notna().any():
+            summary['tuned_batch_size'] = batches['tuned_batch_size']
+        return summary.reset_index()
+
+    def prefix_cache_summary(self) -> Optional[pd.DataFrame]:
+        """Prefix KV cache hits, misses and prefill tokens saved per model."""
+        cache = self.partials.get('prefix_cache')
+        if cache is None:
+            return None
+        summary = cache.astype({'hits': int, 'prefill_tokens_saved': int}).reset_index()
+        summary.insert(2, 'misses', summary['n_samples'] - summary['hits'])
+        return summary
+
+    def pipeline_summary(self) -> Optional[pd.DataFrame]:
+        """Model stalls and pipeline queue depth per model and subset."""
+        pipeline = self.partials.get('pipeline')
+        if pipeline is None:
+            return None
+        summary = pipeline[['n_samples', 'model_stall_s', 'inference_time_s']].copy()
+        summary['mean_queue_depth'] = _ratio(pipeline['depth_sum'], pipeline['depth_n'])
+        summary['max_queue_depth'] = pipeline['max_queue_depth'].astype('Int64')
+        busy = summary['model_stall_s'] + summary['inference_time_s']
+        summary['model_stall_pct'] = _ratio(summary['model_stall_s'], busy) * 100
+        return summary.reset_index()
+
+    def response_cache_summary(self) -> Optional[pd.DataFrame]:
+        """Response cache hit rate per model."""
+        cache = self.partials.get('response_cache')
+        if cache is None:
+            return None
+        summary = cache.astype({'hits': int}).reset_index()
+        summary['hit_rate'] = summary['hits'] / summary['n_samples'] * 100
+        return summary
+
+def aggregate_results(chunks: Any, warmup_samples: int = 0) -> ResultsAggregator:
+    """Folds an iterable of result chunks (DataFrames) into a ``ResultsAggregator``."""
+    aggregator = ResultsAggregator(warmup_samples)
+    for chunk in chunks:
+        aggregator.add(chunk)
+    return aggregator
@@ -0,0 +1,181 @@
+"""Batch sizes that fit a memory budget (``hardware.memory_budget_gb``).
+
+``BatchTuner`` measures what a batch costs with two short trial forward
+passes (one and two rows of a subset's longest prompts) and derives how
+many rows fit the memory left under the budget. Measurements are kept per
+model dtype and sequence-length bucket, so subsets with similar prompt
+lengths reuse them. At run time an out-of-memory error halves the batch
+instead of failing it (see ``HFBackend.score``).
+
+Memory is measured with the CUDA allocator's peak statistics on GPU and
+with the process's resident set size on Linux CPUs; elsewhere batch sizes
+are not tuned. On CPU a trial's peak is the process's high-water mark
+(``VmHWM``) when the trial raises it, and otherwise the largest resident
+size sampled while it runs. The high-water mark is never reset, so the
+peak memory that ``ModelPool`` and ``--profile`` report stays the
+process's own. The CUDA statistics are reset for each trial with
+``utils.reset_peak_memory(keep_peak=True)``, which keeps the earlier peak
+for ``get_peak_memory_mb``.
+"""
+
+import gc
+import re
+import ctypes
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from .utils import reset_peak_memory
+
+# Part of the free budget that batches may use, leaving room for fragmentation and Python objects
+BUDGET_FILL = 0.8
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """Whether an exception means an allocation failed on the device or host."""
+    if isinstance(error, (torch.cuda.OutOfMemoryError, MemoryError)):
+        return True
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and ("out of memory" in message or "can't allocate memory" in message)
+
+def _malloc_trim() -> None:
+    """Hands freed heap memory back to the OS (glibc only), so resident memory reflects what is in use."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def release_memory(device: torch.device) -> None:
+    """Frees what a failed batch left behind."""
+    gc.collect()
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+    else:
+        _malloc_trim()
+
+def _proc_status_kb(field: str) -> int:
+    match = re.search(rf"^{field}:\s+(\d+) kB", Path("/proc/self/status").read_text(), re.MULTILINE)
+    return int(match.group(1))
+
+def can_measure(device: torch.device) -> bool:
+    """Whether peak memory can be read on this device."""
+    if device.type == "cuda":
+        return True
+    try:
+        _proc_status_kb("VmHWM")
+        _proc_status_kb("VmRSS")
+        return True
+    except (OSError, AttributeError):
+        return False
+
+def memory_in_use(device: torch.device) -> int:
+    """Bytes the process currently holds on ``device`` (resident memory on CPU)."""
+    if device.type == "cuda":
+        return torch.cuda.memory_allocated(device)
+    return _proc_status_kb("VmRSS") * 1024
+
+def _sampled_peak_kb(run: Any, interval_s: float = 0.0005) -> int:
+    """Largest resident size in kB seen while ``run()`` runs, sampled from a thread."""
+    peak = _proc_status_kb("VmRSS")
+    done = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak
+        while not done.wait(interval_s):
+            peak = max(peak, _proc_status_kb("VmRSS"))
+
+    sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        run()
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak, _proc_status_kb("VmRSS"))
+
+def _peak_of(run: Any, device: torch.device) -> int:
+    """Bytes ``run()`` allocated at its peak, above what was in use before it."""
+    release_memory(device)
+    before = memory_in_use(device)
+    if device.type == "cuda":
+        reset_peak_memory(device, keep_peak=True)
+        run()
+        torch.cuda.synchronize(device)
+        peak = torch.cuda.max_memory_allocated(device)
+    else:
+        high_water = _proc_status_kb("VmHWM")
+        peak_kb = _sampled_peak_kb(run)
+        # A new high-water mark is exact; below the old one only the samples are known
+        new_high_water = _proc_status_kb("VmHWM")
+        if new_high_water > high_water:
+            peak_kb = max(peak_kb, new_high_water)
+        peak = peak_kb * 1024
+    return max(peak - before, 0)
+
+class BatchTuner:
+    """Picks the largest batch of a model that fits ``hardware.memory_budget_gb``."""
+
+    def __init__(self, model: Any, tokenizer: Any, memory_budget_gb: float):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.budget_bytes = memory_budget_gb * 2**30
+        # (dtype, bucket length) -> bytes per row of that length
+        self.row_bytes = {}
+
+    def _measure_row_bytes(self, ids: List[int], length: int) -> int:
+        """Memory of one more row in a forward pass of ``length`` tokens, from trials with one and two rows."""
+        device = self.model.device
+        ids = (ids + [self.tokenizer.pad_token_id] * length)[:length]
+
+        def trial(rows: int) -> Any:
+            input_ids = torch.tensor([ids] * rows, device=device)
+            return lambda: self.model(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), use_cache=True)
+
+        with torch.no_grad():
+            one_row = _peak_of(trial(1), device)
+            two_rows = _peak_of(trial(2), device)
+        release_memory(device)
+        # The difference leaves out fixed costs; fall back to the two-row average if the allocator hid it
+        return two_rows - one_row if two_rows > one_row else max(two_rows // 2, 1)
+
+    def limits(
+        self,
+        longest_ids: List[List[int]],
+        config: Dict,
+        max_length: Optional[int] = None
+    ) -> Optional[Tuple[int, int, int]]:
+        """Returns (batch size, max padded prompt tokens per batch, bucket length) for a subset.
+
+        ``longest_ids`` are token ids of the subset's longest prompts.
+        ``generation.batch_size`` caps the batch size. Returns None when memory
+        cannot be measured on this device.
+        """
+        device = self.model.device
+        if not longest_ids or not can_measure(device):
+            return None
+
+        eval_config = config.get('evaluation', {})
+        mode = eval_config.get('mode', 'generate')
+        generation_config = config['generation']
+        prompt_length = max(len(ids) for ids in longest_ids)
+        # Rows and positions a prompt turns into inside the model
+        extra_tokens, rows_per_prompt = 0, 1
+        if mode == 'generate':
+            extra_tokens = generation_config.get('max_new_tokens', 5)
+            rows_per_prompt = generation_config.get('num_beams', 1)
+        elif mode == 'loglikelihood' and eval_config.get('loglikelihood_scoring', 'next_token') == 'continuation':
+            rows_per_prompt = 4
+
+        # Sequence lengths are bucketed to powers of two, so similar subsets share a measurement
+        bucket = 1 << max(prompt_length + extra_tokens - 1, 1).bit_length()
+        if max_length is not None:
+            bucket = min(bucket, max_length)
+        key = (str(self.model.dtype), bucket)
+        if key not in self.row_bytes:
+            self.row_bytes[key] = self._measure_row_bytes(max(longest_ids, key=len), bucket)
+
+        available = (self.budget_bytes - memory_in_use(device)) * BUDGET_FILL
+        rows = int(available // (self.row_bytes[key] * rows_per_prompt))
+        batch_size = max(min(rows, generation_config.get('batch_size', 1)), 1)
+        return batch_size, batch_size * prompt_length, bucket
@@ -0,0 +1,710 @@
+"""Model backends that ``evaluation.run_benchmark`` scores prompts through.
+
+A backend turns prompts into output records. ``HFBackend`` runs an
+in-process ``AutoModelForCausalLM`` in length-bucketed batches;
+``OpenAIBackend`` sends prompts to an OpenAI-compatible completions server
+(vLLM, TGI, ...) with many requests in flight at once. Models pick their
+backend with the ``backend`` key of their ``models`` entry.
+"""
+
+import gc
+import os
+import math
+import time
+import random
+import asyncio
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+import torch
+
+from .utils import cpu_mode_label, get_device_settings, get_peak_memory_mb, reset_peak_memory
+from .autobatch import BatchTuner, is_out_of_memory, release_memory
+from .cache import model_identity
+from .store import load_stored_token_ids
+from .pipeline import Pipeline
+from .profiling import region
+from .prompting import PromptFitter
+from .generation import (
+    ANSWER_LETTERS,
+    PrefixCache,
+    PrefixEntry,
+    constrained_answer_batch,
+    context_window,
+    cpu_autocast,
+    decode_generated,
+    encode_prompts,
+    extract_answer,
+    generate_batch_ids,
+    load_model_and_tokenizer,
+    make_batches,
+    score_choices_batch,
+    shared_prefix_ids
+)
+
+class ScoredBatch(NamedTuple):
+    """Results of one batch of samples.
+
+    ``outputs`` holds an output record, or the exception that sample failed
+    with, per index. ``run_info`` holds per-sample details of how this run
+    produced the output (timing of shared steps, prefix cache use); unlike
+    the output records they are not stored in the response cache.
+    """
+    indices: List[int]
+    outputs: List[Union[Dict[str, Any], Exception]]
+    run_info: List[Dict[str, Any]]
+
+class ModelBackend:
+    """Interface between ``run_benchmark`` and a model."""
+
+    display_name: str
+
+    def identity(self) -> Dict[str, Any]:
+        """Identifies the model for response cache keys."""
+        raise NotImplementedError
+
+    def memory_footprint_mb(self) -> float:
+        """Memory the model occupies in this process."""
+        return 0.0
+
+    def prompt_budget(self, prepared: Any, config: Dict) -> Optional[int]:
+        """Prompt tokens that fit with ``prompt.fit_to_context``, or None when prompts are not fitted."""
+        return None
+
+    def score(self, indices: List[int], prepared: Any, config: Dict, subset_name: str) -> Iterator[ScoredBatch]:
+        """Scores the samples at ``indices`` of a ``PreparedSubset``, yielding batches as they finish."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases the backend's resources."""
+
+def _run_batch(
+    model: Any,
+    tokenizer: Any,
+    batch_ids: List[List[int]],
+    batch_choices: List[List[str]],
+    config: Dict,
+    prefix: Optional[PrefixEntry] = None
+) -> Callable[[], List[Dict[str, Any]]]:
+    """Runs the model on one batch in the configured evaluation mode.
+
+    Returns the step that turns the model output into one record per prompt
+    with the raw output, the extracted answer, the per-sample inference
+    time, the timing breakdown and, in loglikelihood mode, the per-choice
+    probabilities. In generate mode that step does the decoding and answer
+    extraction, so it can run off the model's thread.
+    """
+    eval_config = config.get('evaluation', {})
+    mode = eval_config.get('mode', 'generate')
+
+    if mode == 'generate':
+        generated = generate_batch_ids(model, tokenizer, batch_ids, config['generation'], prefix)
+        return lambda: [
+            {
+                "raw_generated_text": raw_generated,
+                "extracted_answer": extracted_answer,
+                "inference_time_s": inference_time,
+                **timing
+            }
+            for raw_generated, extracted_answer, inference_time, timing in decode_generated(tokenizer, generated)
+        ]
+
+    if mode == 'constrained':
+        records = [
+            {
+                "raw_generated_text": raw_generated,
+                "extracted_answer": extracted_answer,
+                "inference_time_s": inference_time,
+                **timing
+            }
+            for raw_generated, extracted_answer, inference_time, timing in constrained_answer_batch(
+                model, tokenizer, batch_ids, prefix
+            )
+        ]
+        return lambda: records
+
+    if mode == 'loglikelihood':
+        scoring = eval_config.get('loglikelihood_scoring', 'next_token')
+        if scoring not in ('next_token', 'continuation'):
+            raise ValueError(f"Unknown evaluation.loglikelihood_scoring '{scoring}'")
+        records = []
+        for predicted, choice_probs, inference_time, timing in score_choices_batch(
+            model,
+            tokenizer,
+            batch_ids,
+            batch_choices if scoring == 'continuation' else None,
+            prefix
+        ):
+            record = {
+                "raw_generated_text": predicted,
+                "extracted_answer": predicted,
+                "inference_time_s": inference_time,
+                **timing
+            }
+            for letter, prob in choice_probs.items():
+                record[f"prob_{letter}"] = prob
+            records.append(record)
+        return lambda: records
+
+    raise ValueError(f"Unknown evaluation.mode '{mode}'")
+
+# How many of a subset's longest prompts the batch size is tuned on
+TUNING_PROMPTS = 4
+
+class HFBackend(ModelBackend):
+    """In-process Hugging Face model scored in length-bucketed, left-padded batches.
+
+    ``max_context`` overrides the context window read from the model config.
+    With ``memory_budget_gb`` the batch size is tuned to the budget for every
+    subset (see ``autobatch.BatchTuner``).
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: Any,
+        display_name: str,
+        max_context: Optional[int] = None,
+        memory_budget_gb: Optional[float] = None
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.display_name = display_name
+        self.max_context = max_context or context_window(model, tokenizer)
+        # One PromptFitter per subset, so token counts are reused across calls
+        self.fitters = {}
+        self.tuner = BatchTuner(model, tokenizer, memory_budget_gb) if memory_budget_gb else None
+
+    def identity(self) -> Dict[str, Any]:
+        return model_identity(self.model, self.tokenizer)
+
+    def memory_footprint_mb(self) -> float:
+        return self.model.get_memory_footprint() / 2**20
+
+    def _reserved_tokens(self, prepared: Any, config: Dict) -> int:
+        """Tokens the model needs after the prompt: the generated answer, or the longest scored continuation."""
+        eval_config = config.get('evaluation', {})
+        mode = eval_config.get('mode', 'generate')
+        if mode == 'generate':
+            return config['generation'].get('max_new_tokens', 5)
+        if mode == 'loglikelihood' and eval_config.get('loglikelihood_scoring', 'next_token') == 'continuation':
+            continuations = [f" {choice}" for choices in prepared.choices for choice in choices[:len(ANSWER_LETTERS)]]
+            if continuations:
+                return max(len(ids) for ids in self.tokenizer(continuations, add_special_tokens=False)['input_ids'])
+        return 1
+
+    def prompt_budget(self, prepared: Any, config: Dict) -> Optional[int]:
+        """Prompt tokens that fit with ``prompt.fit_to_context``, or None when prompts are not fitted."""
+        if not config['prompt'].get('fit_to_context', False) or prepared.answered_blocks is None or self.max_context is None:
+            return None
+        return max(self.max_context - self._reserved_tokens(prepared, config), 1)
+
+    def _fit_prompts(self, indices: List[int], prepared: Any, config: Dict, subset_name: str) -> Dict[int, Any]:
+        """Prompts of the samples at ``indices``, with ``prompt.fit_to_context`` applied."""
+        prompt_parts = {i: prepared.prompt_parts[i] for i in indices}
+        budget = self.prompt_budget(prepared, config)
+        if budget is None:
+            return prompt_parts
+
+        fitter = self.fitters.get(subset_name)
+        if fitter is None or fitter.answered_blocks is not prepared.answered_blocks or fitter.budget != budget:
+            fitter = self.fitters[subset_name] = PromptFitter(self.tokenizer, prepared.answered_blocks, budget)
+        return fitter.fit(prompt_parts)
+
+    def _batch_limits(self, prompt_parts: Dict[int, Any], config: Dict, subset_name: str) -> Dict[str, Any]:
+        """Batch size and padded-token cap for a subset: the configured ones, or tuned to the memory budget."""
+        generation_config = config['generation']
+        limits = {
+            "batch_size": generation_config.get('batch_size', 1),
+            "max_tokens_per_batch": generation_config.get('max_tokens_per_batch'),
+            # The tuned batch size, kept when out-of-memory errors lower batch_size
+            "tuned": None
+        }
+        if self.tuner is None or not prompt_parts:
+            return limits
+
+        # The longest prompts in characters stand in for the longest in tokens
+        longest = sorted(prompt_parts.values(), key=lambda parts: len(parts.text), reverse=True)[:TUNING_PROMPTS]
+        tuned = self.tuner.limits(encode_prompts(self.tokenizer, [parts.text for parts in longest]), config, self.max_context)
+        if tuned is None:
+            print(f"Warning: memory use cannot be measured on {self.model.device}, using the configured batch size")
+            return limits
+
+        batch_size, max_tokens, bucket = tuned
+        limits.update(batch_size=batch_size, tuned=batch_size)
+        if limits['max_tokens_per_batch'] is None or max_tokens < limits['max_tokens_per_batch']:
+            limits['max_tokens_per_batch'] = max_tokens
+        print(f"{self.display_name} on {subset_name}: batch size {batch_size} fits the memory budget "
+              f"(sequence length bucket {bucket})")
+        return limits
+
+    def _tokenized_batches(
+        self,
+        prompt_parts: Dict[int, Any],
+        prepared: Any,
+        config: Dict,
+        subset_name: str,
+        limits: Dict[str, Any]
+    ) -> Iterator[Tuple[List[int], List[List[int]], Tuple[int, ...], float]]:
+        """Tokenizes the prompts of ``prompt_parts`` (by sample index) and groups them into batches.
+
+        Yields (indices, token ids, shared prefix ids, per-sample tokenize time)
+        per batch, with batch sizes from ``limits`` (see ``_batch_limits``).
+        With prefix caching, samples are grouped by the prefix text they
+        share: the instructions, plus the few-shot block when every sample
+        uses the same shots. Full prompts are tokenized as without the cache
+        and split where their ids stop matching the prefix's (see
+        ``shared_prefix_ids``); the token ids then only cover the rest. A
+        group whose prefix leaves no room in the context window for the rest
+        of the prompt and the answer runs without the cache.
+
+        With ``prompt.fit_to_context``, prompts still over the budget without
+        few-shot examples keep their last ``prompt_budget`` tokens.
+        """
+        tokenizer = self.tokenizer
+        budget = self.prompt_budget(prepared, config)
+        generation_config = config['generation']
+        prefix_caching = generation_config.get('prefix_cache', False)
+        fixed_shots = config['prompt'].get('fixed_shots', False)
+        if prefix_caching:
+            window = self.max_context or tokenizer.model_max_length
+            max_prefix_length = window - self._reserved_tokens(prepared, config)
+
+        # Prompts taken from the prepared store may also have their token ids there
+        stored_ids = load_stored_token_ids(config, subset_name, tokenizer) if prepared.from_store else None
+
+        prefix_groups = OrderedDict()
+        for i, parts in prompt_parts.items():
+            shared_prefix = ""
+            if prefix_caching:
+                shared_prefix = parts.instructions + (parts.shots if fixed_shots else "")
+            prefix_groups.setdefault(shared_prefix, []).append(i)
+
+        for shared_prefix, group in prefix_groups.items():
+            tokenize_start = time.perf_counter()
+            encoded = {}
+            if stored_ids is not None:
+                # Stored ids only hold the prompts as prepared, before any fitting
+                encoded = {i: stored_ids[i] for i in group if prompt_parts[i] is prepared.prompt_parts[i]}
+                if budget is not None:
+                    encoded = {i: ids[-budget:] for i, ids in encoded.items()}
+            rest = [i for i in group if i not in encoded]
+            prefix_ids = ()
+            with region("tokenize"):
+                if rest:
+                    encoded.update(zip(rest, encode_prompts(tokenizer, [prompt_parts[i].text for i in rest], max_length=budget)))
+                if shared_prefix:
+                    prefix_ids = shared_prefix_ids(
+                        tokenizer(shared_prefix, truncation=True)['input_ids'],
+                        [encoded[i] for i in group],
+                        max_prefix_length
+                    )
+            if prefix_ids:
+                encoded = {i: ids[len(prefix_ids):] for i, ids in encoded.items()}
+            tokenize_time = (time.perf_counter() - tokenize_start) / len(group)
+
+            lengths = [len(encoded[i]) for i in group]
+            for batch in make_batches(lengths, limits['batch_size'], limits['max_tokens_per_batch']):
+                batch = [group[j] for j in batch]
+                yield batch, [encoded[i] for i in batch], prefix_ids, tokenize_time
+
+    def score(self, indices: List[int], prepared: Any, config: Dict, subset_name: str) -> Iterator[ScoredBatch]:
+        """Scores batches in three steps: tokenize, run the model, decode and extract.
+
+        With ``prompt.fit_to_context`` prompts that would not leave room for
+        the answer in the model's context window lose few-shot examples
+        first; each output records its ``effective_shots``.
+        With ``generation.pipeline`` the steps overlap: tokenization runs in
+        one thread and the model in another, with at most
+        ``pipeline_depth`` batches waiting between them, while decoding,
+        answer extraction and whatever the caller does with each batch
+        (writing results) happen in the calling thread.
+
+        A batch that runs out of memory is split in half and retried, and
+        later batches are kept to the smaller size. Each sample records the
+        rows of the batch it ran in (``batch_rows``), how often its batch
+        was split (``oom_retries``) and, with ``hardware.memory_budget_gb``,
+        the tuned batch size.
+        """
+        model, tokenizer = self.model, self.tokenizer
+        device, _ = get_device_settings(config)
+        generation_config = config['generation']
+        mode_label = cpu_mode_label(config)
+        prefix_caching = generation_config.get('prefix_cache', False)
+        prefix_cache = None
+        if prefix_caching:
+            prefix_cache = PrefixCache(model, tokenizer, generation_config.get('prefix_cache_size', 8))
+        pipeline = None
+        limits = None
+
+        def execute(batch: List[int], batch_ids: List[List[int]], prefix_ids: Tuple[int, ...], run_info: List[Dict]) -> Callable:
+            """Runs one batch, halving it for as long as it runs out of memory."""
+            if len(batch) > limits['batch_size']:
+                # An earlier batch ran out of memory at this size
+                size = limits['batch_size']
+                parts = [
+                    execute(batch[start:start + size], batch_ids[start:start + size], prefix_ids, run_info[start:start + size])
+                    for start in range(0, len(batch), size)
+                ]
+                return lambda: [output for part in parts for output in part()]
+
+            try:
+                with cpu_autocast(config), region("model"):
+                    prefix = None
+                    if prefix_ids:
+                        prefix, cached = prefix_cache.get(prefix_ids, len(batch))
+                    finish = _run_batch(
+                        model,
+                        tokenizer,
+                        batch_ids,
+                        [prepared.choices[i] for i in batch],
+                        config,
+                        prefix
+                    )
+            except Exception as e:
+                if len(batch) == 1 or not is_out_of_memory(e):
+                    raise
+                release_memory(device)
+                limits['batch_size'] = min(limits['batch_size'], len(batch) // 2)
+                print(f"\n{self.display_name} ran out of memory on a batch of {len(batch)}, "
+                      f"retrying in batches of {limits['batch_size']}")
+                for info in run_info:
+                    info['oom_retries'] += 1
+                return execute(batch, batch_ids, prefix_ids, run_info)
+
+            for position, info in enumerate(run_info):
+                info['batch_rows'] = len(batch)
+                if prefix_caching:
+                    hit = prefix is not None and (cached or position > 0)
+                    info['prefix_cache_hit'] = hit
+                    info['prefill_tokens_saved'] = len(prefix.input_ids) if hit else 0
+            return finish
+
+        def run_model(item: Tuple[List[int], List[List[int]], Tuple[int, ...], float]) -> Tuple[List[int], Callable, List[Dict]]:
+            batch, batch_ids, prefix_ids, tokenize_time = item
+            run_info = [
+                {"tokenize_time_s": tokenize_time, "cpu_mode": mode_label, "oom_retries": 0}
+                for _ in batch
+            ]
+            if limits['tuned'] is not None:
+                for info in run_info:
+                    info['tuned_batch_size'] = limits['tuned']
+            if pipeline is not None:
+                # How far tokenization ran ahead, and the model's wait for this batch shared out like inference time
+                model_stage = pipeline.stats[1]
+                for info in run_info:
+                    info['pipeline_queue_depth'] = model_stage.last_depth
+                    info['pipeline_model_stall_s'] = model_stage.last_starved_s / len(batch)
+            try:
+                finish = execute(batch, batch_ids, prefix_ids, run_info)
+            except Exception as e:
+                print(f"\nError during generation for model {self.display_name}, samples {sorted(batch)}: {e}")
+                traceback.print_exc()
+                finish = lambda error=e: [error] * len(batch)
+
+            if device.type == "cuda":
+                torch.cuda.empty_cache()
+            return batch, finish, run_info
+
+        with region("fit_prompts"):
+            prompt_parts = self._fit_prompts(indices, prepared, config, subset_name)
+        with region("tune_batch_size"):
+            limits = self._batch_limits(prompt_parts, config, subset_name)
+        batches = self._tokenized_batches(prompt_parts, prepared, config, subset_name, limits)
+        if generation_config.get('pipeline', False):
+            pipeline = Pipeline(
+                batches,
+                [("model", run_model)],
+                depth=generation_config.get('pipeline_depth', 2),
+                source_name="tokenize"
+            )
+            scored = pipeline
+        else:
+            scored = map(run_model, batches)
+
+        for batch, finish, run_info in scored:
+            try:
+                with region("extract"):
+                    outputs = finish()
+            except Exception as e:
+                print(f"\nError while decoding outputs of model {self.display_name}, samples {sorted(batch)}: {e}")
+                traceback.print_exc()
+                outputs = [e] * len(batch)
+
+            for i, output in zip(batch, outputs):
+                if not isinstance(output, Exception):
+                    output['effective_shots'] = len(prompt_parts[i].shot_indices)
+            yield ScoredBatch(batch, outputs, run_info)
+
+        if prefix_cache is not None:
+            print(f"\n{self.display_name} prefix cache: {prefix_cache.hits} hits, "
+                  f"{prefix_cache.misses} misses, {prefix_cache.prefill_tokens_saved} prefill tokens saved")
+        if pipeline is not None and pipeline.stats[0].items:
+            print(f"\n{self.display_name} pipeline on {subset_name} (queue depth {pipeline.depth}):")
+            for stage in pipeline.summary():
+                print(f"  {stage['stage']:>8}: {stage['items']} batches, busy {stage['busy_s']:.2f}s, "
+                      f"starved {stage['starved_s']:.2f}s, blocked {stage['blocked_s']:.2f}s, "
+                      f"queue depth mean {stage['mean_queue_depth']:.1f} max {stage['max_queue_depth']}")
+
+class RetryableHTTPError(Exception):
+    """A server response worth retrying (rate limited or a server-side error)."""
+
+# Statuses that signal an overloaded or briefly unavailable server
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+class OpenAIBackend(ModelBackend):
+    """Client for an OpenAI-compatible ``/completions`` endpoint.
+
+    Every prompt is sent as its own request from one asyncio event loop over a
+    pooled ``aiohttp`` session, with at most ``max_concurrency`` requests in
+    flight. Connection errors, timeouts, 429 and 5xx responses are retried up
+    to ``max_retries`` times with jittered exponential backoff. Each record
+    carries the request's latency and attempt count, and rows are yielded as
+    requests complete.
+
+    ``generate`` mode requests ``max_new_tokens`` tokens and extracts the
+    answer from the text. ``constrained`` and ``loglikelihood`` next-token
+    modes request one token with its ``top_logprobs`` and pick the most
+    likely answer letter among them; when none is there, the answer is the
+    returned token if it is a letter, otherwise None.
+    """
+
+    def __init__(self, model_config: Dict, config: Dict):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("The openai backend needs aiohttp: pip install 'llm-mmlu-bench[http]'")
+        self.aiohttp = aiohttp
+
+        self.display_name = model_config['display_name']
+        self.model = model_config['name']
+        self.base_url = model_config['base_url'].rstrip('/')
+        api_key = os.environ.get(model_config.get('api_key_env', 'OPENAI_API_KEY'))
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.max_concurrency = model_config.get('max_concurrency', 64)
+        self.max_retries = model_config.get('max_retries', 3)
+        self.retry_backoff_s = model_config.get('retry_backoff_s', 1.0)
+        self.timeout_s = model_config.get('timeout_s', 120)
+        self.top_logprobs = model_config.get('top_logprobs', 20)
+
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.semaphore = None
+        # Private generator so backoff jitter leaves the seeded global state alone
+        self.jitter = random.Random()
+
+    def identity(self) -> Dict[str, Any]:
+        return {"model": self.model, "endpoint": self.base_url}
+
+    async def _open_session(self) -> None:
+        self.session = self.aiohttp.ClientSession(
+            connector=self.aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=self.aiohttp.ClientTimeout(total=self.timeout_s),
+            headers=self.headers
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _request_body(self, prompt: str, config: Dict) -> Dict[str, Any]:
+        eval_config = config.get('evaluation', {})
+        mode = eval_config.get('mode', 'generate')
+        body = {"model": self.model, "prompt": prompt}
+        if mode == 'generate':
+            generation_config = config['generation']
+            body["max_tokens"] = generation_config.get('max_new_tokens', 5)
+            body["temperature"] = generation_config.get('temperature', 1.0) if generation_config.get('do_sample', False) else 0.0
+            return body
+        if mode == 'constrained' or (mode == 'loglikelihood' and eval_config.get('loglikelihood_scoring', 'next_token') == 'next_token'):
+            body.update(max_tokens=1, temperature=0.0, logprobs=self.top_logprobs)
+            return body
+        raise ValueError(f"The openai backend does not support evaluation.mode '{mode}' with these settings")
+
+    async def _complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Sends one request, retrying transient failures, and returns its parsed record."""
+        async with self.semaphore:
+            start_time = time.perf_counter()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self.session.post(f"{self.base_url}/completions", json=body) as response:
+                        if response.status in RETRY_STATUSES:
+                            raise RetryableHTTPError(f"HTTP {response.status}: {await response.text()}")
+                        response.raise_for_status()
+                        payload = await response.json()
+                    break
+                except (self.aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableHTTPError):
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(self.retry_backoff_s * 2**attempt * (0.5 + self.jitter.random()))
+            latency = time.perf_counter() - start_time
+
+        return self._record(payload, body, latency, attempt + 1)
+
+    def _record(self, payload: Dict[str, Any], body: Dict[str, Any], latency: float, attempts: int) -> Dict[str, Any]:
+        choice = payload['choices'][0]
+        usage = payload.get('usage') or {}
+        extract_start = time.perf_counter()
+        text = (choice.get('text') or "").strip()
+        record = {}
+
+        if 'logprobs' not in body:
+            record["raw_generated_text"] = text
+            record["extracted_answer"] = extract_answer(text)
+        else:
+            top_logprobs = ((choice.get('logprobs') or {}).get('top_logprobs') or [{}])[0] or {}
+            letter_logprobs = {}
+            for token, logprob in top_logprobs.items():
+                letter = token.strip()
+                if letter in ANSWER_LETTERS:
+                    letter_logprobs[letter] = max(letter_logprobs.get(letter, -math.inf), logprob)
+            if letter_logprobs:
+                # Letters outside the returned top tokens get probability 0
+                best = max(letter_logprobs.values())
+                weights = {letter: math.exp(letter_logprobs.get(letter, -math.inf) - best) for letter in ANSWER_LETTERS}
+                total = sum(weights.values())
+                for letter in ANSWER_LETTERS:
+                    record[f"prob_{letter}"] = weights[letter] / total
+                predicted = max(letter_logprobs, key=letter_logprobs.get)
+            else:
+                # No answer letter among the top tokens; only a letter in the text itself counts
+                answer = extract_answer(text)
+                predicted = answer if answer in ANSWER_LETTERS else None
+            record["raw_generated_text"] = text if predicted is None else predicted
+            record["extracted_answer"] = predicted
+
+        record.update({
+            "ttft_s": latency,
+            "decode_time_per_token_s": 0.0,
+            "detokenize_time_s": 0.0,
+            "extraction_time_s": time.perf_counter() - extract_start,
+            "latency_s": latency,
+            "input_tokens": usage.get('prompt_tokens'),
+            "output_tokens": usage.get('completion_tokens'),
+            "request_attempts": attempts
+        })
+        return record
+
+    def score(self, indices: List[int], prepared: Any, config: Dict, subset_name: str) -> Iterator[ScoredBatch]:
+        bodies = {i: self._request_body(prepared.prompt_parts[i].text, config) for i in indices}
+        if self.session is None:
+            self.loop.run_until_complete(self._open_session())
+
+        tasks = {self.loop.create_task(self._complete(body)): i for i, body in bodies.items()}
+        last_time = time.perf_counter()
+        try:
+            while tasks:
+                done, _ = self.loop.run_until_complete(
+                    asyncio.wait(list(tasks), return_when=asyncio.FIRST_COMPLETED)
+                )
+                # Requests overlap, so each completion is charged its share of the wall
+                # time since the previous one; the shares add up to the run's wall time
+                now = time.perf_counter()
+                time_share = (now - last_time) / len(done)
+                last_time = now
+
+                batch, outputs = [], []
+                for task in done:
+                    i = tasks.pop(task)
+                    batch.append(i)
+                    try:
+                        outputs.append({
+                            **task.result(),
+                            "inference_time_s": time_share,
+                            "effective_shots": len(prepared.prompt_parts[i].shot_indices)
+                        })
+                    except Exception as e:
+                        print(f"\nRequest failed for model {self.display_name}, sample {i}: {e!r}")
+                        outputs.append(e)
+                yield ScoredBatch(batch, outputs, [{} for _ in batch])
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+    def close(self) -> None:
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+            self.session = None
+        self.loop.close()
+
+def load_backend(model_config: Dict, config: Dict) -> ModelBackend:
+    """Creates the backend a ``models`` entry asks for (``hf`` unless ``backend`` says otherwise)."""
+    backend = model_config.get('backend', 'hf')
+    if backend == 'hf':
+        with region("load_model_and_tokenizer"):
+            model, tokenizer = load_model_and_tokenizer(model_config['name'], config, model_config.get('revision'))
+        return HFBackend(
+            model,
+            tokenizer,
+            model_config['display_name'],
+            model_config.get('context_window'),
+            config['hardware'].get('memory_budget_gb')
+        )
+    if backend == 'openai':
+        return OpenAIBackend(model_config, config)
+    raise ValueError(f"Unknown backend '{backend}' for model {model_config['display_name']}")
+
+class ModelPool:
+    """Loads configured models on demand and keeps at most ``max_resident`` in memory.
+
+    Models are looked up by their key in ``config['models']``; when the pool
+    is full the least recently used model is freed before the next one loads.
+    Load time, model size and peak memory are tracked per display name in
+    ``stats``.
+    """
+
+    def __init__(self, config: Dict, max_resident: Optional[int] = None):
+        self.config = config
+        self.max_resident = max_resident
+        self.resident = OrderedDict()
+        self.stats = {}
+
+    def get(self, model_key: str) -> ModelBackend:
+        """Returns the backend of a model key, loading it if needed."""
+        if model_key in self.resident:
+            self.resident.move_to_end(model_key)
+            return self.resident[model_key]
+
+        if self.max_resident is not None:
+            while len(self.resident) >= max(self.max_resident, 1):
+                self.release(next(iter(self.resident)))
+
+        model_config = self.config['models'][model_key]
+        device, _ = get_device_settings(self.config)
+        if device.type == "cuda":
+            reset_peak_memory(device)
+
+        start_time = time.perf_counter()
+        backend = load_backend(model_config, self.config)
+        load_time = time.perf_counter() - start_time
+
+        stats = self.stats.setdefault(model_config['display_name'], {
+            "loads": 0,
+            "model_load_time_s": 0.0,
+            "model_memory_mb": 0.0,
+            "peak_memory_mb": 0.0
+        })
+        stats["loads"] += 1
+        stats["model_load_time_s"] += load_time
+        stats["model_memory_mb"] = backend.memory_footprint_mb()
+
+        self.resident[model_key] = backend
+        return backend
+
+    def release(self, model_key: str) -> None:
+        """Frees a resident model and records the peak memory seen while it was loaded."""
+        if model_key not in self.resident:
+            return
+
+        device, _ = get_device_settings(self.config)
+        stats = self.stats[self.config['models'][model_key]['display_name']]
+        stats["peak_memory_mb"] = max(stats["peak_memory_mb"], get_peak_memory_mb(device))
+
+        self.resident.pop(model_key).close()
+        gc.collect()
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+
+    def clear(self) -> None:
+        """Frees every resident model."""
+        for model_key in list(self.resident):
+            self.release(model_key)
@@ -0,0 +1,5 @@
+"""Benchmarks of the harness itself, run with ``mmlu-bench bench``."""
+
+from .suite import compare_results, load_results, run_suite, save_results
+
+__all__ = ["compare_results", "load_results", "run_suite", "save_results"]
@@ -0,0 +1,124 @@
+"""Offline fixtures for the harness benchmarks: a tiny random causal LM and synthetic MMLU data."""
+
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Fixed vocabulary so the tokenizer, and with it every timing, is the same on every machine
+WORDS = (
+    "the a of what is which force energy mass atom acid base number sum value "
+    "A B C D Question Choices Answer You are helpful assistant following multiple "
+    "choice selecting correct option"
+).split()
+
+def build_tiny_model(model_dir: Path, seed: int = 0) -> Path:
+    """Builds and saves a 2-layer random-weight GPT-2 and a small BPE tokenizer.
+
+    Nothing is downloaded; an existing build in ``model_dir`` is reused.
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    model_dir = Path(model_dir)
+    if (model_dir / "config.json").exists() and (model_dir / "tokenizer.json").exists():
+        return model_dir
+
+    rng = random.Random(seed)
+    corpus = [" ".join(rng.choice(WORDS) for _ in range(20)) for _ in range(500)]
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=300,
+        special_tokens=["<unk>", "<eos>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False
+    ))
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        eos_token="<eos>",
+        unk_token="<unk>",
+        model_max_length=480
+    )
+
+    torch.manual_seed(seed)
+    model = GPT2LMHeadModel(GPT2Config(
+        n_layer=2,
+        n_embd=32,
+        n_head=2,
+        vocab_size=len(fast_tokenizer),
+        n_positions=512,
+        bos_token_id=fast_tokenizer.eos_token_id,
+        eos_token_id=fast_tokenizer.eos_token_id
+    ))
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fast_tokenizer.save_pretrained(model_dir)
+    model.save_pretrained(model_dir)
+    return model_dir
+
+def synthetic_mmlu(num_samples: int, seed: int = 0) -> Any:
+    """Builds an MMLU-shaped ``datasets.Dataset`` of random questions."""
+    from datasets import Dataset
+
+    rng = random.Random(seed)
+    return Dataset.from_dict({
+        "question": [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))) + "?"
+            for _ in range(num_samples)
+        ],
+        "subject": ["synthetic"] * num_samples,
+        "choices": [
+            [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) for _ in range(4)]
+            for _ in range(num_samples)
+        ],
+        "answer": [rng.randint(0, 3) for _ in range(num_samples)]
+    })
+
+def synthetic_generations(num_samples: int, seed: int = 0) -> List[str]:
+    """Builds model-output-like strings for answer extraction."""
+    rng = random.Random(seed)
+    templates = ["{letter}", "{letter}. {words}", "The answer is {letter}", "{words} {letter}.", "{words}"]
+    return [
+        rng.choice(templates).format(
+            letter=rng.choice("ABCD"),
+            words=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+        )
+        for _ in range(num_samples)
+    ]
+
+def benchmark_config(model_dir: Path, batch_size: int = 8) -> Dict:
+    """Configuration of a CPU-only run of the tiny model on synthetic data."""
+    return {
+        "models": {
+            "tiny": {"name": str(model_dir), "display_name": "Tiny-Random"}
+        },
+        "hardware": {"use_gpu": False, "dtype": "float32", "low_cpu_mem_usage": False},
+        "dataset": {
+            "name": "mmlu",
+            "provider": "synthetic",
+            "subsets": ["synthetic"],
+            "split": "test",
+            "sample_size": -1,
+            "random_seed": 42
+        },
+        "prompt": {"num_shots": 5, "include_instructions": True, "format": "mmlu", "fixed_shots": False},
+        "generation": {
+            "max_new_tokens": 5,
+            "do_sample": False,
+            "temperature": 1.0,
+            "num_beams": 1,
+            "batch_size": batch_size,
+            "max_tokens_per_batch": None,
+            "prefix_cache": False
+        },
+        "evaluation": {"mode": "generate", "schedule": "subset_major"},
+        "output": {
+            "save_results": False,
+            "results_dir": "benchmark_results",
+            "plot_results": False,
+            "response_cache": False,
+            "verbose": False
+        }
+    }
@@ -0,0 +1,354 @@
+"""Timings of the harness's own code paths, independent of any real model."""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from statistics import median
+from typing import Any, Callable, Dict, List, Optional
+
+from .fixtures import benchmark_config, build_tiny_model, synthetic_generations, synthetic_mmlu
+
+FULL_SIZES = {
+    "prompt_sizes": [100, 1000, 5000],
+    "extract_sizes": [1000, 10000],
+    "run_sizes": [32, 128],
+    "batch_sizes": [1, 8, 32],
+    "report_sizes": [1000, 20000],
+    "repeat": 3
+}
+
+QUICK_SIZES = {
+    "prompt_sizes": [100],
+    "extract_sizes": [1000],
+    "run_sizes": [16],
+    "batch_sizes": [1, 8],
+    "report_sizes": [1000],
+    "repeat": 1
+}
+
+# Libraries that must not be imported by ``--help`` or ``--validate_config``
+HEAVY_MODULES = ["torch", "transformers", "datasets", "pandas", "matplotlib"]
+
+def time_call(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of ``repeat`` calls of ``fn`` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+def _result(name: str, params: Dict[str, Any], seconds: float, items: int) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "params": params,
+        "seconds": seconds,
+        "items": items,
+        "items_per_s": items / seconds if seconds > 0 else None
+    }
+
+@contextlib.contextmanager
+def _quiet():
+    """Silences the harness's progress output while it is being timed."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+def bench_format_prompts(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Times per-sample ``format_mmlu_prompt`` and the one-pass ``build_mmlu_prompts``."""
+    from ..prompting import build_mmlu_prompts, format_mmlu_prompt
+
+    config = benchmark_config(Path("."))
+    results = []
+    for size in sizes:
+        dataset = synthetic_mmlu(size)
+
+        def per_sample():
+            random.seed(0)
+            for i in range(len(dataset)):
+                format_mmlu_prompt(dataset[i], config, dataset, i)
+
+        def one_pass():
+            random.seed(0)
+            build_mmlu_prompts(dataset, config)
+
+        results.append(_result("format_mmlu_prompt", {"num_samples": size}, time_call(per_sample, repeat), size))
+        results.append(_result("build_mmlu_prompts", {"num_samples": size}, time_call(one_pass, repeat), size))
+    return results
+
+def bench_extract_answer(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Times per-sample ``extract_answer`` and the column-wise ``extract_answers`` over synthetic generations."""
+    import pyarrow as pa
+    from ..scoring import extract_answer, extract_answers
+
+    results = []
+    for size in sizes:
+        texts = synthetic_generations(size)
+
+        def extract_all():
+            for text in texts:
+                extract_answer(text)
+
+        column = pa.array(texts)
+        results.append(_result("extract_answer", {"num_samples": size}, time_call(extract_all, repeat), size))
+        results.append(_result("extract_answers", {"num_samples": size}, time_call(lambda: extract_answers(column), repeat), size))
+    return results
+
+def bench_generate_response(model_dir: Path, repeat: int) -> List[Dict[str, Any]]:
+    """Times a single-prompt ``generate_response`` call on the tiny model."""
+    from ..generation import generate_response, load_model_and_tokenizer
+    from ..prompting import format_mmlu_prompt
+
+    config = benchmark_config(model_dir)
+    model, tokenizer = load_model_and_tokenizer(str(model_dir), config)
+    dataset = synthetic_mmlu(16)
+    prompt = format_mmlu_prompt(dataset[0], config, dataset, 0)
+
+    seconds = time_call(lambda: generate_response(model, tokenizer, prompt, config['generation']), max(repeat, 3))
+    return [_result("generate_response", {"max_new_tokens": config['generation']['max_new_tokens']}, seconds, 1)]
+
+def bench_run_benchmark(model_dir: Path, sizes: List[int], batch_sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Times ``run_benchmark`` end to end on the tiny model at several dataset and batch sizes."""
+    from ..backends import ModelPool
+    from ..evaluation import run_benchmark
+
+    results = []
+    for batch_size in batch_sizes:
+        config = benchmark_config(model_dir, batch_size)
+        # Loading is timed by ModelPool and is not harness overhead
+        model_pool = ModelPool(config)
+        model_pool.get("tiny")
+        for size in sizes:
+            dataset = synthetic_mmlu(size)
+
+            def run():
+                random.seed(0)
+                with _quiet():
+                    run_benchmark(dataset, config, "synthetic", model_pool)
+
+            seconds = time_call(run, repeat)
+            results.append(_result("run_benchmark", {"num_samples": size, "batch_size": batch_size}, seconds, size))
+        model_pool.clear()
+    return results
+
+def _run_fresh(code: str) -> List[str]:
+    """Runs ``code`` in a new interpreter and returns the heavy modules it left imported."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+        str(Path(__file__).resolve().parents[2]),
+        os.environ.get('PYTHONPATH')
+    ])))
+    probe = f"import sys, json; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}\n{probe}"],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def bench_cli_startup(repeat: int) -> List[Dict[str, Any]]:
+    """Times importing the CLI and a ``--validate_config`` dry run, each in a fresh interpreter.
+
+    ``heavy_imports`` lists the libraries of ``HEAVY_MODULES`` the step
+    imported; it must stay empty for the CLI to start fast.
+    """
+    import yaml
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        config_path = Path(work_dir) / "config.yaml"
+        with open(config_path, 'w') as f:
+            yaml.safe_dump(benchmark_config(Path(work_dir)), f)
+
+        cases = {
+            "cli_import": "import mmlu_bench.cli",
+            "validate_config": (
+                "import contextlib, io\n"
+                "from mmlu_bench.cli import main\n"
+                f"with contextlib.redirect_stdout(io.StringIO()): main({str(config_path)!r}, validate_config=True)"
+            )
+        }
+        for name, code in cases.items():
+            heavy_imports = []
+
+            def run():
+                heavy_imports[:] = _run_fresh(code)
+
+            result = _result(name, {}, time_call(run, max(repeat, 3)), 1)
+            result['heavy_imports'] = heavy_imports
+            results.append(result)
+    return results
+
+def synthetic_results(num_rows: int, seed: int = 0):
+    """Builds a results DataFrame shaped like a generate-mode run."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    models = ["Model-A", "Model-B", "Model-C"]
+    subsets = ["subset_1", "subset_2", "subset_3"]
+    return pd.DataFrame({
+        "model_name": [models[i % len(models)] for i in range(num_rows)],
+        "dataset_name": "mmlu",
+        "dataset_subset": [subsets[(i // len(models)) % len(subsets)] for i in range(num_rows)],
+        "sample_index": [i // len(models) for i in range(num_rows)],
+        "expected_answer": [rng.choice("ABCD") for _ in range(num_rows)],
+        "extracted_answer": [rng.choice("ABCD") for _ in range(num_rows)],
+        "inference_time_s": [rng.uniform(0.01, 0.5) for _ in range(num_rows)],
+        "top1_accuracy": [rng.randint(0, 1) for _ in range(num_rows)],
+        "ttft_s": [rng.uniform(0.01, 0.2) for _ in range(num_rows)],
+        "decode_time_per_token_s": [rng.uniform(0.001, 0.01) for _ in range(num_rows)],
+        "tokenize_time_s": [rng.uniform(0.0001, 0.001) for _ in range(num_rows)],
+        "latency_s": [rng.uniform(0.05, 1.0) for _ in range(num_rows)],
+        "input_tokens": [rng.randint(100, 800) for _ in range(num_rows)],
+        "output_tokens": [rng.randint(1, 5) for _ in range(num_rows)],
+        "run_order": [i // len(models) for i in range(num_rows)]
+    })
+
+def bench_generate_report(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Times ``generate_report`` on synthetic results, without plotting."""
+    from ..reporting import generate_report
+
+    config = benchmark_config(Path("."))
+    results = []
+    with tempfile.TemporaryDirectory() as run_dir:
+        for size in sizes:
+            results_df = synthetic_results(size)
+
+            def report():
+                with _quiet():
+                    generate_report(results_df, config, Path(run_dir))
+
+            results.append(_result("generate_report", {"num_rows": size}, time_call(report, repeat), size))
+    return results
+
+def bench_stream_report(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Times aggregating and printing the report from result streams on disk, without plotting."""
+    from ..aggregation import aggregate_results, stream_chunks
+    from ..reporting import report_aggregates
+    from ..utils import RESULTS_STREAM
+
+    config = benchmark_config(Path("."))
+    results = []
+    with tempfile.TemporaryDirectory() as run_dir:
+        run_dir = Path(run_dir)
+        for size in sizes:
+            results_df = synthetic_results(size)
+            subsets = list(results_df['dataset_subset'].unique())
+            for subset, rows in results_df.groupby('dataset_subset'):
+                (run_dir / subset).mkdir(exist_ok=True)
+                rows.to_json(run_dir / subset / RESULTS_STREAM, orient='records', lines=True)
+
+            def report():
+                with _quiet():
+                    report_aggregates(aggregate_results(stream_chunks(run_dir, subsets)), config, run_dir)
+
+            results.append(_result("stream_report", {"num_rows": size}, time_call(report, repeat), size))
+    return results
+
+def run_suite(work_dir: Optional[Path] = None, quick: bool = False) -> Dict[str, Any]:
+    """Runs every harness benchmark and returns the machine-readable results."""
+    import torch
+
+    sizes = QUICK_SIZES if quick else FULL_SIZES
+    repeat = sizes['repeat']
+    work_dir = Path(work_dir or Path(tempfile.gettempdir()) / "mmlu_bench_benchmarks")
+    model_dir = build_tiny_model(work_dir / "tiny-random-gpt2")
+
+    results = []
+    results += bench_cli_startup(repeat)
+    results += bench_format_prompts(sizes['prompt_sizes'], repeat)
+    results += bench_extract_answer(sizes['extract_sizes'], repeat)
+    results += bench_generate_response(model_dir, repeat)
+    results += bench_run_benchmark(model_dir, sizes['run_sizes'], sizes['batch_sizes'], repeat)
+    results += bench_generate_report(sizes['report_sizes'], repeat)
+    results += bench_stream_report(sizes['report_sizes'], repeat)
+
+    return {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "quick": quick
+        },
+        "results": results
+    }
+
+def _result_key(result: Dict[str, Any]) -> str:
+    params = ",".join(f"{key}={value}" for key, value in sorted(result['params'].items()))
+    return f"{result['name']}[{params}]"
+
+def compare_results(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = 0.2
+) -> List[Dict[str, Any]]:
+    """Compares two suite results case by case.
+
+    Returns one entry per case found in both, with the relative change in
+    time and whether it is a regression (slower than baseline by more than
+    ``threshold``).
+    """
+    baseline_results = {_result_key(result): result for result in baseline['results']}
+    comparison = []
+    for result in current['results']:
+        key = _result_key(result)
+        if key not in baseline_results:
+            continue
+        before = baseline_results[key]['seconds']
+        change = (result['seconds'] - before) / before if before > 0 else 0.0
+        comparison.append({
+            "case": key,
+            "baseline_s": before,
+            "current_s": result['seconds'],
+            "change": change,
+            "regression": change > threshold
+        })
+    return comparison
+
+def print_results(results: Dict[str, Any]) -> None:
+    """Prints suite results as a table."""
+    import pandas as pd
+
+    table = pd.DataFrame([
+        {"case": _result_key(result), "seconds": result['seconds'], "items_per_s": result['items_per_s']}
+        for result in results['results']
+    ])
+    print("\n--- Harness Benchmarks ---")
+    print(table.to_string(index=False, float_format="%.4f"))
+
+def heavy_import_failures(results: Dict[str, Any]) -> List[str]:
+    """Cases that imported a library of ``HEAVY_MODULES``, with the libraries."""
+    return [
+        f"{_result_key(result)} imported {', '.join(result['heavy_imports'])}"
+        for result in results['results'] if result.get('heavy_imports')
+    ]
+
+def print_comparison(comparison: List[Dict[str, Any]], threshold: float) -> None:
+    """Prints a comparison against a baseline and lists regressions."""
+    import pandas as pd
+
+    if not comparison:
+        print("\nNo cases in common with the baseline.")
+        return
+    table = pd.DataFrame(comparison)
+    print(f"\n--- Comparison with Baseline (regression threshold {threshold:.0%}) ---")
+    print(table.to_string(index=False, float_format="%.4f", formatters={'change': '{:+.1%}'.format}))
+    regressions = [entry['case'] for entry in comparison if entry['regression']]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+
+def save_results(results: Dict[str, Any], path: Path) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(path: Path) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
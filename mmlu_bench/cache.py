@@ -0,0 +1,165 @@
+"""Persistent, content-addressed cache of model responses."""
+
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Settings that change how samples are batched or prefilled, not what the model answers
+BATCHING_KEYS = {
+    'batch_size', 'max_tokens_per_batch', 'prefix_cache', 'prefix_cache_size', 'pipeline', 'pipeline_depth'
+}
+
+def cache_settings(config: Dict, prompt_budget: Optional[int] = None) -> Dict:
+    """Returns the parts of the config that determine a response.
+
+    ``prompt_budget`` is the model's ``ModelBackend.prompt_budget`` when its
+    prompts are fitted to the context window.
+    """
+    eval_config = config.get('evaluation', {})
+    mode = eval_config.get('mode', 'generate')
+    settings = {"mode": mode}
+    if mode == 'generate':
+        settings["generation"] = {
+            key: value for key, value in config['generation'].items()
+            if key not in BATCHING_KEYS
+        }
+    elif mode == 'loglikelihood':
+        settings["loglikelihood_scoring"] = eval_config.get('loglikelihood_scoring', 'next_token')
+
+    # Reduced CPU precision changes the answers; threads and compilation do not
+    cpu_mode = config.get('hardware', {}).get('cpu_mode') or {}
+    precision = {
+        key: cpu_mode[key] for key in ('quantize', 'autocast_bf16')
+        if cpu_mode.get(key) not in (None, 'none', False)
+    }
+    if precision:
+        settings["cpu_precision"] = precision
+
+    # Fitting drops few-shot examples until the prompt fits the budget, so the budget decides what the model sees
+    if prompt_budget is not None:
+        settings["prompt_budget"] = prompt_budget
+    return settings
+
+def model_identity(model: Any, tokenizer: Any) -> Dict[str, Any]:
+    """Identifies an in-process model for response keys.
+
+    The model is identified by its name and, for Hub checkpoints, the commit
+    hash it was loaded from; the tokenizer by its name, class and vocabulary size.
+    """
+    model_config = getattr(model, 'config', None)
+    return {
+        "model": getattr(model_config, '_name_or_path', None),
+        "revision": getattr(model_config, '_commit_hash', None),
+        "tokenizer": [tokenizer.name_or_path, type(tokenizer).__name__, len(tokenizer)]
+    }
+
+def response_key(identity: Dict[str, Any], prompt: str, settings: Dict) -> str:
+    """Builds the cache key of a prompt for a model identity and the response settings."""
+    key = {
+        **identity,
+        "prompt": hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+        "settings": settings
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """SQLite-backed response cache with least-recently-used eviction.
+
+    Entries map a ``response_key`` to the JSON-encoded output record of a
+    sample. Once the stored records exceed ``max_size_mb`` the least recently
+    used ones are evicted. With ``refresh`` every lookup misses, so all
+    responses are recomputed and overwritten.
+    """
+
+    def __init__(self, path: Path, max_size_mb: Optional[float] = None, refresh: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = None if max_size_mb is None else int(max_size_mb * 2**20)
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+
+        # Shard workers may share one cache file; wait for their writes instead of failing
+        self.conn = sqlite3.connect(str(self.path), timeout=60)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """Returns the cached records for the given keys that are present."""
+        found = {}
+        if not self.refresh:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM responses WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE responses SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.conn.commit()
+
+        self.hits += sum(1 for key in keys if key in found)
+        self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, records: Dict[str, Dict]) -> None:
+        """Stores output records by key and evicts old entries if over budget."""
+        now = time.time()
+        rows = []
+        for key, record in records.items():
+            value = json.dumps(record)
+            rows.append((key, value, len(value), now))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+        self._evict()
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache fits its size budget."""
+        if self.max_size_bytes is None:
+            return
+
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_size_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def open_response_cache(config: Dict) -> Optional[ResponseCache]:
+    """Opens the response cache under ``output.results_dir`` unless it is disabled."""
+    output_config = config['output']
+    if not output_config.get('response_cache', False):
+        return None
+
+    return ResponseCache(
+        Path(output_config['results_dir']) / "response_cache.sqlite",
+        output_config.get('response_cache_max_mb'),
+        output_config.get('refresh_response_cache', False)
+    )
@@ -1,34 +1,109 @@
-"""Command-line interface for running benchmarks."""
+"""Command-line interface for running benchmarks.
 
+Heavy dependencies (torch, transformers, datasets, pandas) are imported by
+the commands that need them, so ``--help`` and ``--validate_config`` start
+instantly.
+"""
+
+import sys
 import fire
 import traceback
 from typing import Optional
 from pathlib import Path
 
-from .utils import load_config, setup_output_directory
-from .core import run_benchmark_pipeline
+# Aliased because main's validate_config flag shadows the name
+from .config import load_config, plan_work, validate_config as check_config
 
 def main(
     config_path: str = "config.yaml",
-    subset: Optional[str] = None
+    subset: Optional[str] = None,
+    no_cache: bool = False,
+    refresh_cache: bool = False,
+    resume: Optional[str] = None,
+    shard_index: Optional[int] = None,
+    num_shards: int = 1,
+    workers: Optional[int] = None,
+    validate_config: bool = False,
+    profile: bool = False
 ) -> None:
     """Main entry point for running benchmarks.
     
     Args:
         config_path: Path to the configuration YAML file
         subset: Optional specific subset to run (overrides config subsets)
+        no_cache: Neither read nor write the persistent response cache
+        refresh_cache: Recompute every response and overwrite it in the cache
+        resume: Run directory of an interrupted run to continue; its saved
+            config.yaml is used instead of config_path
+        shard_index: Run only this shard of the (subset, sample) work list;
+            combine the shard run directories afterwards with `mmlu-bench merge`
+        num_shards: Number of shards the work list is split into. Without
+            shard_index, all shards run in a local process pool and are merged
+        workers: Maximum worker processes for the local launcher
+            (defaults to the number of CPU cores)
+        validate_config: Dry run: check the configuration and print the
+            planned work without loading any model, dataset or ML library
+        profile: Profile the run: write a torch.profiler trace, sampled
+            Python stacks and a per-stage time and memory summary to the
+            run directory
     """
     try:
         # Load configuration
+        if resume and (Path(resume) / "config.yaml").exists():
+            config_path = str(Path(resume) / "config.yaml")
         config = load_config(config_path)
+        errors = check_config(config)
+        if errors:
+            print(f"Invalid configuration '{config_path}':")
+            for error in errors:
+                print(f"  - {error}")
+            sys.exit(1)
         print("Configuration loaded successfully.")
 
+        if validate_config:
+            plan_work(config, subset, num_shards, shard_index)
+            return
+
+        from .utils import setup_output_directory
+        from .core import run_benchmark_pipeline
+        from .sharding import launch_shards, shard_config
+
+        if no_cache:
+            config['output']['response_cache'] = False
+        elif refresh_cache:
+            config['output']['refresh_response_cache'] = True
+
         # Create output directory
-        run_dir = setup_output_directory(config)
-        print(f"Results will be saved in: {run_dir}")
+        if resume:
+            run_dir = Path(resume)
+            print(f"Resuming run in: {run_dir}")
+        else:
+            run_dir = setup_output_directory(config)
+            print(f"Results will be saved in: {run_dir}")
 
         # Run the benchmark pipeline
-        run_benchmark_pipeline(config, run_dir, subset)
+        if num_shards > 1 and shard_index is None and not resume:
+            if profile:
+                print("Warning: --profile is ignored by the local shard launcher; profile one shard with --shard_index")
+            launch_shards(config, run_dir, num_shards, subset, workers)
+            return
+        if num_shards > 1 and shard_index is not None:
+            if not 0 <= shard_index < num_shards:
+                raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+            config = shard_config(config, shard_index, num_shards)
+            print(f"Running shard {shard_index} of {num_shards}")
+
+        if not profile:
+            run_benchmark_pipeline(config, run_dir, subset, resume=bool(resume))
+            return
+
+        from .profiling import Profiler
+        from .reporting import report_profile
+        profiler = Profiler().start()
+        try:
+            run_benchmark_pipeline(config, run_dir, subset, resume=bool(resume))
+        finally:
+            report_profile(profiler.stop(run_dir))
 
     except FileNotFoundError:
         print(f"Error: Configuration file '{config_path}' not found.")
@@ -36,9 +111,178 @@ def main(
         print(f"An unexpected error occurred: {e}")
         traceback.print_exc()
 
+def merge(run_dir: str, *shard_dirs: str) -> None:
+    """Merges shard outputs into the results and report of a single run.
+
+    Args:
+        run_dir: Directory the merged results are written to
+        shard_dirs: Shard run directories to merge (defaults to every
+            directory under run_dir/shards, as written by the local launcher)
+    """
+    try:
+        from .sharding import merge_runs
+
+        merge_runs(Path(run_dir), [Path(shard_dir) for shard_dir in shard_dirs] or None)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        traceback.print_exc()
+
+def rescore(run_dir: str, chunk_rows: int = 100_000) -> None:
+    """Re-extracts answers and recomputes accuracy of a finished run without loading a model.
+
+    Use after changing the answer extraction or scoring rules. The run's
+    result streams are rewritten in place, and its combined results, report
+    and results store entry are rebuilt.
+
+    Args:
+        run_dir: Run directory to rescore
+        chunk_rows: Rows processed at a time, bounding memory use
+    """
+    try:
+        from .core import rescore_run
+
+        rescore_run(Path(run_dir), chunk_rows)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        traceback.print_exc()
+
+def prepare(config_path: str = "config.yaml", subset: Optional[str] = None) -> None:
+    """Writes the configured subsets, prompts and token ids to dataset.prepared_dir.
+
+    Later runs with the same dataset and prompt settings load everything from
+    there, memory-mapped and without network access.
+
+    Args:
+        config_path: Path to the configuration YAML file
+        subset: Optional specific subset to prepare (overrides config subsets)
+    """
+    try:
+        config = load_config(config_path)
+        if subset:
+            config['dataset']['subsets'] = [subset]
+        from .store import prepare_store
+
+        prepare_store(config)
+    except FileNotFoundError:
+        print(f"Error: Configuration file '{config_path}' not found.")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        traceback.print_exc()
+
+def compare(
+    *runs: str,
+    config_path: str = "config.yaml",
+    store: Optional[str] = None,
+    model: Optional[str] = None,
+    subset: Optional[str] = None
+) -> None:
+    """Compares accuracy and latency of two runs in the results store, per model and subset.
+
+    Args:
+        runs: Baseline and current run ids (run directory names). With one,
+            it is compared against the latest run; with none, the latest
+            run is compared against the one before it
+        config_path: Configuration whose output.results_store_dir (or
+            results_dir) locates the store
+        store: Path of the results store (overrides the configuration)
+        model: Only compare these models (display names, comma separated)
+        subset: Only compare these subsets (comma separated)
+    """
+    try:
+        from .results_store import compare_runs, list_runs, print_comparison, results_store_dir
+
+        store_dir = Path(store) if store else results_store_dir(load_config(config_path))
+        stored = list_runs(store_dir)
+        # fire reads an unquoted run id like 20250101_120000 as an integer literal
+        by_digits = {run.replace("_", ""): run for run in stored}
+        runs = [by_digits.get(str(run), str(run)) for run in runs]
+        if len(runs) < 2:
+            stored = [run for run in stored if run not in runs]
+            needed = 2 - len(runs)
+            if len(stored) < needed:
+                raise ValueError(f"Need two runs to compare, the store at {store_dir} has {len(stored) + len(runs)}")
+            runs = runs + stored[-needed:]
+        baseline, current = runs[0], runs[1]
+
+        def names(value):
+            if value is None:
+                return None
+            return [value] if isinstance(value, str) else [str(item) for item in value]
+
+        comparison = compare_runs(store_dir, baseline, current, names(model), names(subset))
+        print_comparison(comparison, baseline, current)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        traceback.print_exc()
+
+def bench(
+    output: str = "benchmark_results/harness_benchmarks.json",
+    baseline: Optional[str] = None,
+    threshold: float = 0.2,
+    quick: bool = False,
+    work_dir: Optional[str] = None
+) -> None:
+    """Times the harness's own code paths on a tiny random model and synthetic data.
+
+    Runs offline on CPU. Exits with status 1 if the CLI imports a heavy
+    library at startup, or if a baseline is given and any case got slower
+    than it by more than the threshold.
+
+    Args:
+        output: Path of the JSON results file to write
+        baseline: Results file of an earlier run to compare against
+        threshold: Relative slowdown counted as a regression (0.2 = 20%)
+        quick: Run fewer and smaller cases, e.g. for CI smoke checks
+        work_dir: Directory for the generated tiny model (defaults to a temp dir)
+    """
+    from .benchmarks.suite import (
+        compare_results,
+        heavy_import_failures,
+        load_results,
+        print_comparison,
+        print_results,
+        run_suite,
+        save_results
+    )
+
+    results = run_suite(Path(work_dir) if work_dir else None, quick)
+    print_results(results)
+    save_results(results, Path(output))
+    print(f"\nBenchmark results saved to: {output}")
+
+    failed = False
+    for failure in heavy_import_failures(results):
+        print(f"Startup regression: {failure}")
+        failed = True
+
+    if baseline:
+        comparison = compare_results(results, load_results(Path(baseline)), threshold)
+        print_comparison(comparison, threshold)
+        failed = failed or any(entry['regression'] for entry in comparison)
+
+    if failed:
+        sys.exit(1)
+
+# Subcommands; anything else is handled by main
+COMMANDS = {
+    "bench": bench,
+    "compare": compare,
+    "merge": merge,
+    "prepare": prepare,
+    "rescore": rescore,
+}
+
 def cli():
     """Command-line interface entry point."""
-    fire.Fire(main)
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        name = sys.argv[1]
+        fire.Fire(COMMANDS[name], command=sys.argv[2:], name=f"mmlu-bench {name}")
+    else:
+        fire.Fire(main)
 
 if __name__ == "__main__":
     cli() 
\ No newline at end of file
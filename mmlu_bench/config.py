@@ -0,0 +1,145 @@
+"""Configuration loading and checks.
+
+Only depends on the standard library and PyYAML, so the CLI can load and
+check a configuration (``--validate_config``) without importing torch,
+transformers or datasets.
+"""
+
+from typing import Any, Dict, List, Optional
+import yaml
+
+REQUIRED_SECTIONS = ['models', 'hardware', 'dataset', 'prompt', 'generation', 'output']
+
+# Allowed values of the enumerated settings, keyed by (section, key)
+CHOICES = {
+    ('hardware', 'dtype'): ['float16', 'bfloat16', 'float32'],
+    ('evaluation', 'mode'): ['generate', 'constrained', 'loglikelihood'],
+    ('evaluation', 'loglikelihood_scoring'): ['next_token', 'continuation'],
+    ('evaluation', 'schedule'): ['subset_major', 'model_major', 'model_parallel'],
+    ('evaluation', 'interval_method'): ['wilson', 'bootstrap'],
+}
+
+BACKENDS = ['hf', 'openai']
+CPU_QUANTIZE = ['none', 'dynamic_int8']
+
+def load_config(config_path: str = "config.yaml") -> Dict:
+    """Loads configuration from YAML file."""
+    with open(config_path) as f:
+        return yaml.safe_load(f)
+
+def _check_positive_int(errors: List[str], section: Dict, name: str, key: str, allow_none: bool = True) -> None:
+    value = section.get(key)
+    if value is None and allow_none:
+        return
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        errors.append(f"{name}.{key} must be a positive integer, got {value!r}")
+
+def validate_config(config: Any) -> List[str]:
+    """Checks a loaded configuration and returns the problems found (empty when valid)."""
+    if not isinstance(config, dict):
+        return ["configuration must be a mapping of sections"]
+    errors = [f"missing section '{section}'" for section in REQUIRED_SECTIONS if not isinstance(config.get(section), dict)]
+    if errors:
+        return errors
+
+    for (section, key), allowed in CHOICES.items():
+        section_config = config.get(section) or {}
+        value = section_config.get(key) if isinstance(section_config, dict) else None
+        if value is not None and value not in allowed:
+            errors.append(f"{section}.{key} must be one of {allowed}, got {value!r}")
+
+    display_names = set()
+    for key, model_config in config['models'].items():
+        if not isinstance(model_config, dict):
+            errors.append(f"models.{key} must be a mapping")
+            continue
+        for field in ('name', 'display_name'):
+            if not model_config.get(field):
+                errors.append(f"models.{key}.{field} is required")
+        backend = model_config.get('backend', 'hf')
+        if backend not in BACKENDS:
+            errors.append(f"models.{key}.backend must be one of {BACKENDS}, got {backend!r}")
+        _check_positive_int(errors, model_config, f"models.{key}", 'context_window')
+        cores = model_config.get('cores')
+        if cores is not None and (not isinstance(cores, list) or not cores
+                                  or not all(isinstance(core, int) and core >= 0 for core in cores)):
+            errors.append(f"models.{key}.cores must be a non-empty list of core ids, got {cores!r}")
+        if backend == 'openai' and not model_config.get('base_url'):
+            errors.append(f"models.{key}.base_url is required by the openai backend")
+        if model_config.get('display_name') in display_names:
+            errors.append(f"models.{key}.display_name '{model_config['display_name']}' is used by another model")
+        display_names.add(model_config.get('display_name'))
+    if not config['models']:
+        errors.append("models must list at least one model")
+
+    dataset = config['dataset']
+    for field in ('name', 'provider', 'split'):
+        if not dataset.get(field):
+            errors.append(f"dataset.{field} is required")
+    subsets = dataset.get('subsets')
+    if not isinstance(subsets, list) or not subsets:
+        errors.append("dataset.subsets must be a non-empty list")
+    sample_size = dataset.get('sample_size', -1)
+    if sample_size is not None and (not isinstance(sample_size, int) or (sample_size < 1 and sample_size != -1)):
+        errors.append(f"dataset.sample_size must be a positive integer or -1, got {sample_size!r}")
+
+    num_shots = config['prompt'].get('num_shots', 0)
+    if not isinstance(num_shots, int) or num_shots < 0:
+        errors.append(f"prompt.num_shots must be a non-negative integer, got {num_shots!r}")
+
+    generation = config['generation']
+    for key in ('max_new_tokens', 'batch_size', 'max_tokens_per_batch', 'prefix_cache_size', 'pipeline_depth'):
+        _check_positive_int(errors, generation, 'generation', key)
+
+    memory_budget = config['hardware'].get('memory_budget_gb')
+    if memory_budget is not None and (not isinstance(memory_budget, (int, float)) or isinstance(memory_budget, bool) or memory_budget <= 0):
+        errors.append(f"hardware.memory_budget_gb must be a positive number, got {memory_budget!r}")
+
+    cpu_mode = config['hardware'].get('cpu_mode') or {}
+    if not isinstance(cpu_mode, dict):
+        errors.append(f"hardware.cpu_mode must be a mapping, got {cpu_mode!r}")
+    elif cpu_mode.get('quantize', 'none') not in CPU_QUANTIZE:
+        errors.append(f"hardware.cpu_mode.quantize must be one of {CPU_QUANTIZE}, got {cpu_mode['quantize']!r}")
+
+    evaluation = config.get('evaluation') or {}
+    if not isinstance(evaluation, dict):
+        errors.append(f"evaluation must be a mapping, got {evaluation!r}")
+        evaluation = {}
+    confidence = evaluation.get('confidence_level', 0.95)
+    if not isinstance(confidence, (int, float)) or not 0 < confidence < 1:
+        errors.append(f"evaluation.confidence_level must be between 0 and 1, got {confidence!r}")
+    _check_positive_int(errors, evaluation, 'evaluation', 'max_resident_models')
+    if evaluation.get('schedule') == 'model_parallel' and evaluation.get('adaptive', False):
+        errors.append("evaluation.adaptive is not supported with schedule model_parallel")
+
+    _check_positive_int(errors, config['output'], 'output', 'report_chunk_rows')
+    if not config['output'].get('results_dir'):
+        errors.append("output.results_dir is required")
+    return errors
+
+def plan_work(config: Dict, subset: Optional[str] = None, num_shards: int = 1, shard_index: Optional[int] = None) -> None:
+    """Prints the models, subsets and settings a run with this configuration would use."""
+    subsets = [subset] if subset else config['dataset']['subsets']
+    evaluation = config.get('evaluation') or {}
+    generation = config['generation']
+    sample_size = config['dataset'].get('sample_size', -1)
+    samples = "all" if sample_size in (-1, None) else str(sample_size)
+
+    print("\n--- Planned Work ---")
+    print(f"Dataset: {config['dataset']['name']} ({config['dataset']['provider']}, split {config['dataset']['split']})")
+    print(f"Subsets ({len(subsets)}), {samples} samples each:")
+    for name in subsets:
+        print(f"  {name}")
+    print(f"Models ({len(config['models'])}):")
+    for key, model_config in config['models'].items():
+        backend = model_config.get('backend', 'hf')
+        print(f"  {model_config['display_name']}: {model_config['name']} [{backend}]")
+    print(f"Evaluation: mode {evaluation.get('mode', 'generate')}, "
+          f"schedule {evaluation.get('schedule', 'subset_major')}, "
+          f"{config['prompt'].get('num_shots', 0)}-shot, batch size {generation.get('batch_size', 1)}"
+          f"{', adaptive' if evaluation.get('adaptive', False) else ''}")
+    if num_shards > 1:
+        shards = f"shard {shard_index} of {num_shards}" if shard_index is not None else f"{num_shards} local shards"
+        print(f"Sharding: {shards}")
+    print(f"Work items: {len(config['models'])} models x {len(subsets)} subsets x {samples} samples")
+    print(f"Results directory: {config['output']['results_dir']}")
@@ -2,27 +2,344 @@
 
 import torch
 import random
+import contextlib
 import numpy as np
-import pandas as pd
+from collections import Counter
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-from .data import load_benchmark_data
-from .evaluation import run_benchmark
-from .utils import setup_output_directory, save_results
-from .reporting import generate_report
+from .data import load_benchmark_data, shard_indices
+from .evaluation import PreparedSubset, run_benchmark, prepare_subset
+from .backends import ModelPool
+from .model_workers import run_model_workers, write_shared_subset
+from .cache import ResponseCache, open_response_cache
+from .stats import accuracy_intervals, intervals_separated
+from .utils import (
+    RESULTS_STREAM,
+    ResultsWriter,
+    combine_model_stats,
+    completed_samples,
+    load_model_stats,
+    load_streamed_results,
+    configure_cpu,
+    save_config_snapshot,
+    save_model_stats,
+    save_results,
+    save_results_chunks
+)
+from .aggregation import aggregate_results, result_chunks, result_columns, stream_chunks
+from .reporting import report_aggregates
+from .results_store import append_run, results_store_dir
+from .scoring import rescore_stream
+from .config import load_config
+from .profiling import region
+
+def _model_names(config: dict) -> List[str]:
+    return [model_config['display_name'] for model_config in config['models'].values()]
+
+def _open_writer(config: dict, run_dir: Path, subset_name: str) -> ResultsWriter:
+    """Opens the append-only result stream of a subset."""
+    return ResultsWriter(
+        run_dir / subset_name / RESULTS_STREAM,
+        config['output'].get('flush_every', 32)
+    )
+
+def _shard_samples(config: dict, num_samples: int, offset: int) -> Optional[List[int]]:
+    """Returns the sample indices this process runs, or None when the run is not sharded."""
+    num_shards = config['dataset'].get('num_shards', 1)
+    if num_shards <= 1:
+        return None
+    return shard_indices(num_samples, offset, config['dataset'].get('shard_index', 0), num_shards)
+
+def _adaptive_chunks(sample_indices: List[int], initial: int, growth: float) -> Iterator[List[int]]:
+    """Splits sample indices into consecutive chunks of geometrically growing size."""
+    start = 0
+    size = max(initial, 1)
+    while start < len(sample_indices):
+        yield sample_indices[start:start + size]
+        start += size
+        size = max(int(size * growth), size + 1)
+
+class _AccuracyCounts:
+    """Passes result rows on to a ``ResultsWriter`` and counts each model's correct and total rows."""
+
+    def __init__(self, writer: ResultsWriter):
+        self.writer = writer
+        self.correct = Counter()
+        self.total = Counter()
+
+    def count(self, rows: List[Dict]) -> None:
+        for row in rows:
+            score = row.get('top1_accuracy')
+            self.total[row['model_name']] += 1
+            # Rows without a score (failed samples) count as wrong
+            if score is not None and score == score:
+                self.correct[row['model_name']] += score
+
+    def write(self, rows: List[Dict]) -> None:
+        self.count(rows)
+        self.writer.write(rows)
+
+    def flush(self) -> None:
+        self.writer.flush()
+
+def _run_adaptive(
+    dataset: Any,
+    config: dict,
+    run_dir: Path,
+    subset_name: str,
+    model_pool: ModelPool,
+    model_keys: List[str],
+    prepared: PreparedSubset,
+    response_cache: Optional[ResponseCache],
+    writer: ResultsWriter,
+    completed: Set[Tuple[str, str, int]],
+    sample_indices: Optional[List[int]]
+) -> None:
+    """Runs a subset in growing chunks until the accuracy estimates are precise enough.
+
+    After every chunk each model's accuracy interval is recomputed from its
+    correct and total row counts. A model stops once its interval half-width is at most
+    ``evaluation.adaptive_target_half_width``; with several models the whole
+    subset stops as soon as their intervals no longer overlap. The dataset
+    is shuffled on load, so every chunk extends a random sample.
+    """
+    eval_config = config['evaluation']
+    confidence = eval_config.get('confidence_level', 0.95)
+    method = eval_config.get('interval_method', 'wilson')
+    target = eval_config.get('adaptive_target_half_width', 0.05)
+    stop_on_separation = eval_config.get('adaptive_stop_on_separation', True)
+    seed = config['dataset'].get('random_seed')
+    if sample_indices is None:
+        sample_indices = list(range(len(dataset)))
+
+    names = {key: config['models'][key]['display_name'] for key in model_keys}
+    active = list(model_keys)
+    # Counted from the rows as they are written; rows of an earlier attempt are counted once up front
+    counts = _AccuracyCounts(writer)
+    for recorded in stream_chunks(run_dir, [subset_name]):
+        counts.count(recorded[recorded['error'].isna()].to_dict('records'))
+    chunks = _adaptive_chunks(
+        sample_indices,
+        eval_config.get('adaptive_initial_samples', 32),
+        eval_config.get('adaptive_growth', 2.0)
+    )
+    for chunk in chunks:
+        run_benchmark(dataset, config, subset_name, model_pool, active, prepared, response_cache, counts, completed, chunk)
+
+        lows, highs = accuracy_intervals(
+            [counts.correct[name] for name in names.values()],
+            [counts.total[name] for name in names.values()],
+            confidence, method, seed
+        )
+        intervals = {key: (float(low), float(high)) for key, low, high in zip(names, lows, highs)}
+
+        for key in list(active):
+            low, high = intervals[key]
+            if (high - low) / 2 <= target:
+                print(f"{names[key]} on {subset_name}: {confidence:.0%} CI [{low:.3f}, {high:.3f}] "
+                      f"reached the target half-width, stopping")
+                active.remove(key)
+
+        if stop_on_separation and len(model_keys) > 1 and intervals_separated(intervals):
+            print(f"Model rankings on {subset_name} are separated at {confidence:.0%} confidence, stopping")
+            break
+        if not active:
+            break
+
+def _save_streamed_results(config: dict, run_dir: Path, subsets: List[str], out_dir: Path) -> None:
+    """Saves the results of ``subsets`` from their streams into ``out_dir``.
+
+    The csv and json files are written ``output.report_chunk_rows`` rows at
+    a time; only the pickle format loads the results as a whole.
+    """
+    save_results_chunks(
+        result_chunks(run_dir, subsets, _model_names(config), config['output'].get('report_chunk_rows', 50_000)),
+        result_columns(run_dir, subsets),
+        config,
+        out_dir
+    )
+    if 'pickle' in config['output'].get('save_format', ['csv']):
+        save_results(load_streamed_results(run_dir, subsets, _model_names(config)), {"output": {"save_format": ["pickle"]}}, out_dir)
+
+def save_subset_results(config: dict, run_dir: Path, subset_name: str) -> None:
+    """Saves one subset's results from its stream into its directory."""
+    stream = run_dir / subset_name / RESULTS_STREAM
+    if not stream.exists() or stream.stat().st_size == 0:
+        print(f"No results generated for subset {subset_name}")
+        return
+
+    if config['output'].get('save_results', False):
+        subset_dir = run_dir / subset_name
+        with region("save_results"):
+            _save_streamed_results(config, run_dir, [subset_name], subset_dir)
+        print(f"Intermediate results for {subset_name} saved to {subset_dir}")
+
+def _run_subset_major(
+    config: dict,
+    run_dir: Path,
+    model_pool: ModelPool,
+    response_cache: Optional[ResponseCache],
+    completed: Set[Tuple[str, str, int]]
+) -> None:
+    """Runs every model on one subset before moving to the next subset."""
+    offset = 0
+    for subset_name in config['dataset']['subsets']:
+        print(f"\n=== Processing Dataset Subset: {subset_name} ===")
+
+        try:
+            with region("load_benchmark_data"):
+                dataset = load_benchmark_data(subset_name, config)
+            sample_indices = _shard_samples(config, len(dataset), offset)
+            offset += len(dataset)
+            with _open_writer(config, run_dir, subset_name) as writer:
+                if config.get('evaluation', {}).get('adaptive', False):
+                    _run_adaptive(
+                        dataset,
+                        config,
+                        run_dir,
+                        subset_name,
+                        model_pool,
+                        list(config['models']),
+                        prepare_subset(dataset, config, subset_name),
+                        response_cache,
+                        writer,
+                        completed,
+                        sample_indices
+                    )
+                else:
+                    run_benchmark(
+                        dataset,
+                        config,
+                        subset_name,
+                        model_pool,
+                        response_cache=response_cache,
+                        results_writer=writer,
+                        completed=completed,
+                        sample_indices=sample_indices
+                    )
+            save_subset_results(config, run_dir, subset_name)
+
+        except Exception as e:
+            print(f"Error processing subset {subset_name}: {e}")
+            continue
+
+def _run_model_major(
+    config: dict,
+    run_dir: Path,
+    model_pool: ModelPool,
+    response_cache: Optional[ResponseCache],
+    completed: Set[Tuple[str, str, int]]
+) -> None:
+    """Loads one model at a time, runs it on every subset and frees it before the next."""
+    # Prompts are formatted once per subset, in subset order, so every model
+    # sees the same prompts as under the subset-major schedule
+    prepared = {}
+    offset = 0
+    for subset_name in config['dataset']['subsets']:
+        print(f"\n=== Preparing Dataset Subset: {subset_name} ===")
+        try:
+            with region("load_benchmark_data"):
+                dataset = load_benchmark_data(subset_name, config)
+            sample_indices = _shard_samples(config, len(dataset), offset)
+            offset += len(dataset)
+            prepared[subset_name] = (dataset, prepare_subset(dataset, config, subset_name), sample_indices)
+        except Exception as e:
+            print(f"Error processing subset {subset_name}: {e}")
+
+    for model_key, model_config in config['models'].items():
+        print(f"\n=== Processing Model: {model_config['display_name']} ===")
+
+        for subset_name, (dataset, prepared_subset, sample_indices) in prepared.items():
+            try:
+                with _open_writer(config, run_dir, subset_name) as writer:
+                    # Models run one at a time here, so adaptive stopping uses the half-width rule alone
+                    if config.get('evaluation', {}).get('adaptive', False):
+                        _run_adaptive(
+                            dataset,
+                            config,
+                            run_dir,
+                            subset_name,
+                            model_pool,
+                            [model_key],
+                            prepared_subset,
+                            response_cache,
+                            writer,
+                            completed,
+                            sample_indices
+                        )
+                    else:
+                        run_benchmark(
+                            dataset,
+                            config,
+                            subset_name,
+                            model_pool,
+                            [model_key],
+                            prepared_subset,
+                            response_cache,
+                            writer,
+                            completed,
+                            sample_indices
+                        )
+            except Exception as e:
+                print(f"Error processing subset {subset_name} for model {model_config['display_name']}: {e}")
+
+        model_pool.release(model_key)
+
+    for subset_name in prepared:
+        save_subset_results(config, run_dir, subset_name)
+
+def _run_model_parallel(
+    config: dict,
+    run_dir: Path,
+    completed: Set[Tuple[str, str, int]]
+) -> Dict[str, Dict]:
+    """Prepares every subset once, then runs all models at the same time, one worker process each.
+
+    Returns the model load statistics collected by the workers.
+    """
+    subsets = []
+    offset = 0
+    for subset_name in config['dataset']['subsets']:
+        print(f"\n=== Preparing Dataset Subset: {subset_name} ===")
+        try:
+            with region("load_benchmark_data"):
+                dataset = load_benchmark_data(subset_name, config)
+            sample_indices = _shard_samples(config, len(dataset), offset)
+            offset += len(dataset)
+            write_shared_subset(run_dir / "shared" / subset_name, dataset, prepare_subset(dataset, config, subset_name))
+            subsets.append((subset_name, sample_indices))
+        except Exception as e:
+            print(f"Error processing subset {subset_name}: {e}")
+
+    with contextlib.ExitStack() as stack:
+        writers = {
+            subset_name: stack.enter_context(_open_writer(config, run_dir, subset_name))
+            for subset_name, _ in subsets
+        }
+        model_stats = run_model_workers(config, run_dir / "shared", subsets, writers, completed)
+
+    for subset_name, _ in subsets:
+        save_subset_results(config, run_dir, subset_name)
+    return model_stats
 
 def run_benchmark_pipeline(
     config: dict,
     run_dir: Path,
-    subset: Optional[str] = None
+    subset: Optional[str] = None,
+    resume: bool = False
 ) -> None:
     """Core benchmark pipeline that handles the entire benchmarking process.
-    
+
+    Rows are streamed to ``<run_dir>/<subset>/results.jsonl`` as they are
+    produced, and the saved results and report are rebuilt from those files.
+
     Args:
         config: Configuration dictionary
         run_dir: Output directory for results
         subset: Optional specific subset to run
+        resume: Continue an interrupted run in ``run_dir``, skipping the
+            (model, subset, sample) triples it already recorded
     """
     # Set random seed if specified
     if config['dataset'].get('random_seed') is not None:
@@ -34,45 +351,95 @@ def run_benchmark_pipeline(
         if torch.cuda.is_available():
             torch.cuda.manual_seed_all(seed)
 
+    configure_cpu(config)
+
     # Override subset if specified
     if subset:
         print(f"Overriding config subsets with: {subset}")
         config['dataset']['subsets'] = [subset]
 
-    # Process each dataset subset
-    results = []
-    for subset_name in config['dataset']['subsets']:
-        print(f"\n=== Processing Dataset Subset: {subset_name} ===")
-        
-        try:
-            dataset = load_benchmark_data(subset_name, config)
-            result_df = run_benchmark(dataset, config, subset_name)
-            
-            if not result_df.empty:
-                results.append(result_df)
-                
-                if config['output'].get('save_results', False):
-                    subset_dir = run_dir / subset_name
-                    save_results(result_df, config, subset_dir)
-                    print(f"Intermediate results for {subset_name} saved to {subset_dir}")
-            else:
-                print(f"No results generated for subset {subset_name}")
-                
-        except Exception as e:
-            print(f"Error processing subset {subset_name}: {e}")
-            continue
+    if resume:
+        completed = completed_samples(run_dir, config['dataset']['subsets'])
+        print(f"Resuming run in {run_dir}: {len(completed)} samples already recorded")
+    else:
+        completed = set()
+        save_config_snapshot(config, run_dir)
+
+    # Every model is loaded at most once per run unless the pool is bounded
+    eval_config = config.get('evaluation', {})
+    schedule = eval_config.get('schedule', 'subset_major')
+    model_pool = ModelPool(config, eval_config.get('max_resident_models'))
+    response_cache = open_response_cache(config)
+
+    try:
+        if schedule == 'subset_major':
+            _run_subset_major(config, run_dir, model_pool, response_cache, completed)
+        elif schedule == 'model_major':
+            _run_model_major(config, run_dir, model_pool, response_cache, completed)
+        elif schedule == 'model_parallel':
+            model_pool.stats.update(_run_model_parallel(config, run_dir, completed))
+        else:
+            raise ValueError(f"Unknown evaluation.schedule '{schedule}'")
+    finally:
+        model_pool.clear()
+        if response_cache is not None:
+            response_cache.close()
+
+    model_stats = model_pool.stats
+    if resume:
+        model_stats = combine_model_stats([load_model_stats(run_dir), model_stats])
+    save_model_stats(model_stats, run_dir)
+    finalize_run(config, run_dir, model_stats)
 
-    # Process final results
-    if not results:
+def finalize_run(config: dict, run_dir: Path, model_stats: Optional[Dict[str, Dict]] = None) -> None:
+    """Saves the combined results of a run from its streams, adds them to the results store and reports.
+
+    The report is aggregated and the combined results are written from the
+    streams ``output.report_chunk_rows`` rows at a time, and the results
+    store is fed one subset at a time, so the run is never loaded as a whole
+    (except to write the pickle format).
+    """
+    output_config = config['output']
+    subsets = config['dataset']['subsets']
+    with region("aggregate_results"):
+        chunks = stream_chunks(run_dir, subsets, output_config.get('report_chunk_rows', 50_000))
+        aggregator = aggregate_results(chunks, output_config.get('warmup_samples', 0))
+    if aggregator.n_rows == 0:
         print("\nNo results were generated across all subsets.")
         return
 
-    final_results = pd.concat(results, ignore_index=True)
-
     # Save combined results
-    if config['output'].get('save_results', False):
-        save_results(final_results, config, run_dir)
+    if output_config.get('save_results', False):
+        with region("save_results"):
+            _save_streamed_results(config, run_dir, subsets, run_dir)
         print(f"Combined results saved to {run_dir}")
 
+    # Shards are added to the store once merged
+    if output_config.get('results_store', False) and config['dataset'].get('num_shards', 1) == 1:
+        store_dir = results_store_dir(config)
+        for subset_name in subsets:
+            subset_results = load_streamed_results(run_dir, [subset_name], _model_names(config))
+            if not subset_results.empty:
+                append_run(subset_results, store_dir, run_dir.name)
+
     # Generate final report
-    generate_report(final_results, config, run_dir) 
\ No newline at end of file
+    with region("generate_report"):
+        report_aggregates(aggregator, config, run_dir, model_stats)
+
+def rescore_run(run_dir: Path, chunk_rows: int = 100_000) -> None:
+    """Recomputes ``extracted_answer`` and ``top1_accuracy`` of a finished run from its stored generations.
+
+    Each subset stream is rewritten in chunks of ``chunk_rows`` rows, then
+    the run's combined results, report and results store entry are rebuilt.
+    No model is loaded.
+    """
+    run_dir = Path(run_dir)
+    config = load_config(str(run_dir / "config.yaml"))
+    for subset_name in config['dataset']['subsets']:
+        stream = run_dir / subset_name / RESULTS_STREAM
+        if not stream.exists():
+            continue
+        changed = rescore_stream(stream, config, chunk_rows)
+        print(f"{subset_name}: {changed} rows changed answer or score")
+        save_subset_results(config, run_dir, subset_name)
+    finalize_run(config, run_dir, load_model_stats(run_dir))
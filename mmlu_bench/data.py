@@ -1,13 +1,17 @@
 """Data loading and processing utilities for MMLU benchmarking."""
 
 from typing import Dict, List, Optional
-from datasets import load_dataset, get_dataset_split_names
 import random
-import torch
 import numpy as np
+from .store import load_stored_dataset
 
-def load_benchmark_data(subset_name: str, config: Dict) -> Dict:
-    """Loads and processes MMLU dataset subsets."""
+def load_benchmark_data(subset_name: str, config: Dict, use_store: bool = True) -> Dict:
+    """Loads and processes MMLU dataset subsets.
+
+    When ``dataset.prepared_dir`` holds this subset with the configured
+    selection (see ``mmlu-bench prepare``), it is memory-mapped from there
+    without touching the network.
+    """
     dataset_provider = config['dataset']['provider']
     split = config['dataset']['split']
     n_samples = config['dataset']['sample_size']
@@ -17,6 +21,14 @@ def load_benchmark_data(subset_name: str, config: Dict) -> Dict:
         random.seed(seed)
         np.random.seed(seed)
 
+    if use_store:
+        stored = load_stored_dataset(config, subset_name)
+        if stored is not None:
+            print(f"Loaded {subset_name} from prepared store")
+            return stored
+
+    from datasets import load_dataset, get_dataset_split_names
+
     try:
         available_splits = get_dataset_split_names(dataset_provider, subset_name)
         if split not in available_splits:
@@ -43,4 +55,15 @@ def get_expected_answer_letter(sample: Dict) -> Optional[str]:
     try:
         return options[sample['answer']]
     except (IndexError, KeyError):
-        return None 
\ No newline at end of file
+        return None 
+
+def shard_indices(num_samples: int, offset: int, shard_index: int, num_shards: int) -> List[int]:
+    """Returns the sample indices of a subset that belong to one shard.
+
+    The work list of a run is every (subset, sample) pair in config order,
+    after the seeded shuffle in ``load_benchmark_data``. Item ``k`` of that
+    list goes to shard ``k % num_shards``; ``offset`` is the number of samples
+    in the subsets before this one.
+    """
+    first = (shard_index - offset) % num_shards
+    return list(range(first, num_samples, num_shards))
@@ -1,14 +1,15 @@
 """Evaluation metrics and result processing."""
 
-from typing import Dict, Any
-import traceback
-from .utils import get_device_settings
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Any
+from .utils import ResultsWriter
 import pandas as pd
 from tqdm import tqdm
-import torch
-from .generation import load_model_and_tokenizer, generate_response
+from .backends import ModelPool
+from .cache import ResponseCache, cache_settings, response_key
+from .store import load_stored_prompts
 from .data import get_expected_answer_letter
-from .prompting import format_mmlu_prompt
+from .profiling import region
+from .prompting import MMLUPrompt, build_mmlu_prompts, render_mmlu_blocks, select_fixed_shots
 
 def evaluate_mmlu_response(
     extracted_answer: str,
@@ -21,108 +22,210 @@ def evaluate_mmlu_response(
     
     return 1 if extracted_answer.strip().upper() == expected_letter else 0
 
+class PreparedSubset(NamedTuple):
+    """Prompts and reference answers of a subset, shared by every model that runs it.
+
+    ``answered_blocks`` holds every example rendered as a few-shot example,
+    which backends use to rebuild prompts with fewer shots.
+    """
+    prompt_parts: List[MMLUPrompt]
+    expected_letters: List[Optional[str]]
+    choices: List[List[str]]
+    from_store: bool = False
+    answered_blocks: Optional[List[str]] = None
+
+def prepare_subset(dataset: Any, config: Dict, subset_name: Optional[str] = None) -> PreparedSubset:
+    """Formats every prompt of a subset once so all models see identical prompts.
+
+    With ``subset_name``, prompts rendered by ``mmlu-bench prepare`` are
+    taken from the prepared store when they match what formatting would give.
+    """
+    stored_prompts = load_stored_prompts(config, subset_name) if subset_name else None
+
+    num_shots = config['prompt'].get('num_shots', 0)
+    shot_pool = None
+    if config['prompt'].get('fixed_shots', False) and num_shots > 0:
+        shot_pool = select_fixed_shots(len(dataset), num_shots, config['dataset'].get('random_seed'))
+
+    # Format prompts based on dataset type
+    if config['dataset']['name'].lower() == 'mmlu':
+        with region("format_prompts"):
+            blocks = render_mmlu_blocks(dataset)
+            if stored_prompts is not None:
+                prompt_parts = stored_prompts
+            else:
+                prompt_parts = build_mmlu_prompts(dataset, config, shot_pool, blocks)
+        expected_letters = [
+            get_expected_answer_letter({'answer': answer}) for answer in dataset['answer']
+        ]
+        choices = list(dataset['choices'])
+        return PreparedSubset(prompt_parts, expected_letters, choices, stored_prompts is not None, blocks[1])
+
+    print(f"Warning: Prompt formatting not implemented for dataset '{config['dataset']['name']}'")
+    prompt_parts = [MMLUPrompt("", "", str(sample)) for sample in dataset]
+    return PreparedSubset(prompt_parts, [None] * len(prompt_parts), [[] for _ in prompt_parts])
+
+def _make_row(
+    config: Dict,
+    subset_name: str,
+    model_display_name: str,
+    sample_index: int,
+    prompt: str,
+    expected_letter: Optional[str],
+    output: Any
+) -> Dict[str, Any]:
+    """Builds the result row of one (model, sample) from its output record or exception."""
+    row = {
+        "model_name": model_display_name,
+        "dataset_name": config['dataset']['name'],
+        "dataset_subset": subset_name,
+        "sample_index": sample_index,
+        "prompt_truncated": prompt[:100] + "...",
+        "expected_answer": expected_letter
+    }
+
+    if isinstance(output, Exception):
+        row.update({
+            "error": str(output),
+            "inference_time_s": 0,
+            "top1_accuracy": 0,
+            "num_shots": config['prompt'].get('num_shots', 0)
+        })
+        return row
+
+    output = dict(output)
+
+    # Evaluate based on dataset type
+    if config['dataset']['name'].lower() == 'mmlu':
+        top1_score = evaluate_mmlu_response(output['extracted_answer'], expected_letter, config)
+    else:
+        top1_score = None
+
+    row.update({
+        "raw_generated_text": output.pop('raw_generated_text'),
+        "extracted_answer": output.pop('extracted_answer'),
+        "inference_time_s": output.pop('inference_time_s'),
+        "top1_accuracy": top1_score,
+        "num_shots": config['prompt'].get('num_shots', 0)
+    })
+    row.update(output)
+    return row
+
 def run_benchmark(
     dataset: Any,
     config: Dict,
-    subset_name: str
-) -> pd.DataFrame:
-    """Runs the benchmark for configured models on a dataset subset."""
-    # Load models based on config
-    models_to_load = config['models']
-    loaded_models = {}
-    for key, model_config in models_to_load.items():
-        model, tokenizer = load_model_and_tokenizer(model_config['name'], config)
-        loaded_models[model_config['display_name']] = {"model": model, "tokenizer": tokenizer}
+    subset_name: str,
+    model_pool: Optional[ModelPool] = None,
+    model_keys: Optional[List[str]] = None,
+    prepared: Optional[PreparedSubset] = None,
+    response_cache: Optional[ResponseCache] = None,
+    results_writer: Optional[ResultsWriter] = None,
+    completed: Optional[Set[Tuple[str, str, int]]] = None,
+    sample_indices: Optional[List[int]] = None
+) -> Optional[pd.DataFrame]:
+    """Runs the benchmark for configured models on a dataset subset.
+
+    Models are taken from ``model_pool`` (a private pool that loads every
+    configured model is used if none is given) and restricted to
+    ``model_keys`` when set; each one scores its samples through its
+    ``backends.ModelBackend``. Pass ``prepared`` to reuse prompts that were
+    already formatted for this subset. Samples found in ``response_cache``
+    are not run again, and new responses are stored in it.
+
+    Rows are handed to ``results_writer`` as soon as their batch finishes
+    and are not kept in memory; None is returned. Without a writer the rows
+    are returned as a DataFrame in sample order. (model, subset, sample
+    index) triples in ``completed`` were recorded by an earlier attempt and
+    are skipped. ``sample_indices`` restricts the run to part of the subset
+    (e.g. one shard); prompts are still formatted for every sample so
+    few-shot picks match a full run.
+    """
+    owns_pool = model_pool is None
+    if owns_pool:
+        model_pool = ModelPool(config)
+    if model_keys is None:
+        model_keys = list(config['models'])
+    completed = completed or set()
+    if sample_indices is None:
+        sample_indices = range(len(dataset))
 
     results = []
-    device, _ = get_device_settings(config)
 
-    print(f"\n--- Starting Benchmark: {subset_name} ({len(dataset)} samples) ---")
+    print(f"\n--- Starting Benchmark: {subset_name} ({len(sample_indices)} of {len(dataset)} samples) ---")
     print(f"Using {config['prompt'].get('num_shots', 0)}-shot prompting")
 
-    # Create progress bars dictionary for each model
-    pbars = {
-        display_name: tqdm(
-            total=len(dataset),
-            desc=f"{display_name}",
-            position=idx,
-            leave=False
-        )
-        for idx, display_name in enumerate(loaded_models.keys())
-    }
+    if prepared is None:
+        prepared = prepare_subset(dataset, config, subset_name)
+    prompts = [parts.text for parts in prepared.prompt_parts]
+    expected_letters = prepared.expected_letters
+
+    # Score each model through its backend
+    for idx, model_key in enumerate(model_keys):
+        model_display_name = config['models'][model_key]['display_name']
+        pending = [
+            i for i in sample_indices
+            if (model_display_name, subset_name, i) not in completed
+        ]
+        if not pending:
+            print(f"{model_display_name}: all {len(sample_indices)} samples already recorded, skipping")
+            continue
+
+        backend = model_pool.get(model_key)
+
+        pbar = tqdm(total=len(sample_indices), desc=f"{model_display_name}", position=idx, leave=False)
+        pbar.update(len(sample_indices) - len(pending))
+        # Order in which this model computed its samples, so warm-up can be dropped from latency stats
+        run_order = 0
+
+        def emit(indices: List[int], batch_outputs: List[Any]) -> None:
+            rows = [
+                _make_row(config, subset_name, model_display_name, i, prompts[i], expected_letters[i], output)
+                for i, output in zip(indices, batch_outputs)
+            ]
+            if results_writer is not None:
+                results_writer.write(rows)
+            else:
+                results.extend(rows)
+            pbar.update(len(rows))
+
+        # Serve stored responses first; only the misses reach the model
+        if response_cache is not None:
+            identity = backend.identity()
+            settings = cache_settings(config, backend.prompt_budget(prepared, config))
+            keys = {i: response_key(identity, prompts[i], settings) for i in pending}
+            cached_records = response_cache.get_many(list(keys.values()))
+            hits = [i for i in pending if keys[i] in cached_records]
+            emit(hits, [{**cached_records[keys[i]], "response_cache_hit": True} for i in hits])
+            pending = [i for i in pending if keys[i] not in cached_records]
+
+        for batch in backend.score(pending, prepared, config, subset_name):
+            scored = [
+                (i, output) for i, output in zip(batch.indices, batch.outputs)
+                if not isinstance(output, Exception)
+            ]
+            if response_cache is not None and scored:
+                response_cache.put_many({keys[i]: output for i, output in scored})
+            for position, (output, info) in enumerate(zip(batch.outputs, batch.run_info)):
+                if isinstance(output, Exception):
+                    continue
+                output.update(info)
+                output['run_order'] = run_order + position
+                if response_cache is not None:
+                    output['response_cache_hit'] = False
+
+            run_order += len(batch.indices)
+            emit(batch.indices, batch.outputs)
 
-    # Loop through each sample in the loaded data
-    for i, sample in enumerate(dataset):
-        # Format prompt based on dataset type
-        if config['dataset']['name'].lower() == 'mmlu':
-            prompt = format_mmlu_prompt(sample, config, dataset, i)
-            expected_letter = get_expected_answer_letter(sample)
-        else:
-            print(f"Warning: Prompt formatting not implemented for dataset '{config['dataset']['name']}'")
-            prompt = str(sample)
-            expected_letter = None
-
-        # Generate and evaluate for each model
-        for model_display_name, model_data in loaded_models.items():
-            model = model_data["model"]
-            tokenizer = model_data["tokenizer"]
-
-            try:
-                raw_generated, extracted_answer, inference_time = generate_response(
-                    model,
-                    tokenizer,
-                    prompt,
-                    config['generation']
-                )
-
-                # Evaluate based on dataset type
-                if config['dataset']['name'].lower() == 'mmlu':
-                    top1_score = evaluate_mmlu_response(extracted_answer, expected_letter, config)
-                else:
-                    top1_score = None
-
-                # Update progress bar
-                pbar = pbars[model_display_name]
-                pbar.update(1)
-                pbar.set_description(f"{model_display_name} ({i+1}/{len(dataset)})")
-
-                # Store results
-                results.append({
-                    "model_name": model_display_name,
-                    "dataset_name": config['dataset']['name'],
-                    "dataset_subset": subset_name,
-                    "prompt_truncated": prompt[:100] + "...",
-                    "expected_answer": expected_letter,
-                    "raw_generated_text": raw_generated,
-                    "extracted_answer": extracted_answer,
-                    "inference_time_s": inference_time,
-                    "top1_accuracy": top1_score,
-                    "num_shots": config['prompt'].get('num_shots', 0)
-                })
-
-            except Exception as e:
-                print(f"\nError during generation/evaluation for model {model_display_name}, sample {i}: {e}")
-                traceback.print_exc()
-                results.append({
-                    "model_name": model_display_name,
-                    "dataset_name": config['dataset']['name'],
-                    "dataset_subset": subset_name,
-                    "prompt_truncated": prompt[:100] + "...",
-                    "expected_answer": expected_letter,
-                    "error": str(e),
-                    "inference_time_s": 0,
-                    "top1_accuracy": 0,
-                    "num_shots": config['prompt'].get('num_shots', 0)
-                })
-                pbars[model_display_name].update(1)
-
-            if device.type == "cuda":
-                del raw_generated, extracted_answer
-                torch.cuda.empty_cache()
-
-    # Close progress bars
-    for pbar in pbars.values():
         pbar.close()
 
+    if owns_pool:
+        model_pool.clear()
     print(f"\n--- Benchmark Complete: {subset_name} ---")
-    return pd.DataFrame(results) 
\ No newline at end of file
+    if results_writer is not None:
+        results_writer.flush()
+        return None
+
+    # Return rows in sample order, one per (sample, model)
+    model_order = {config['models'][key]['display_name']: i for i, key in enumerate(model_keys)}
+    results.sort(key=lambda row: (row['sample_index'], model_order[row['model_name']]))
+    return pd.DataFrame(results)
@@ -1,45 +1,304 @@
 """Model loading and inference utilities."""
 
-import re
+import copy
 import time
-from typing import Dict, Tuple, Any
+import contextlib
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig
-from .utils import get_device_settings
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    GenerationConfig,
+    LogitsProcessor,
+    LogitsProcessorList
+)
+from .utils import bf16_autocast_supported, get_cpu_mode, get_device_settings
+from .cache import ResponseCache, cache_settings, model_identity, response_key
+from .scoring import extract_answer
 
-def load_model_and_tokenizer(model_name: str, config: Dict) -> Tuple[Any, Any]:
+ANSWER_LETTERS = ['A', 'B', 'C', 'D']
+
+def load_model_and_tokenizer(model_name: str, config: Dict, revision: Optional[str] = None) -> Tuple[Any, Any]:
     """Loads model and tokenizer with specified configuration."""
     device, dtype = get_device_settings(config)
 
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
+    # Batched decoder-only generation needs the prompt flush against the new tokens
+    tokenizer.padding_side = 'left'
 
     model = AutoModelForCausalLM.from_pretrained(
         model_name,
+        revision=revision,
         torch_dtype=dtype,
         device_map='auto',
         low_cpu_mem_usage=config['hardware'].get('low_cpu_mem_usage', False)
     )
     model.eval()
-    
+
+    if device.type == "cpu":
+        model = apply_cpu_mode(model, tokenizer, config)
+
     return model, tokenizer
 
-def generate_response(
-    model: Any,
+def cpu_autocast(config: Dict) -> Any:
+    """Context that runs CPU inference under bfloat16 autocast when ``cpu_mode.autocast_bf16`` is on."""
+    if get_cpu_mode(config).get('autocast_bf16', False) and bf16_autocast_supported():
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def apply_cpu_mode(model: Any, tokenizer: Any, config: Dict) -> Any:
+    """Applies the model transforms of ``hardware.cpu_mode``.
+
+    ``quantize: dynamic_int8`` swaps ``nn.Linear`` layers for dynamically
+    quantized int8 ones; ``compile`` wraps the forward pass in
+    ``torch.compile`` and runs ``compile_warmup`` short generations so
+    compilation is not charged to the first benchmark samples.
+    """
+    cpu_mode = get_cpu_mode(config)
+
+    if cpu_mode.get('autocast_bf16', False) and not bf16_autocast_supported():
+        print("Warning: this CPU has no native bfloat16 support, running without autocast")
+
+    quantize = cpu_mode.get('quantize', 'none')
+    if quantize == 'dynamic_int8':
+        model = torch.ao.quantization.quantize_dynamic(model.float(), {torch.nn.Linear}, dtype=torch.qint8)
+    elif quantize != 'none':
+        raise ValueError(f"Unknown hardware.cpu_mode.quantize '{quantize}'")
+
+    if cpu_mode.get('compile', False):
+        model.forward = torch.compile(model.forward, dynamic=True)
+        warmup_ids = tokenizer("Question: warm up\nAnswer:")['input_ids']
+        warmup_config = GenerationConfig(
+            max_new_tokens=config['generation'].get('max_new_tokens', 5),
+            min_new_tokens=config['generation'].get('max_new_tokens', 5),
+            pad_token_id=tokenizer.pad_token_id
+        )
+        # Batches of one are compiled separately, so warm up at the configured batch size
+        warmup_batch = max(config['generation'].get('batch_size', 1), 2)
+        with torch.no_grad(), cpu_autocast(config):
+            for step in range(cpu_mode.get('compile_warmup', 2)):
+                # Vary the length so the dynamic-shape graph is the one reused later
+                input_ids = torch.tensor([warmup_ids * (step + 1)] * warmup_batch, device=model.device)
+                model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), generation_config=warmup_config)
+
+    return model
+
+# Config attributes that hold a model's maximum sequence length
+CONTEXT_WINDOW_KEYS = ('max_position_embeddings', 'n_positions', 'max_sequence_length', 'seq_length')
+
+def context_window(model: Any, tokenizer: Any) -> Optional[int]:
+    """Longest input a model accepts: its position limit, capped by the tokenizer's ``model_max_length``.
+
+    Returns None when neither is known (tokenizers without a limit report a
+    huge placeholder value).
+    """
+    limits = [getattr(model.config, key, None) for key in CONTEXT_WINDOW_KEYS]
+    limits = [limit for limit in limits if isinstance(limit, int) and limit > 0]
+    if tokenizer.model_max_length < 1e12:
+        limits.append(tokenizer.model_max_length)
+    return min(limits) if limits else None
+
+def encode_prompts(
     tokenizer: Any,
-    prompt: str,
-    generation_config: Dict
-) -> Tuple[str, str, float]:
-    """Generates model response and extracts the answer."""
-    inputs = tokenizer(
-        prompt, 
-        return_tensors="pt",
+    prompts: List[str],
+    add_special_tokens: bool = True,
+    max_length: Optional[int] = None
+) -> List[List[int]]:
+    """Tokenizes prompts without padding so they can be bucketed by length.
+
+    Prompts are truncated to the tokenizer's ``model_max_length``; with
+    ``max_length`` they instead keep their last ``max_length`` tokens, so the
+    question and the "Answer:" cue at the end survive.
+    """
+    ids = tokenizer(
+        prompts,
         padding=False,
-        truncation=True
-    ).to(model.device)
+        truncation=max_length is None,
+        add_special_tokens=add_special_tokens
+    )['input_ids']
+    if max_length is not None:
+        ids = [prompt_ids[-max_length:] for prompt_ids in ids]
+    return ids
 
-    gen_config = GenerationConfig(
+def make_batches(
+    lengths: List[int],
+    batch_size: int,
+    max_tokens_per_batch: Optional[int] = None
+) -> List[List[int]]:
+    """Groups sample indices into batches of similar token length.
+
+    Indices are sorted by length so each batch pads as little as possible. A
+    batch is closed when it holds ``batch_size`` samples or when adding the
+    next sample would push its padded size (rows x longest row) over
+    ``max_tokens_per_batch``.
+    """
+    batches = []
+    current = []
+    current_max = 0
+    for idx in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        longest = max(current_max, lengths[idx])
+        over_budget = (
+            max_tokens_per_batch is not None
+            and (len(current) + 1) * longest > max_tokens_per_batch
+        )
+        if current and (len(current) >= batch_size or over_budget):
+            batches.append(current)
+            current, longest = [], lengths[idx]
+        current.append(idx)
+        current_max = longest
+    if current:
+        batches.append(current)
+    return batches
+
+def _left_pad(batch_ids: List[List[int]], pad_token_id: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Left-pads token id lists into input_ids and attention_mask tensors."""
+    max_len = max(len(ids) for ids in batch_ids)
+    input_ids = torch.full((len(batch_ids), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch_ids), max_len), dtype=torch.long)
+    for row, ids in enumerate(batch_ids):
+        if ids:
+            input_ids[row, max_len - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, max_len - len(ids):] = 1
+    return input_ids, attention_mask
+
+class PrefixEntry(NamedTuple):
+    """Token ids of a shared prompt prefix and the ``past_key_values`` computed for it."""
+    input_ids: List[int]
+    past_key_values: Any
+
+class PrefixCache:
+    """LRU cache of ``past_key_values`` for prompt prefixes shared across samples.
+
+    Each prefix is prefilled once with a single forward pass; every batch that
+    shares it gets its own copy of the cache and only prefills its suffixes.
+    """
+
+    def __init__(self, model: Any, tokenizer: Any, max_entries: int = 8):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.prefill_tokens_saved = 0
+
+    def get(self, prefix_ids: Tuple[int, ...], n_samples: int = 1) -> Tuple[PrefixEntry, bool]:
+        """Returns the entry for prefix token ids used by ``n_samples`` samples and whether it was cached.
+
+        The ids are the leading tokens of the samples' full prompts (see
+        ``shared_prefix_ids``), so the model sees the same input as without
+        the cache. A sample counts as a hit when it reuses a prefix it did
+        not have to prefill itself, so a miss is only charged to the first
+        sample.
+        """
+        if prefix_ids in self.entries:
+            self.entries.move_to_end(prefix_ids)
+            entry = self.entries[prefix_ids]
+            self.hits += n_samples
+            self.prefill_tokens_saved += n_samples * len(entry.input_ids)
+            return entry, True
+
+        with torch.no_grad():
+            past_key_values = self.model(
+                input_ids=torch.tensor([list(prefix_ids)], device=self.model.device),
+                use_cache=True
+            ).past_key_values
+
+        entry = PrefixEntry(list(prefix_ids), past_key_values)
+        self.entries[prefix_ids] = entry
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        self.misses += 1
+        self.hits += n_samples - 1
+        self.prefill_tokens_saved += (n_samples - 1) * len(prefix_ids)
+        return entry, False
+
+def shared_prefix_ids(prefix_ids: List[int], prompt_ids: List[List[int]], max_length: int) -> Tuple[int, ...]:
+    """Leading token ids that every prompt shares with its tokenized text prefix.
+
+    A prefix tokenized on its own can end in a different token than inside
+    the full prompt (GPT-2 merges the blank line that ends the few-shot block
+    into one token, but splits it before "Question:"), so only the tokens the
+    full prompts agree on are shared, and at least one token of every prompt
+    stays out of the prefix. Returns an empty tuple when the shared part is
+    not shorter than ``max_length``, so the group runs without the cache.
+    """
+    shared = len(prefix_ids)
+    for ids in prompt_ids:
+        shared = min(shared, len(ids) - 1)
+        if ids[:shared] != prefix_ids[:shared]:
+            shared = next(position for position in range(shared) if ids[position] != prefix_ids[position])
+    if shared <= 0 or shared >= max_length:
+        return ()
+    return tuple(prefix_ids[:shared])
+
+def _expand_past(past_key_values: Any, rows: int) -> Any:
+    """Copies a single-row prefix cache and repeats it for ``rows`` rows."""
+    if isinstance(past_key_values, tuple):
+        # Legacy per-layer (key, value) tuples
+        return tuple(
+            tuple(t.expand(rows, *t.shape[1:]).contiguous() for t in layer)
+            for layer in past_key_values
+        )
+    past_key_values = copy.deepcopy(past_key_values)
+    past_key_values.batch_repeat_interleave(rows)
+    return past_key_values
+
+def _prepare_inputs(
+    batch_ids: List[List[int]],
+    pad_token_id: int,
+    device: Any,
+    prefix: Optional[PrefixEntry] = None
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Left-pads a batch and, with a prefix, puts the prefix ids in front of every row.
+
+    Padding then sits between the prefix and each suffix, which the attention
+    mask hides, so the cached prefix lines up with column 0 of every row.
+    """
+    input_ids, attention_mask = _left_pad(batch_ids, pad_token_id)
+    if prefix is not None:
+        rows = len(batch_ids)
+        prefix_ids = torch.tensor([prefix.input_ids], dtype=torch.long).expand(rows, -1)
+        input_ids = torch.cat([prefix_ids, input_ids], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids), attention_mask], dim=1)
+    return input_ids.to(device), attention_mask.to(device)
+
+def _synchronize(device: Any) -> None:
+    """Waits for queued GPU work so wall-clock timestamps cover it."""
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize(device)
+
+class StepTimer(LogitsProcessor):
+    """Logits processor that timestamps every decoding step and leaves scores unchanged.
+
+    ``generate`` calls it once per step, right after that step's forward pass,
+    so the first timestamp marks the first token and the gaps between later
+    ones are the per-token decode time.
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        _synchronize(scores.device)
+        self.steps.append(time.perf_counter())
+        return scores
+
+def _count_generated(generated: torch.Tensor, eos_token_id: Optional[int]) -> List[int]:
+    """Counts each row's new tokens up to and including its first EOS; the rest is padding."""
+    if eos_token_id is None:
+        return [generated.shape[1]] * generated.shape[0]
+    is_eos = generated == eos_token_id
+    before_eos = (is_eos.cumsum(-1) == 0).sum(-1)
+    return (before_eos + is_eos.any(-1).long()).tolist()
+
+def _build_generation_config(tokenizer: Any, generation_config: Dict) -> GenerationConfig:
+    """Builds the HF GenerationConfig from the ``generation`` config section."""
+    return GenerationConfig(
         max_new_tokens=generation_config.get('max_new_tokens', 5),
         do_sample=generation_config.get('do_sample', False),
         temperature=generation_config.get('temperature', 1.0),
@@ -49,30 +308,343 @@ def generate_response(
         bos_token_id=tokenizer.bos_token_id
     )
 
+class GeneratedBatch(NamedTuple):
+    """Token ids a ``generate`` call produced for a batch, before decoding."""
+    batch_ids: List[List[int]]
+    generated: torch.Tensor
+    prefix_len: int
+    inference_time: float
+    ttft: float
+    decode_per_token: float
+
+def generate_batch_ids(
+    model: Any,
+    tokenizer: Any,
+    batch_ids: List[List[int]],
+    generation_config: Dict,
+    prefix: Optional[PrefixEntry] = None
+) -> GeneratedBatch:
+    """Runs one ``generate`` call for a batch of tokenized prompts.
+
+    With ``prefix``, ``batch_ids`` hold only the prompt suffixes and the
+    prefix is served from its cached ``past_key_values``.
+    """
+    input_ids, attention_mask = _prepare_inputs(batch_ids, tokenizer.pad_token_id, model.device, prefix)
+
+    gen_config = _build_generation_config(tokenizer, generation_config)
+    step_timer = StepTimer()
+
     with torch.no_grad():
-        start_time = time.time()
-        outputs = model.generate(**inputs, generation_config=gen_config)
-        inference_time = time.time() - start_time
+        start_time = time.perf_counter()
+        generate_kwargs = {}
+        if prefix is not None:
+            # Beams are expanded row by row and every row shares the prefix,
+            # so the cache only needs the final row count
+            generate_kwargs['past_key_values'] = _expand_past(
+                prefix.past_key_values,
+                len(batch_ids) * gen_config.num_beams
+            )
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            generation_config=gen_config,
+            logits_processor=LogitsProcessorList([step_timer]),
+            **generate_kwargs
+        )
+        _synchronize(model.device)
+        end_time = time.perf_counter()
+        inference_time = end_time - start_time
 
-    generated_text = tokenizer.decode(
-        outputs[0, inputs['input_ids'].shape[1]:],
-        skip_special_tokens=True
-    ).strip()
+    steps = step_timer.steps
+    ttft = steps[0] - start_time if steps else inference_time
+    decode_per_token = (steps[-1] - steps[0]) / (len(steps) - 1) if len(steps) > 1 else 0.0
 
-    extracted_answer = extract_answer(generated_text)
-    
-    return generated_text, extracted_answer, inference_time
+    return GeneratedBatch(
+        batch_ids=batch_ids,
+        generated=outputs[:, input_ids.shape[1]:].cpu(),
+        prefix_len=len(prefix.input_ids) if prefix is not None else 0,
+        inference_time=inference_time,
+        ttft=ttft,
+        decode_per_token=decode_per_token
+    )
+
+def decode_generated(tokenizer: Any, batch: GeneratedBatch) -> List[Tuple[str, str, float, Dict[str, Any]]]:
+    """Decodes a ``GeneratedBatch`` and extracts the answers, see ``generate_batch``."""
+    decode_start = time.perf_counter()
+    batch_ids, inference_time = batch.batch_ids, batch.inference_time
+    output_tokens = _count_generated(batch.generated, tokenizer.eos_token_id)
+    generated_texts = tokenizer.batch_decode(batch.generated, skip_special_tokens=True)
+    detokenize_time = time.perf_counter() - decode_start
+
+    time_share = inference_time / len(batch_ids)
+    results = []
+    for ids, n_output, text in zip(batch_ids, output_tokens, generated_texts):
+        extract_start = time.perf_counter()
+        text = text.strip()
+        extracted = extract_answer(text)
+        extraction_time = time.perf_counter() - extract_start
+        timing = {
+            "ttft_s": batch.ttft,
+            "decode_time_per_token_s": batch.decode_per_token,
+            "detokenize_time_s": detokenize_time / len(batch_ids),
+            "extraction_time_s": extraction_time,
+            "latency_s": inference_time + detokenize_time + extraction_time,
+            "input_tokens": batch.prefix_len + len(ids),
+            "output_tokens": n_output
+        }
+        results.append((text, extracted, time_share, timing))
+    return results
+
+def generate_batch(
+    model: Any,
+    tokenizer: Any,
+    batch_ids: List[List[int]],
+    generation_config: Dict,
+    prefix: Optional[PrefixEntry] = None
+) -> List[Tuple[str, str, float, Dict[str, Any]]]:
+    """Generates responses for a batch of tokenized prompts in one ``generate`` call.
+
+    With ``prefix``, ``batch_ids`` hold only the prompt suffixes and the
+    prefix is served from its cached ``past_key_values``.
+
+    Returns one (generated_text, extracted_answer, inference_time, timing)
+    tuple per prompt, where inference_time is the prompt's even share of the
+    batch latency. ``timing`` holds the batch's time to first token
+    (``ttft_s``), mean time per later decode step, the prompt's share of
+    detokenization, its own answer extraction time, the wall-clock latency of
+    the batch and the prompt's input and output token counts.
+    """
+    return decode_generated(tokenizer, generate_batch_ids(model, tokenizer, batch_ids, generation_config, prefix))
+
+def answer_token_ids(tokenizer: Any, letters: List[str] = ANSWER_LETTERS) -> Dict[str, int]:
+    """Maps each answer letter to the token id a prompt ending in "Answer:" continues with."""
+    return {
+        letter: tokenizer.encode(f" {letter}", add_special_tokens=False)[-1]
+        for letter in letters
+    }
+
+def answer_token_variants(tokenizer: Any, letters: List[str] = ANSWER_LETTERS) -> Dict[int, str]:
+    """Maps the token ids that can spell an answer letter, with and without a leading space, to it."""
+    variants = {}
+    for letter in letters:
+        for text in (f" {letter}", letter):
+            variants.setdefault(tokenizer.encode(text, add_special_tokens=False)[-1], letter)
+    return variants
+
+class AllowedTokensLogitsProcessor(LogitsProcessor):
+    """Logits processor that masks every token except ``allowed_ids``."""
+
+    def __init__(self, allowed_ids: List[int]):
+        self.allowed_ids = list(allowed_ids)
+        self.mask = None
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if self.mask is None or self.mask.shape[-1] != scores.shape[-1] or self.mask.device != scores.device:
+            self.mask = torch.full((scores.shape[-1],), float('-inf'), device=scores.device, dtype=scores.dtype)
+            self.mask[self.allowed_ids] = 0
+        return scores + self.mask
+
+def constrained_answer_batch(
+    model: Any,
+    tokenizer: Any,
+    batch_ids: List[List[int]],
+    prefix: Optional[PrefixEntry] = None
+) -> List[Tuple[str, str, float, Dict[str, Any]]]:
+    """Decodes exactly one answer-letter token per prompt in one greedy ``generate`` call.
+
+    The vocabulary is restricted to the tokens of ``answer_token_variants``,
+    so every prompt gets a valid letter without beams or extra decode steps.
+    With ``prefix``, ``batch_ids`` hold only the prompt suffixes.
+
+    Returns the same (generated_text, extracted_answer, inference_time,
+    timing) tuples as ``generate_batch``.
+    """
+    input_ids, attention_mask = _prepare_inputs(batch_ids, tokenizer.pad_token_id, model.device, prefix)
+    variants = answer_token_variants(tokenizer)
+    gen_config = GenerationConfig(
+        max_new_tokens=1,
+        do_sample=False,
+        num_beams=1,
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        bos_token_id=tokenizer.bos_token_id
+    )
+    step_timer = StepTimer()
+
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        generate_kwargs = {}
+        if prefix is not None:
+            generate_kwargs['past_key_values'] = _expand_past(prefix.past_key_values, len(batch_ids))
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            generation_config=gen_config,
+            logits_processor=LogitsProcessorList([step_timer, AllowedTokensLogitsProcessor(list(variants))]),
+            **generate_kwargs
+        )
+        _synchronize(model.device)
+        end_time = time.perf_counter()
+        inference_time = end_time - start_time
+
+    answer_ids = outputs[:, input_ids.shape[1]].tolist()
+    generated_texts = tokenizer.batch_decode([[token] for token in answer_ids], skip_special_tokens=True)
+    detokenize_time = time.perf_counter() - end_time
+
+    ttft = step_timer.steps[0] - start_time if step_timer.steps else inference_time
+    prefix_len = len(prefix.input_ids) if prefix is not None else 0
+    time_share = inference_time / len(batch_ids)
+    results = []
+    for ids, token, text in zip(batch_ids, answer_ids, generated_texts):
+        extract_start = time.perf_counter()
+        letter = variants[token]
+        extraction_time = time.perf_counter() - extract_start
+        timing = {
+            "ttft_s": ttft,
+            "decode_time_per_token_s": 0.0,
+            "detokenize_time_s": detokenize_time / len(batch_ids),
+            "extraction_time_s": extraction_time,
+            "latency_s": inference_time + detokenize_time + extraction_time,
+            "input_tokens": prefix_len + len(ids),
+            "output_tokens": 1
+        }
+        results.append((text.strip(), letter, time_share, timing))
+    return results
+
+def _position_ids(attention_mask: torch.Tensor) -> torch.Tensor:
+    """Position ids that skip left padding, matching what ``generate`` derives."""
+    return (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+def score_choices_batch(
+    model: Any,
+    tokenizer: Any,
+    batch_ids: List[List[int]],
+    batch_choices: Optional[List[List[str]]] = None,
+    prefix: Optional[PrefixEntry] = None
+) -> List[Tuple[str, Dict[str, float], float]]:
+    """Scores the answer options of a batch of prompts with a single forward pass.
+
+    Without ``batch_choices`` the next-token logits for " A"/" B"/" C"/" D" are
+    compared. With ``batch_choices`` every " <choice text>" continuation is
+    appended to its prompt and scored by its summed token log-probs. With
+    ``prefix``, ``batch_ids`` hold only the prompt suffixes and the prefix is
+    served from its cached ``past_key_values``.
+
+    Returns one (predicted_letter, choice_probs, inference_time, timing) tuple
+    per prompt, where choice_probs is normalised over the options,
+    inference_time is the prompt's even share of the batch latency and
+    ``timing`` has the same keys as in ``generate_batch``; the forward pass
+    counts as time to first token and no tokens are generated.
+    """
+    if batch_choices is None:
+        sequences = batch_ids
+        continuation_lengths = None
+    else:
+        sequences = []
+        continuation_lengths = []
+        for ids, choices in zip(batch_ids, batch_choices):
+            for choice in choices[:len(ANSWER_LETTERS)]:
+                continuation = tokenizer.encode(f" {choice}", add_special_tokens=False)
+                sequences.append(ids + continuation)
+                continuation_lengths.append(len(continuation))
+
+    input_ids, attention_mask = _prepare_inputs(sequences, tokenizer.pad_token_id, model.device, prefix)
+    position_ids = _position_ids(attention_mask)
+
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        forward_kwargs = {}
+        if prefix is not None:
+            prefix_len = len(prefix.input_ids)
+            input_ids = input_ids[:, prefix_len:]
+            position_ids = position_ids[:, prefix_len:]
+            forward_kwargs['past_key_values'] = _expand_past(prefix.past_key_values, len(sequences))
+        logits = model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            **forward_kwargs
+        ).logits
+        _synchronize(model.device)
+        forward_time = time.perf_counter() - start_time
 
-def extract_answer(text: str) -> str:
-    """Extracts the answer letter from generated text."""
-    patterns = [
-        r'^([A-D])',
-        r'(?:THE )?(?:ANSWER (?:IS )?)?([A-D])',
-        r'([A-D])\.'
-    ]
-    
-    for pattern in patterns:
-        if match := re.search(pattern, text.upper()):
-            return match.group(1)
-    
-    return text.split()[0].upper() if text else "" 
\ No newline at end of file
+        if continuation_lengths is None:
+            letter_ids = answer_token_ids(tokenizer)
+            letters = list(letter_ids)
+            log_probs = torch.log_softmax(logits[:, -1].float(), dim=-1)
+            scores = log_probs[:, list(letter_ids.values())]
+            row_letters = [letters] * len(batch_ids)
+            row_scores = [row.tolist() for row in scores]
+        else:
+            # Left padding puts every continuation at the end of its row; the
+            # logits one position earlier predict each continuation token
+            seq_len = input_ids.shape[1]
+            sequence_scores = []
+            for row, cont_len in enumerate(continuation_lengths):
+                log_probs = torch.log_softmax(logits[row, seq_len - cont_len - 1:seq_len - 1].float(), dim=-1)
+                targets = input_ids[row, seq_len - cont_len:]
+                sequence_scores.append(log_probs.gather(-1, targets.unsqueeze(-1)).sum().item())
+
+            row_letters = []
+            row_scores = []
+            offset = 0
+            for choices in batch_choices:
+                n_options = min(len(choices), len(ANSWER_LETTERS))
+                row_letters.append(ANSWER_LETTERS[:n_options])
+                row_scores.append(sequence_scores[offset:offset + n_options])
+                offset += n_options
+        inference_time = time.perf_counter() - start_time
+
+    prefix_len = len(prefix.input_ids) if prefix is not None else 0
+    time_share = inference_time / len(batch_ids)
+    results = []
+    for ids, letters, scores in zip(batch_ids, row_letters, row_scores):
+        extract_start = time.perf_counter()
+        probs = torch.softmax(torch.tensor(scores), dim=-1).tolist()
+        choice_probs = dict(zip(letters, probs))
+        predicted = max(choice_probs, key=choice_probs.get)
+        extraction_time = time.perf_counter() - extract_start
+        timing = {
+            "ttft_s": forward_time,
+            "decode_time_per_token_s": 0.0,
+            "detokenize_time_s": 0.0,
+            "extraction_time_s": extraction_time,
+            "latency_s": inference_time + extraction_time,
+            "input_tokens": prefix_len + len(ids),
+            "output_tokens": 0
+        }
+        results.append((predicted, choice_probs, time_share, timing))
+    return results
+
+def generate_response(
+    model: Any,
+    tokenizer: Any,
+    prompt: str,
+    generation_config: Dict,
+    response_cache: Optional[ResponseCache] = None
+) -> Tuple[str, str, float]:
+    """Generates model response and extracts the answer.
+
+    With ``response_cache`` a previously stored response for the same model,
+    tokenizer, prompt and generation settings is returned without generating.
+    """
+    key = None
+    if response_cache is not None:
+        key = response_key(model_identity(model, tokenizer), prompt, cache_settings({'generation': generation_config}))
+        cached = response_cache.get_many([key])
+        if key in cached:
+            record = cached[key]
+            return record['raw_generated_text'], record['extracted_answer'], record['inference_time_s']
+
+    batch_ids = encode_prompts(tokenizer, [prompt])
+    generated_text, extracted_answer, inference_time, _ = generate_batch(
+        model, tokenizer, batch_ids, generation_config
+    )[0]
+
+    if response_cache is not None:
+        response_cache.put_many({key: {
+            "raw_generated_text": generated_text,
+            "extracted_answer": extracted_answer,
+            "inference_time_s": inference_time
+        }})
+    return generated_text, extracted_answer, inference_time
@@ -0,0 +1,222 @@
+"""Running every model in its own worker process (``evaluation.schedule: model_parallel``).
+
+The parent process loads and formats each subset once and writes it to
+``<run_dir>/shared/<subset>`` as Arrow files, which every worker
+memory-maps instead of receiving a pickled copy. Each model then runs in a
+spawned process pinned to its own share of the CPU cores, and streams its
+result rows back over a queue to the parent, the only process that writes
+the result streams. Models no longer wait for each other, so a comparison
+takes about as long as its slowest model.
+"""
+
+import os
+import json
+import queue
+import random
+import traceback
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .evaluation import PreparedSubset, run_benchmark
+from .backends import ModelPool
+from .cache import open_response_cache
+from .utils import ResultsWriter
+
+def write_shared_subset(shared_dir: Path, dataset: Any, prepared: PreparedSubset) -> None:
+    """Writes a subset and its prepared prompts where model workers can memory-map them."""
+    from datasets import Dataset
+
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    dataset.save_to_disk(str(shared_dir / "dataset"))
+    Dataset.from_dict({
+        "instructions": [parts.instructions for parts in prepared.prompt_parts],
+        "shots": [parts.shots for parts in prepared.prompt_parts],
+        "question": [parts.question for parts in prepared.prompt_parts],
+        "shot_indices": [list(parts.shot_indices) for parts in prepared.prompt_parts],
+        "expected_letter": prepared.expected_letters,
+        "choices": prepared.choices,
+        "answered_block": prepared.answered_blocks or [None] * len(prepared.prompt_parts)
+    }).save_to_disk(str(shared_dir / "prompts"))
+    with open(shared_dir / "manifest.json", 'w') as f:
+        json.dump({
+            "from_store": prepared.from_store,
+            "answered_blocks": prepared.answered_blocks is not None
+        }, f)
+
+def load_shared_subset(shared_dir: Path) -> Tuple[Any, PreparedSubset]:
+    """Memory-maps a subset written by ``write_shared_subset``."""
+    from datasets import load_from_disk
+    from .prompting import MMLUPrompt
+
+    with open(shared_dir / "manifest.json") as f:
+        manifest = json.load(f)
+    dataset = load_from_disk(str(shared_dir / "dataset"))
+    columns = load_from_disk(str(shared_dir / "prompts"))[:]
+    prompt_parts = [
+        MMLUPrompt(instructions, shots, question, tuple(shot_indices))
+        for instructions, shots, question, shot_indices in zip(
+            columns['instructions'], columns['shots'], columns['question'], columns['shot_indices']
+        )
+    ]
+    return dataset, PreparedSubset(
+        prompt_parts,
+        columns['expected_letter'],
+        columns['choices'],
+        manifest['from_store'],
+        columns['answered_block'] if manifest['answered_blocks'] else None
+    )
+
+def allocate_cores(config: Dict, model_keys: List[str]) -> Dict[str, List[int]]:
+    """Gives every model its own contiguous block of the cores this process may use.
+
+    A model's ``cores`` key (a list of core ids) takes those cores; the rest
+    are split evenly between the other models. With more models than cores
+    some models share one.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+
+    allocation = {key: list(config['models'][key]['cores']) for key in model_keys if config['models'][key].get('cores')}
+    taken = {core for cores in allocation.values() for core in cores}
+    free = [core for core in available if core not in taken] or available
+    rest = [key for key in model_keys if key not in allocation]
+    for position, key in enumerate(rest):
+        cores = free[position * len(free) // len(rest):(position + 1) * len(free) // len(rest)]
+        allocation[key] = cores or [free[position % len(free)]]
+    return allocation
+
+class QueueWriter:
+    """Stands in for a ``ResultsWriter`` in a model worker: sends rows to the parent's writer."""
+
+    def __init__(self, results_queue: Any, subset_name: str):
+        self.results_queue = results_queue
+        self.subset_name = subset_name
+
+    def write(self, rows: Iterable[Dict]) -> None:
+        rows = list(rows)
+        if rows:
+            self.results_queue.put(("rows", self.subset_name, rows))
+
+    def flush(self) -> None:
+        pass
+
+def _model_worker(
+    config: Dict,
+    model_key: str,
+    shared_dir: str,
+    subsets: List[Tuple[str, Optional[List[int]]]],
+    completed: Set[Tuple[str, str, int]],
+    cores: List[int],
+    results_queue: Any
+) -> None:
+    """Model worker process: runs one model over every shared subset."""
+    try:
+        import torch
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+
+        seed = config['dataset'].get('random_seed')
+        if seed is not None:
+            random.seed(seed)
+            torch.manual_seed(seed)
+
+        model_pool = ModelPool(config)
+        response_cache = open_response_cache(config)
+        try:
+            for subset_name, sample_indices in subsets:
+                dataset, prepared = load_shared_subset(Path(shared_dir) / subset_name)
+                run_benchmark(
+                    dataset,
+                    config,
+                    subset_name,
+                    model_pool,
+                    [model_key],
+                    prepared,
+                    response_cache,
+                    QueueWriter(results_queue, subset_name),
+                    completed,
+                    sample_indices
+                )
+        finally:
+            model_pool.clear()
+            if response_cache is not None:
+                response_cache.close()
+        results_queue.put(("done", model_key, model_pool.stats))
+    except BaseException:
+        results_queue.put(("failed", model_key, traceback.format_exc()))
+
+def run_model_workers(
+    config: Dict,
+    shared_dir: Path,
+    subsets: List[Tuple[str, Optional[List[int]]]],
+    writers: Dict[str, ResultsWriter],
+    completed: Set[Tuple[str, str, int]]
+) -> Dict[str, Dict]:
+    """Runs each configured model in its own process and writes their rows as they arrive.
+
+    ``subsets`` lists (subset name, sample indices or None for all) of the
+    subsets written under ``shared_dir``; ``writers`` holds the result
+    stream of each. A model that fails does not stop the others. Returns
+    the model load statistics of all workers.
+    """
+    model_keys = list(config['models'])
+    allocation = allocate_cores(config, model_keys)
+    # The cores are split here; per-process thread counts or pinning would oversubscribe them
+    config = {**config, 'hardware': {**config['hardware'], 'cpu_mode': {
+        key: value for key, value in (config['hardware'].get('cpu_mode') or {}).items()
+        if key not in ('intra_op_threads', 'inter_op_threads', 'pin_cores')
+    }}}
+
+    # Workers are spawned rather than forked so each starts with a clean torch runtime
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    workers = {}
+    for model_key in model_keys:
+        display_name = config['models'][model_key]['display_name']
+        print(f"Starting worker for {display_name} on cores {allocation[model_key]}")
+        workers[model_key] = context.Process(
+            target=_model_worker,
+            args=(
+                config,
+                model_key,
+                str(shared_dir),
+                subsets,
+                {triple for triple in completed if triple[0] == display_name},
+                allocation[model_key],
+                results_queue
+            ),
+            name=f"model-{model_key}"
+        )
+        workers[model_key].start()
+
+    model_stats = {}
+    running = set(model_keys)
+    while running:
+        try:
+            kind, key, payload = results_queue.get(timeout=1.0)
+        except queue.Empty:
+            # A worker that died without reporting (e.g. killed for running out of memory)
+            for model_key in list(running):
+                if not workers[model_key].is_alive():
+                    print(f"\nWorker for {config['models'][model_key]['display_name']} exited "
+                          f"with code {workers[model_key].exitcode}")
+                    running.discard(model_key)
+            continue
+
+        if kind == "rows":
+            writers[key].write(payload)
+        elif kind == "done":
+            model_stats.update(payload)
+            running.discard(key)
+            print(f"\n{config['models'][key]['display_name']} finished")
+        elif kind == "failed":
+            print(f"\nWorker for {config['models'][key]['display_name']} failed:\n{payload}")
+            running.discard(key)
+
+    for worker in workers.values():
+        worker.join()
+    return model_stats
@@ -0,0 +1,173 @@
+"""Bounded-queue pipeline that overlaps the stages of scoring a subset.
+
+Each stage runs in its own thread and hands items to the next through a
+queue of at most ``depth`` items, so a stage that runs ahead blocks instead
+of piling up work. Tokenization (fast tokenizers) and model execution
+release the GIL, so threads are enough to keep the cores busy while the
+Python-heavy steps run.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Marks the end of the stream in a queue
+_DONE = object()
+
+class _Failed:
+    """Carries an exception raised in a stage down to the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+class StageStats:
+    """Counters of one pipeline stage.
+
+    ``starved_s`` is the time the stage waited for input and ``blocked_s``
+    the time it waited for room in the next queue. Queue depth is sampled
+    each time the stage takes an item: how many more were already waiting.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self.starved_s = 0.0
+        self.blocked_s = 0.0
+        self.depth_total = 0
+        self.depth_max = 0
+        # Wait and depth of the item the stage is working on right now
+        self.last_starved_s = 0.0
+        self.last_depth = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_s": self.busy_s,
+            "starved_s": self.starved_s,
+            "blocked_s": self.blocked_s,
+            "mean_queue_depth": self.depth_total / self.items if self.items else 0.0,
+            "max_queue_depth": self.depth_max
+        }
+
+class Pipeline:
+    """Runs ``source`` and ``stages`` concurrently and yields the results in order.
+
+    ``source`` is iterated in its own thread (so the work its iterator does
+    lazily, e.g. tokenization, overlaps the rest), each ``(name, fn)`` stage
+    applies ``fn`` to every item in another thread, and iterating the
+    pipeline consumes the last stage's output in the caller's thread. An
+    exception in any stage is re-raised in the caller.
+    """
+
+    def __init__(
+        self,
+        source: Iterable,
+        stages: List[Tuple[str, Callable[[Any], Any]]],
+        depth: int = 2,
+        source_name: str = "prepare",
+        sink_name: str = "consume"
+    ):
+        self.source = source
+        self.stages = stages
+        self.depth = max(depth, 1)
+        self.stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages] + [StageStats(sink_name)]
+        self._stop = threading.Event()
+
+    def _put(self, q: queue.Queue, item: Any, stats: StageStats) -> None:
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.blocked_s += time.perf_counter() - start
+
+    def _get(self, q: queue.Queue, stats: StageStats) -> Any:
+        start = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+        waited = time.perf_counter() - start
+        if item is not _DONE and not isinstance(item, _Failed):
+            depth = q.qsize()
+            stats.items += 1
+            stats.starved_s += waited
+            stats.depth_total += depth
+            stats.depth_max = max(stats.depth_max, depth)
+            stats.last_starved_s = waited
+            stats.last_depth = depth
+        return item
+
+    def _run_source(self, out_queue: queue.Queue) -> None:
+        stats = self.stats[0]
+        iterator = iter(self.source)
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy_s += time.perf_counter() - start
+                stats.items += 1
+                self._put(out_queue, item, stats)
+            self._put(out_queue, _DONE, stats)
+        except BaseException as e:
+            self._put(out_queue, _Failed(e), stats)
+
+    def _run_stage(self, fn: Callable[[Any], Any], stats: StageStats, in_queue: queue.Queue, out_queue: queue.Queue) -> None:
+        while True:
+            item = self._get(in_queue, stats)
+            if item is _DONE or isinstance(item, _Failed):
+                self._put(out_queue, item, stats)
+                return
+            start = time.perf_counter()
+            try:
+                result = fn(item)
+            except BaseException as e:
+                self._put(out_queue, _Failed(e), stats)
+                return
+            finally:
+                stats.busy_s += time.perf_counter() - start
+            self._put(out_queue, result, stats)
+
+    def __iter__(self) -> Iterator[Any]:
+        queues = [queue.Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0],), daemon=True)]
+        for position, (_, fn) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(fn, self.stats[position + 1], queues[position], queues[position + 1]),
+                daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+
+        sink = self.stats[-1]
+        try:
+            while True:
+                item = self._get(queues[-1], sink)
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failed):
+                    raise item.error
+                start = time.perf_counter()
+                yield item
+                sink.busy_s += time.perf_counter() - start
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-stage counters, from source to consumer."""
+        return [stats.as_dict() for stats in self.stats]
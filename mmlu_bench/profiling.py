@@ -0,0 +1,188 @@
+"""Opt-in profiling of a benchmark run (``mmlu-bench --profile``).
+
+The main stages of a run are wrapped in named ``region``s. While a
+``Profiler`` is running, each region is timed, its peak resident memory is
+tracked and it shows up as a labelled range in the ``torch.profiler`` trace;
+a sampling thread records the Python stacks of every thread. Without a
+running profiler ``region`` returns a shared no-op context, so the
+instrumentation costs nothing.
+
+``Profiler.stop`` writes into the run directory:
+
+    profile_trace.json    torch.profiler operator trace (chrome://tracing, Perfetto)
+    profile_stacks.txt    sampled Python stacks, collapsed for flamegraph.pl or speedscope
+    profile_stages.json   per-stage time and memory summary
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_NO_REGION = contextlib.nullcontext()
+
+# The running profiler, if any
+_active = None
+
+def region(name: str) -> Any:
+    """Context that attributes the time spent inside it to stage ``name``."""
+    if _active is None:
+        return _NO_REGION
+    return _active.region(name)
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+class StackSampler:
+    """Samples the Python stack of every thread at a fixed interval.
+
+    Stacks are counted in collapsed form (``thread;outer;...;inner count``),
+    the input format of flame graph tools.
+    """
+
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Profiler:
+    """Collects per-stage timings, a ``torch.profiler`` trace and sampled Python stacks.
+
+    Stage times are inclusive (a nested region also counts towards its
+    parent) and regions in different threads may overlap, so the shares of
+    wall time can add up to more than 100%. ``peak_rss_growth_mb`` charges
+    each new high of the process's resident memory to the stages running
+    when it was reached.
+    """
+
+    def __init__(self, sample_interval_s: float = 0.005, torch_trace: bool = True):
+        self.sampler = StackSampler(sample_interval_s)
+        self.torch_trace = torch_trace
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._torch_profiler = None
+        self._record_function = None
+        self._start_time = None
+
+    def start(self) -> "Profiler":
+        global _active
+        if self.torch_trace:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            try:
+                # Pipeline stages run the model outside the thread that starts the profiler
+                experimental_config = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+            except (AttributeError, TypeError):
+                # Older torch versions only trace the starting thread
+                experimental_config = None
+            self._torch_profiler = torch.profiler.profile(
+                activities=activities,
+                profile_memory=True,
+                experimental_config=experimental_config
+            )
+            self._torch_profiler.start()
+            self._record_function = torch.profiler.record_function
+        self.sampler.start()
+        self._start_time = time.perf_counter()
+        _active = self
+        return self
+
+    @contextlib.contextmanager
+    def region(self, name: str) -> Any:
+        traced = self._record_function(name) if self._record_function is not None else _NO_REGION
+        rss_before = _peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            with traced:
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_after = _peak_rss_mb()
+            with self._lock:
+                stage = self.stages.setdefault(name, {
+                    "calls": 0,
+                    "total_s": 0.0,
+                    "max_s": 0.0,
+                    "peak_rss_mb": 0.0,
+                    "peak_rss_growth_mb": 0.0
+                })
+                stage["calls"] += 1
+                stage["total_s"] += elapsed
+                stage["max_s"] = max(stage["max_s"], elapsed)
+                stage["peak_rss_mb"] = max(stage["peak_rss_mb"], rss_after)
+                stage["peak_rss_growth_mb"] += rss_after - rss_before
+
+    def summary(self, wall_s: float) -> List[Dict[str, Any]]:
+        """One row per stage, slowest first."""
+        rows = []
+        for name, stage in self.stages.items():
+            rows.append({
+                "stage": name,
+                **stage,
+                "mean_s": stage["total_s"] / stage["calls"],
+                "wall_pct": stage["total_s"] / wall_s * 100 if wall_s else 0.0
+            })
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def stop(self, run_dir: Optional[Path] = None) -> List[Dict[str, Any]]:
+        """Stops profiling, writes the profile files to ``run_dir`` and returns the stage summary."""
+        global _active
+        _active = None
+        wall_s = time.perf_counter() - self._start_time
+        self.sampler.stop()
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+
+        stages = self.summary(wall_s)
+        if run_dir is not None:
+            run_dir = Path(run_dir)
+            run_dir.mkdir(parents=True, exist_ok=True)
+            if self._torch_profiler is not None:
+                self._torch_profiler.export_chrome_trace(str(run_dir / "profile_trace.json"))
+            self.sampler.write(run_dir / "profile_stacks.txt")
+            with open(run_dir / "profile_stages.json", 'w') as f:
+                json.dump({"wall_s": wall_s, "stages": stages}, f, indent=2)
+            print(f"\nProfile written to {run_dir}: profile_trace.json, profile_stacks.txt, profile_stages.json")
+        return stages
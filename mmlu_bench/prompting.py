@@ -1,47 +1,210 @@
 """Prompt formatting utilities."""
 
-from typing import Dict, Any
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 import random
 from .data import get_expected_answer_letter
 
-def format_mmlu_prompt(sample: Dict, config: Dict, dataset: Any = None, current_index: int = None) -> str:
-    """Formats a prompt for the MMLU task with optional few-shot examples."""
-    num_shots = config['prompt'].get('num_shots', 0)
-    include_instructions = config['prompt'].get('include_instructions', True)
-    
-    prompt = ""
-    if include_instructions:
-        prompt = "You are a helpful AI assistant. Answer the following multiple choice question by selecting the correct option (A, B, C, or D).\n\n"
-    
-    if num_shots > 0 and dataset is not None and current_index is not None:
-        # Get random examples from the dataset, excluding the current sample
-        available_indices = list(range(len(dataset)))
-        if current_index in available_indices:
-            available_indices.remove(current_index)
-        
-        if len(available_indices) >= num_shots:
-            example_indices = random.sample(available_indices, num_shots)
-            
-            for idx in example_indices:
-                example = dataset[idx]
-                example_question = example['question']
-                example_choices = example['choices']
-                example_answer = get_expected_answer_letter(example)
-                
-                prompt += f"Question: {example_question}\nChoices:\n"
-                options = ['A', 'B', 'C', 'D']
-                for i, choice in enumerate(example_choices):
-                    if i < len(options):
-                        prompt += f"{options[i]}. {choice}\n"
-                prompt += f"Answer: {example_answer}\n\n"
-    
-    question = sample['question']
-    choices = sample['choices']
-    prompt += f"Question: {question}\nChoices:\n"
+MMLU_INSTRUCTIONS = "You are a helpful AI assistant. Answer the following multiple choice question by selecting the correct option (A, B, C, or D).\n\n"
+
+class MMLUPrompt(NamedTuple):
+    """An MMLU prompt split into its instruction header, few-shot block and question.
+
+    ``shot_indices`` are the dataset indices of the few-shot examples, in
+    the order they appear in ``shots``.
+    """
+    instructions: str
+    shots: str
+    question: str
+    shot_indices: Tuple[int, ...] = ()
+
+    @property
+    def text(self) -> str:
+        return self.instructions + self.shots + self.question
+
+def format_mmlu_question(question: str, choices: List[str]) -> str:
+    """Formats one "Question/Choices" block ending in an open "Answer:"."""
+    block = f"Question: {question}\nChoices:\n"
     options = ['A', 'B', 'C', 'D']
     for i, choice in enumerate(choices):
         if i < len(options):
-            prompt += f"{options[i]}. {choice}\n"
-    prompt += "Answer:"
-    
-    return prompt 
\ No newline at end of file
+            block += f"{options[i]}. {choice}\n"
+    return block + "Answer:"
+
+def select_fixed_shots(num_examples: int, num_shots: int, seed: Optional[int]) -> List[int]:
+    """Picks one deterministic few-shot pool for a subset.
+
+    The pool holds one spare example so a sample that is itself in the pool
+    can still be given ``num_shots`` other examples.
+    """
+    return random.Random(seed).sample(range(num_examples), min(num_shots + 1, num_examples))
+
+def sample_shot_indices(
+    num_examples: int,
+    current_index: int,
+    num_shots: int,
+    shot_pool: Optional[List[int]] = None
+) -> List[int]:
+    """Picks the few-shot example indices for one sample, never the sample itself.
+
+    Random picks draw ``num_shots`` positions from the ``num_examples - 1``
+    other examples and shift positions at or after ``current_index`` up by
+    one. This consumes the global ``random`` state exactly like sampling from
+    an explicit index list without the current sample, without building that
+    list for every sample.
+    """
+    if shot_pool is not None:
+        candidates = [idx for idx in shot_pool if idx != current_index]
+        return candidates[:num_shots] if len(candidates) >= num_shots else []
+
+    num_others = num_examples - 1 if 0 <= current_index < num_examples else num_examples
+    if num_others < num_shots:
+        return []
+    return [
+        idx + 1 if num_others < num_examples and idx >= current_index else idx
+        for idx in random.sample(range(num_others), num_shots)
+    ]
+
+def render_mmlu_blocks(dataset: Any) -> Tuple[List[str], List[str]]:
+    """Renders every example of a subset as an open question and as an answered few-shot example."""
+    columns = dataset[:]
+    question_blocks = [
+        format_mmlu_question(question, choices)
+        for question, choices in zip(columns['question'], columns['choices'])
+    ]
+    answered_blocks = [
+        f"{block} {get_expected_answer_letter({'answer': answer})}\n\n"
+        for block, answer in zip(question_blocks, columns['answer'])
+    ]
+    return question_blocks, answered_blocks
+
+def build_mmlu_prompts(
+    dataset: Any,
+    config: Dict,
+    shot_pool: Optional[List[int]] = None,
+    blocks: Optional[Tuple[List[str], List[str]]] = None
+) -> List[MMLUPrompt]:
+    """Builds the prompts of every sample of a subset in one pass.
+
+    The columns are read once and each example's "Question/Choices" block is
+    rendered once, then reused as the question of its own prompt and as a
+    few-shot example in others. Pass ``blocks`` to reuse the output of
+    ``render_mmlu_blocks``. Prompts match calling ``build_mmlu_prompt`` for
+    each sample in order with the same ``random`` state.
+    """
+    num_shots = config['prompt'].get('num_shots', 0)
+    include_instructions = config['prompt'].get('include_instructions', True)
+    instructions = MMLU_INSTRUCTIONS if include_instructions else ""
+
+    question_blocks, answered_blocks = blocks if blocks is not None else render_mmlu_blocks(dataset)
+
+    prompts = []
+    for i, question_block in enumerate(question_blocks):
+        shots = ""
+        example_indices = []
+        if num_shots > 0:
+            example_indices = sample_shot_indices(len(question_blocks), i, num_shots, shot_pool)
+            shots = "".join(answered_blocks[idx] for idx in example_indices)
+        prompts.append(MMLUPrompt(instructions, shots, question_block, tuple(example_indices)))
+    return prompts
+
+def build_mmlu_prompt(
+    sample: Dict,
+    config: Dict,
+    dataset: Any = None,
+    current_index: int = None,
+    shot_pool: Optional[List[int]] = None
+) -> MMLUPrompt:
+    """Builds the parts of an MMLU prompt with optional few-shot examples.
+
+    With ``shot_pool`` (see ``select_fixed_shots``) every sample uses the same
+    examples, so the instructions and few-shot block form a shared prefix.
+    """
+    num_shots = config['prompt'].get('num_shots', 0)
+    include_instructions = config['prompt'].get('include_instructions', True)
+
+    instructions = MMLU_INSTRUCTIONS if include_instructions else ""
+
+    shots = ""
+    example_indices = []
+    if num_shots > 0 and dataset is not None and current_index is not None:
+        example_indices = sample_shot_indices(len(dataset), current_index, num_shots, shot_pool)
+        for idx in example_indices:
+            example = dataset[idx]
+            example_answer = get_expected_answer_letter(example)
+            shots += format_mmlu_question(example['question'], example['choices'])
+            shots += f" {example_answer}\n\n"
+
+    question = format_mmlu_question(sample['question'], sample['choices'])
+
+    return MMLUPrompt(instructions, shots, question, tuple(example_indices))
+
+def format_mmlu_prompt(sample: Dict, config: Dict, dataset: Any = None, current_index: int = None) -> str:
+    """Formats a prompt for the MMLU task with optional few-shot examples."""
+    return build_mmlu_prompt(sample, config, dataset, current_index).text
+
+class PromptFitter:
+    """Drops few-shot examples from prompts that would overflow a model's context window.
+
+    ``budget`` is the number of prompt tokens that fit: the context window
+    minus the tokens reserved for the answer. A prompt keeps its first ``k``
+    examples for the largest ``k`` that fits; examples are dropped whole,
+    since a cut-off example would no longer show a complete answer. A prompt
+    that does not fit even without examples is cut from the left when it is
+    tokenized (see ``generation.encode_prompts``).
+
+    Prompt lengths are estimated from token counts of the instructions, of
+    each sample's question and of each example, which are computed once and
+    kept for later calls. One token per block boundary is added because a
+    joint encoding can split the whitespace between blocks differently.
+    """
+
+    def __init__(self, tokenizer: Any, answered_blocks: List[str], budget: int):
+        self.tokenizer = tokenizer
+        self.answered_blocks = answered_blocks
+        self.budget = budget
+        self.special_tokens = tokenizer.num_special_tokens_to_add()
+        self._text_tokens = {}
+        self._question_tokens = {}
+        self._shot_tokens = {}
+
+    def _count(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)['input_ids']]
+
+    def fit(self, prompt_parts: Dict[int, MMLUPrompt]) -> Dict[int, MMLUPrompt]:
+        """Returns the prompts by sample index, with examples dropped where they do not fit.
+
+        Prompts that fit as they are are returned unchanged (the same object).
+        """
+        missing = [i for i in prompt_parts if i not in self._question_tokens]
+        self._question_tokens.update(zip(missing, self._count([prompt_parts[i].question for i in missing])))
+        missing = sorted({idx for parts in prompt_parts.values() for idx in parts.shot_indices} - self._shot_tokens.keys())
+        self._shot_tokens.update(zip(missing, self._count([self.answered_blocks[idx] for idx in missing])))
+        missing = list({parts.instructions for parts in prompt_parts.values()} - self._text_tokens.keys())
+        self._text_tokens.update(zip(missing, self._count(missing)))
+
+        fitted = {}
+        overflowing = 0
+        for i, parts in prompt_parts.items():
+            base = self.special_tokens + self._text_tokens[parts.instructions] + self._question_tokens[i] + 1
+            shot_tokens = [self._shot_tokens[idx] + 1 for idx in parts.shot_indices]
+            num_shots = len(shot_tokens)
+            total = base + sum(shot_tokens)
+            while num_shots > 0 and total > self.budget:
+                num_shots -= 1
+                total -= shot_tokens[num_shots]
+            if total > self.budget:
+                overflowing += 1
+
+            if num_shots == len(shot_tokens):
+                fitted[i] = parts
+            else:
+                kept = parts.shot_indices[:num_shots]
+                shots = "".join(self.answered_blocks[idx] for idx in kept)
+                fitted[i] = MMLUPrompt(parts.instructions, shots, parts.question, kept)
+
+        if overflowing:
+            print(f"Warning: {overflowing} prompts are longer than the {self.budget} tokens that fit "
+                  f"even without few-shot examples; they keep only their last {self.budget} tokens")
+        return fitted
@@ -1,45 +1,167 @@
-"""Results reporting and visualization."""
+"""Results reporting and visualization.
+
+Reports are printed from a ``ResultsAggregator`` (see ``aggregation.py``).
+``core.finalize_run`` fills it from a run's result streams chunk by chunk;
+``generate_report`` builds one from a results DataFrame.
+"""
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import Dict
+from typing import Any, Dict, List, Optional
 from pathlib import Path
+from .aggregation import ResultsAggregator, aggregate_results
 
-def generate_report(results_df: pd.DataFrame, config: Dict, run_dir: Path) -> None:
-    """Generates and prints a summary report and comparison charts."""
+def generate_report(
+    results_df: pd.DataFrame,
+    config: Dict,
+    run_dir: Path,
+    model_stats: Optional[Dict[str, Dict]] = None
+) -> None:
+    """Generates and prints a summary report and comparison charts from a results DataFrame."""
     if results_df.empty:
         print("No results to report.")
         return
+    aggregator = aggregate_results([results_df], config['output'].get('warmup_samples', 0))
+    report_aggregates(aggregator, config, run_dir, model_stats)
+
+def report_aggregates(
+    aggregator: ResultsAggregator,
+    config: Dict,
+    run_dir: Path,
+    model_stats: Optional[Dict[str, Dict]] = None
+) -> None:
+    """Prints the summary report of aggregated results and saves the comparison chart.
+
+    ``model_stats`` maps display names to the load/memory statistics collected
+    by ``backends.ModelPool``.
+    """
+    if aggregator.n_rows == 0:
+        print("No results to report.")
+        return
 
     print("\n--- Benchmark Results Summary ---")
 
     dataset_name = config['dataset']['name']
-    subsets_run = results_df['dataset_subset'].unique()
+    subsets_run = list(aggregator.subsets)
 
-    valid_results = results_df.dropna(subset=['top1_accuracy'])
-    if valid_results.empty:
+    summary = aggregator.model_summary()
+    if summary is None:
         print("No valid results with scores found for summary.")
         return
 
-    summary = valid_results.groupby("model_name").agg(
-        avg_inference_time_s=('inference_time_s', 'mean'),
-        top1_accuracy=('top1_accuracy', 'mean'),
-        std_dev_time=('inference_time_s', 'std'),
-        n_samples=('top1_accuracy', 'count')
-    ).reset_index()
-
     print(f"\nAverage Performance Metrics per Model across {len(subsets_run)} subset(s) ({dataset_name}):")
     summary['top1_accuracy'] = summary['top1_accuracy'] * 100
     print(summary.to_string(index=False, float_format="%.2f", 
                           formatters={'top1_accuracy':'{:.2f}%'.format, 
                                     'n_samples':'{:.0f}'.format}))
 
+    report_confidence_intervals(aggregator, config)
+    report_latency(aggregator.latency_summary(), config['output'].get('warmup_samples', 0))
+    report_effective_shots(aggregator.effective_shots_summary())
+    report_batch_sizes(aggregator.batch_size_summary())
+    report_prefix_cache(aggregator.prefix_cache_summary())
+    report_pipeline(aggregator.pipeline_summary())
+    report_response_cache(aggregator.response_cache_summary())
+
+    if model_stats:
+        report_model_stats(model_stats)
+
     if config['output'].get('plot_results', False):
         plot_results(summary, subsets_run, dataset_name, run_dir)
 
+def report_confidence_intervals(aggregator: ResultsAggregator, config: Dict) -> None:
+    """Prints accuracy and its confidence interval per model and subset, and micro/macro averages per model."""
+    eval_config = config.get('evaluation', {})
+    confidence = eval_config.get('confidence_level', 0.95)
+    method = eval_config.get('interval_method', 'wilson')
+    seed = config['dataset'].get('random_seed')
+
+    per_subset, averages = aggregator.accuracy_summary(confidence, method, seed)
+    if per_subset is None:
+        return
+    print(f"\nAccuracy with {confidence:.0%} Confidence Intervals ({method}) per Model and Subset:")
+    print(per_subset.to_string(index=False, float_format="%.2f"))
+
+    print(f"\nAccuracy across Subsets with {confidence:.0%} Bootstrap Intervals "
+          "(micro: pooled samples, macro: mean of subsets):")
+    print(averages.to_string(index=False, float_format="%.2f"))
+
+def report_latency(latency_summary: Optional[pd.DataFrame], warmup_samples: int = 0) -> None:
+    """Prints latency percentiles and token throughput per model and subset.
+
+    Only samples computed in this run count: response cache hits and failed
+    samples are left out, as are the first ``warmup_samples`` samples each
+    model computed on a subset. Percentiles are approximate (within 0.5%).
+    """
+    if latency_summary is None:
+        return
+
+    warmup_note = f", first {warmup_samples} samples dropped as warm-up" if warmup_samples else ""
+    print(f"\nLatency and Throughput per Model and Subset{warmup_note}:")
+    print(latency_summary.to_string(index=False, float_format="%.4f"))
+
+def report_effective_shots(shots_summary: Optional[pd.DataFrame]) -> None:
+    """Prints, per model and subset, how many prompts lost few-shot examples to fit the context window."""
+    if shots_summary is None:
+        return
+
+    print("\nPrompts Shortened to Fit the Context Window per Model and Subset:")
+    print(shots_summary.to_string(index=False, float_format="%.2f"))
+
+def report_batch_sizes(batch_summary: Optional[pd.DataFrame]) -> None:
+    """Prints the batch sizes each model ran with per subset, and how often batches ran out of memory."""
+    if batch_summary is None:
+        return
+
+    print("\nBatch Sizes per Model and Subset:")
+    print(batch_summary.to_string(index=False, float_format="%.2f"))
+
+def report_prefix_cache(cache_summary: Optional[pd.DataFrame]) -> None:
+    """Prints prefix KV cache hits, misses and prefill tokens saved per model."""
+    if cache_summary is None:
+        return
+
+    print("\nPrefix KV Cache per Model:")
+    print(cache_summary.to_string(index=False))
+
+def report_pipeline(pipeline_summary: Optional[pd.DataFrame]) -> None:
+    """Prints how long each model waited for tokenized batches, and how far tokenization ran ahead."""
+    if pipeline_summary is None:
+        return
+
+    print("\nPipeline Stalls per Model and Subset (model waiting for tokenized batches):")
+    print(pipeline_summary.to_string(index=False, float_format="%.2f"))
+
+def report_response_cache(hit_rate: Optional[pd.DataFrame]) -> None:
+    """Prints the response cache hit rate per model."""
+    if hit_rate is None:
+        return
+
+    print("\nResponse Cache per Model:")
+    print(hit_rate.to_string(index=False, formatters={'hit_rate': '{:.2f}%'.format}))
+
+def report_profile(stages: List[Dict[str, Any]]) -> None:
+    """Prints the per-stage time and memory summary of a ``profiling.Profiler``."""
+    if not stages:
+        return
+    profile_summary = pd.DataFrame(stages)[[
+        'stage', 'calls', 'total_s', 'mean_s', 'max_s', 'wall_pct', 'peak_rss_mb', 'peak_rss_growth_mb'
+    ]]
+    print("\nProfile per Stage (inclusive time; stages in different threads overlap):")
+    print(profile_summary.to_string(index=False, float_format="%.3f"))
+
+def report_model_stats(model_stats: Dict[str, Dict]) -> None:
+    """Prints load count, load time, model size and peak memory per model."""
+    stats_df = pd.DataFrame.from_dict(model_stats, orient='index')
+    stats_df.index.name = 'model_name'
+    print("\nModel Load Time and Memory:")
+    print(stats_df.reset_index().to_string(index=False, float_format="%.2f"))
+
 def plot_results(summary: pd.DataFrame, subsets_run: list, dataset_name: str, run_dir: Path) -> None:
     """Generates and saves visualization of benchmark results."""
+    # Only runs that plot pay for importing matplotlib
+    import matplotlib.pyplot as plt
+
     model_names = summary["model_name"]
     accuracies = summary["top1_accuracy"]
 
@@ -0,0 +1,162 @@
+"""Columnar store of results across runs, queried by ``mmlu-bench compare``.
+
+Every finished run is appended to a Parquet dataset under
+``output.results_store_dir`` (default ``<results_dir>/results_store``),
+hive-partitioned as ``model_name=<model>/dataset_subset=<subset>/run=<run>``.
+Files are zstd-compressed and their low-cardinality string columns are
+dictionary-encoded. Queries read only the partitions and columns they need.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PARTITION_COLUMNS = ["model_name", "dataset_subset", "run"]
+
+# Repeated strings stored as dictionary indices
+DICTIONARY_COLUMNS = ["dataset_name", "expected_answer", "extracted_answer", "cpu_mode"]
+
+def results_store_dir(config: Dict) -> Path:
+    """Location of the results store."""
+    output_config = config['output']
+    store_dir = output_config.get('results_store_dir')
+    return Path(store_dir) if store_dir else Path(output_config['results_dir']) / "results_store"
+
+def _query_schema(pa: Any) -> Any:
+    """Columns ``compare`` reads; runs that lack one read it as nulls."""
+    return pa.schema([
+        ("model_name", pa.string()),
+        ("dataset_subset", pa.string()),
+        ("run", pa.string()),
+        ("top1_accuracy", pa.float64()),
+        ("latency_s", pa.float64()),
+        ("inference_time_s", pa.float64()),
+        ("response_cache_hit", pa.bool_()),
+        ("error", pa.string())
+    ])
+
+def append_run(results_df: Any, store_dir: Path, run_id: str) -> None:
+    """Writes a run's results to the store, replacing any earlier write of the same run."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(results_df.assign(run=run_id), preserve_index=False)
+    for column in DICTIONARY_COLUMNS:
+        if column in table.column_names and pa.types.is_string(table.schema.field(column).type):
+            position = table.schema.get_field_index(column)
+            table = table.set_column(position, column, table[column].dictionary_encode())
+
+    parquet = ds.ParquetFileFormat()
+    ds.write_dataset(
+        table,
+        store_dir,
+        format=parquet,
+        file_options=parquet.make_write_options(compression='zstd'),
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor='hive',
+        basename_template=f"{run_id}-part-{{i}}.parquet",
+        # Only this run's partitions are replaced, e.g. when a resumed run finishes again
+        existing_data_behavior='delete_matching'
+    )
+    print(f"Results appended to store {store_dir} as run {run_id}")
+
+def _open(store_dir: Path) -> Any:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if not Path(store_dir).exists():
+        raise FileNotFoundError(f"No results store at {store_dir}")
+    return ds.dataset(
+        store_dir,
+        schema=_query_schema(pa),
+        format='parquet',
+        partitioning=ds.partitioning(
+            pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+            flavor='hive'
+        )
+    )
+
+def list_runs(store_dir: Path) -> List[str]:
+    """Run ids in the store, oldest first (run ids are timestamps)."""
+    import pyarrow.compute as pc
+
+    runs = _open(store_dir).to_table(columns=['run']).column('run')
+    return sorted(pc.unique(runs).to_pylist())
+
+def summarize_runs(
+    store_dir: Path,
+    runs: List[str],
+    models: Optional[List[str]] = None,
+    subsets: Optional[List[str]] = None
+) -> Any:
+    """Accuracy and latency per (model, subset, run) for the given runs.
+
+    Filtering and aggregation run in Arrow over the matching partitions; only
+    the summary is returned, as a small pandas DataFrame. Latency only counts
+    samples computed in their run (no response cache hits, no errors).
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    condition = ds.field('run').isin(runs)
+    if models:
+        condition &= ds.field('model_name').isin(models)
+    if subsets:
+        condition &= ds.field('dataset_subset').isin(subsets)
+
+    table = _open(store_dir).to_table(
+        columns=PARTITION_COLUMNS + ['top1_accuracy', 'latency_s', 'response_cache_hit', 'error'],
+        filter=condition
+    )
+    computed = pc.and_(pc.invert(pc.fill_null(table['response_cache_hit'], False)), pc.is_null(table['error']))
+    table = table.append_column('computed_latency_s', pc.if_else(computed, table['latency_s'], None))
+
+    summary = table.group_by(PARTITION_COLUMNS).aggregate([
+        ('top1_accuracy', 'count'),
+        ('top1_accuracy', 'mean'),
+        ('computed_latency_s', 'approximate_median'),
+        ('computed_latency_s', 'mean')
+    ])
+    return summary.to_pandas().rename(columns={
+        'top1_accuracy_count': 'n_samples',
+        'top1_accuracy_mean': 'accuracy',
+        'computed_latency_s_approximate_median': 'latency_p50_s',
+        'computed_latency_s_mean': 'latency_mean_s'
+    })
+
+def compare_runs(
+    store_dir: Path,
+    baseline: str,
+    current: str,
+    models: Optional[List[str]] = None,
+    subsets: Optional[List[str]] = None
+) -> Any:
+    """Per (model, subset) accuracy and latency of ``current`` next to ``baseline``, with deltas."""
+    summary = summarize_runs(store_dir, [baseline, current], models, subsets)
+    keys = ["model_name", "dataset_subset"]
+    metrics = ['n_samples', 'accuracy', 'latency_p50_s']
+    before = summary[summary['run'] == baseline].set_index(keys)[metrics]
+    after = summary[summary['run'] == current].set_index(keys)[metrics]
+    comparison = before.join(after, how='outer', lsuffix='_baseline', rsuffix='_current')
+
+    comparison['accuracy_delta_pp'] = (comparison['accuracy_current'] - comparison['accuracy_baseline']) * 100
+    comparison['latency_p50_change'] = comparison['latency_p50_s_current'] / comparison['latency_p50_s_baseline'] - 1
+    for column in ('accuracy_baseline', 'accuracy_current'):
+        comparison[column] *= 100
+    return comparison.reset_index()
+
+def print_comparison(comparison: Any, baseline: str, current: str) -> None:
+    """Prints a ``compare_runs`` table."""
+    if comparison.empty:
+        print("No results for these runs in the store.")
+        return
+    print(f"\n--- Run {current} vs. baseline {baseline} ---")
+    print(comparison.to_string(
+        index=False,
+        float_format="%.4f",
+        formatters={
+            'accuracy_baseline': '{:.2f}%'.format,
+            'accuracy_current': '{:.2f}%'.format,
+            'accuracy_delta_pp': '{:+.2f}'.format,
+            'latency_p50_change': '{:+.1%}'.format
+        }
+    ))
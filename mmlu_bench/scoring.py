@@ -0,0 +1,137 @@
+"""Answer extraction and scoring, per sample and over whole result columns.
+
+``extract_answer`` handles one generation as it is produced. ``extract_answers``
+and ``score_answers`` apply the same rules to a whole column at once with
+Arrow compute kernels, which is what ``mmlu-bench rescore`` uses to
+re-extract and re-score stored generations without a model.
+"""
+
+import os
+import re
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Tried in order on the upper-cased text; the first match gives the answer letter
+ANSWER_PATTERNS = [
+    re.compile(r'^([A-D])'),
+    re.compile(r'(?:THE )?(?:ANSWER (?:IS )?)?([A-D])'),
+    re.compile(r'([A-D])\.')
+]
+
+def extract_answer(text: str) -> str:
+    """Extracts the answer letter from generated text."""
+    upper = text.upper()
+    for pattern in ANSWER_PATTERNS:
+        if match := pattern.search(upper):
+            return match.group(1)
+
+    words = text.split()
+    return words[0].upper() if words else ""
+
+def _to_arrow(values: Any) -> Any:
+    import pyarrow as pa
+
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    return pa.array(values, type=pa.string(), from_pandas=True)
+
+def extract_answers(texts: Any) -> Any:
+    """Vectorized ``extract_answer`` over a column of generations.
+
+    ``texts`` is a pandas Series, Arrow array or list of strings; nulls stay
+    null. Returns a pandas Series (with the index of a Series input).
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    column = _to_arrow(texts)
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    upper = pc.utf8_upper(column)
+
+    answers = pa.nulls(len(column), pa.string())
+    for pattern in ANSWER_PATTERNS:
+        if answers.null_count == column.null_count:
+            break
+        # Arrow's extract_regex needs a named group
+        named = pattern.pattern.replace('([A-D])', '(?P<letter>[A-D])')
+        letters = pc.struct_field(pc.extract_regex(upper, named), [0])
+        answers = pc.coalesce(answers, letters)
+
+    # Texts without any answer letter fall back to their first word, as in extract_answer
+    unmatched = np.flatnonzero(pc.and_(pc.is_null(answers), pc.is_valid(column)).to_numpy(zero_copy_only=False))
+    result = answers.to_numpy(zero_copy_only=False)
+    if unmatched.size:
+        result[unmatched] = [extract_answer(text) for text in pc.take(column, pa.array(unmatched)).to_pylist()]
+
+    return pd.Series(result, index=texts.index if isinstance(texts, pd.Series) else None, dtype=object)
+
+def score_answers(extracted: Any, expected: Any) -> np.ndarray:
+    """Vectorized ``evaluation.evaluate_mmlu_response``: 1 where the answer matches, else 0."""
+    import pyarrow.compute as pc
+
+    answers = pc.utf8_upper(pc.utf8_trim_whitespace(_to_arrow(extracted)))
+    matches = pc.equal(answers, _to_arrow(expected))
+    return pc.fill_null(matches, False).to_numpy(zero_copy_only=False).astype(int)
+
+def rescore_rows(rows: List[Dict[str, Any]], config: Dict) -> int:
+    """Re-extracts and re-scores result rows in place; returns how many changed.
+
+    Rows that failed or have no generated text are left alone. Answers are
+    only re-extracted in ``generate`` mode; in the other modes the model
+    picked the letter directly and only the score is recomputed.
+    """
+    scored = [row for row in rows if row.get('error') is None and row.get('raw_generated_text') is not None]
+    if not scored or config['dataset']['name'].lower() != 'mmlu':
+        return 0
+
+    if config.get('evaluation', {}).get('mode', 'generate') == 'generate':
+        extracted = extract_answers([row['raw_generated_text'] for row in scored]).tolist()
+    else:
+        extracted = [row.get('extracted_answer') for row in scored]
+    scores = score_answers(extracted, [row.get('expected_answer') for row in scored])
+
+    changed = 0
+    for row, answer, score in zip(scored, extracted, scores.tolist()):
+        if row.get('extracted_answer') != answer or row.get('top1_accuracy') != score:
+            changed += 1
+        row['extracted_answer'] = answer
+        row['top1_accuracy'] = score
+    return changed
+
+def rescore_stream(path: Path, config: Dict, chunk_rows: int = 100_000) -> int:
+    """Rescores a ``results.jsonl`` stream chunk by chunk and replaces it atomically.
+
+    Only ``chunk_rows`` rows are held in memory at a time. Lines cut short by
+    a crash are dropped. Returns the number of rows whose answer or score
+    changed.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".rescore")
+    changed = 0
+
+    def flush(rows: List[Dict[str, Any]], out: Any) -> int:
+        count = rescore_rows(rows, config)
+        out.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+        return count
+
+    with open(path, encoding='utf-8') as f, open(tmp_path, 'w', encoding='utf-8') as out:
+        rows = []
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+            if len(rows) >= chunk_rows:
+                changed += flush(rows, out)
+                rows = []
+        changed += flush(rows, out)
+
+    os.replace(tmp_path, path)
+    return changed
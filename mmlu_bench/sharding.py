@@ -0,0 +1,138 @@
+"""Running a benchmark as deterministic shards and merging their outputs."""
+
+import os
+import copy
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+from .core import run_benchmark_pipeline, finalize_run, save_subset_results
+from .config import load_config
+from .utils import (
+    RESULTS_STREAM,
+    combine_model_stats,
+    load_model_stats,
+    save_config_snapshot,
+    save_model_stats
+)
+
+def shard_dir_name(shard_index: int, num_shards: int) -> str:
+    return f"shard_{shard_index:03d}_of_{num_shards:03d}"
+
+def shard_config(config: Dict, shard_index: int, num_shards: int) -> Dict:
+    """Returns a copy of the config that runs only one shard of the work list."""
+    config = copy.deepcopy(config)
+    config['dataset']['shard_index'] = shard_index
+    config['dataset']['num_shards'] = num_shards
+    return config
+
+def _run_shard(config: Dict, shard_dir: str, subset: Optional[str], num_threads: int) -> str:
+    """Process pool worker: runs one shard with its share of the CPU cores."""
+    import torch
+    torch.set_num_threads(num_threads)
+    # The launcher already splits the cores between workers; per-process
+    # thread counts or pinning would oversubscribe them
+    cpu_mode = config['hardware'].get('cpu_mode') or {}
+    for key in ('intra_op_threads', 'inter_op_threads', 'pin_cores'):
+        cpu_mode.pop(key, None)
+
+    # Shards only stream their rows; the merge step saves and reports
+    config['output']['save_results'] = False
+    config['output']['plot_results'] = False
+    run_benchmark_pipeline(config, Path(shard_dir), subset)
+    return shard_dir
+
+def launch_shards(
+    config: Dict,
+    run_dir: Path,
+    num_shards: int,
+    subset: Optional[str] = None,
+    max_workers: Optional[int] = None
+) -> None:
+    """Runs every shard of a benchmark in a local process pool, then merges them.
+
+    Each worker gets an equal share of the CPU cores for its torch threads.
+    Shard outputs go to ``<run_dir>/shards/shard_XXX_of_YYY``.
+    """
+    max_workers = min(num_shards, max_workers or os.cpu_count() or 1)
+    num_threads = max((os.cpu_count() or 1) // max_workers, 1)
+    if subset:
+        config['dataset']['subsets'] = [subset]
+    save_config_snapshot(config, run_dir)
+
+    shard_dirs = []
+    for shard_index in range(num_shards):
+        shard_dir = run_dir / "shards" / shard_dir_name(shard_index, num_shards)
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        shard_dirs.append(shard_dir)
+
+    print(f"Launching {num_shards} shards on {max_workers} worker processes "
+          f"({num_threads} threads each)")
+    # Workers are spawned rather than forked so each starts with a clean torch runtime
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(
+                _run_shard,
+                shard_config(config, shard_index, num_shards),
+                str(shard_dir),
+                subset,
+                num_threads
+            ): shard_index
+            for shard_index, shard_dir in enumerate(shard_dirs)
+        }
+        for future in as_completed(futures):
+            try:
+                print(f"Shard {futures[future]} finished: {future.result()}")
+            except Exception as e:
+                print(f"Shard {futures[future]} failed: {e}")
+
+    merge_runs(run_dir, shard_dirs)
+
+def merge_runs(run_dir: Path, shard_dirs: Optional[List[Path]] = None) -> None:
+    """Combines shard outputs into the results and report of a single run.
+
+    ``shard_dirs`` defaults to every directory under ``<run_dir>/shards``. The
+    merged run uses ``<run_dir>/config.yaml`` if present, otherwise the config
+    of the first shard without its shard settings.
+    """
+    run_dir = Path(run_dir)
+    if shard_dirs is None:
+        shard_dirs = sorted(path for path in (run_dir / "shards").iterdir() if path.is_dir())
+    shard_dirs = [Path(shard_dir) for shard_dir in shard_dirs]
+    if not shard_dirs:
+        raise ValueError(f"No shard directories to merge into {run_dir}")
+
+    config_path = run_dir / "config.yaml"
+    if not config_path.exists():
+        config_path = shard_dirs[0] / "config.yaml"
+    config = load_config(str(config_path))
+    config['dataset'].pop('shard_index', None)
+    config['dataset'].pop('num_shards', None)
+
+    run_dir.mkdir(parents=True, exist_ok=True)
+    save_config_snapshot(config, run_dir)
+
+    # Concatenate the per-subset streams; sorting happens when they are loaded
+    for subset_name in config['dataset']['subsets']:
+        merged_stream = run_dir / subset_name / RESULTS_STREAM
+        merged_stream.parent.mkdir(parents=True, exist_ok=True)
+        with open(merged_stream, 'wb') as out:
+            for shard_dir in shard_dirs:
+                shard_stream = shard_dir / subset_name / RESULTS_STREAM
+                if shard_stream.exists():
+                    with open(shard_stream, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                        # A shard cut off mid-write lacks its final newline
+                        if f.tell() > 0:
+                            f.seek(-1, os.SEEK_END)
+                            if f.read(1) != b"\n":
+                                out.write(b"\n")
+        save_subset_results(config, run_dir, subset_name)
+
+    model_stats = combine_model_stats([load_model_stats(shard_dir) for shard_dir in shard_dirs])
+    save_model_stats(model_stats, run_dir)
+    print(f"Merged {len(shard_dirs)} shards into {run_dir}")
+    finalize_run(config, run_dir, model_stats)
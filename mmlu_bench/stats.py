@@ -0,0 +1,108 @@
+"""Confidence intervals for accuracy estimates.
+
+The ``*_intervals`` functions work on arrays of success and sample counts,
+one entry per group (e.g. per model and subset), so a whole report's
+intervals come from a few NumPy operations.
+"""
+
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+def wilson_intervals(successes: Sequence[int], totals: Sequence[int], confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    """Wilson score intervals for binomial proportions, one per (successes, total) pair."""
+    successes = np.asarray(successes, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    n = np.maximum(totals, 1)
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    empty = totals == 0
+    return np.where(empty, 0.0, np.maximum(center - half_width, 0.0)), np.where(empty, 1.0, np.minimum(center + half_width, 1.0))
+
+def wilson_interval(successes: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval for a binomial proportion."""
+    low, high = wilson_intervals([successes], [n], confidence)
+    return float(low[0]), float(high[0])
+
+def bootstrap_accuracies(
+    successes: Sequence[int],
+    totals: Sequence[int],
+    n_resamples: int = 1000,
+    seed: Optional[int] = None
+) -> np.ndarray:
+    """Bootstrap resamples of the accuracy of each group, shape (n_resamples, groups).
+
+    Resampling n 0/1 scores with replacement draws a Binomial(n, accuracy)
+    number of correct answers, so the resamples come from the counts alone
+    instead of indexing every score ``n_resamples`` times. Groups are
+    resampled independently, which makes averages over the columns a
+    stratified bootstrap.
+    """
+    successes = np.asarray(successes, dtype=np.int64)
+    totals = np.asarray(totals, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    n = np.maximum(totals, 1)
+    correct = rng.binomial(totals, successes / n, size=(n_resamples, len(totals)))
+    return correct / n
+
+def percentile_intervals(resamples: np.ndarray, confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    """Percentile intervals of each column of bootstrap ``resamples``."""
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(resamples, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+def bootstrap_intervals(
+    successes: Sequence[int],
+    totals: Sequence[int],
+    confidence: float = 0.95,
+    resamples: Optional[np.ndarray] = None,
+    seed: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Percentile bootstrap intervals of the accuracy of each group.
+
+    ``resamples`` from ``bootstrap_accuracies`` are drawn if not given. A
+    group with every answer correct or every answer wrong resamples to the
+    same accuracy every time, which would give a zero-width interval; such
+    groups (and empty ones) get their Wilson interval instead.
+    """
+    successes = np.asarray(successes, dtype=np.int64)
+    totals = np.asarray(totals, dtype=np.int64)
+    if resamples is None:
+        resamples = bootstrap_accuracies(successes, totals, seed=seed)
+    low, high = percentile_intervals(resamples, confidence)
+    wilson_low, wilson_high = wilson_intervals(successes, totals, confidence)
+    degenerate = (successes == 0) | (successes == totals)
+    return np.where(degenerate, wilson_low, low), np.where(degenerate, wilson_high, high)
+
+def accuracy_intervals(
+    successes: Sequence[int],
+    totals: Sequence[int],
+    confidence: float = 0.95,
+    method: str = 'wilson',
+    seed: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Confidence intervals of accuracies given as correct and total counts per group."""
+    if method == 'wilson':
+        return wilson_intervals(successes, totals, confidence)
+    if method == 'bootstrap':
+        return bootstrap_intervals(successes, totals, confidence, seed=seed)
+    raise ValueError(f"Unknown evaluation.interval_method '{method}'")
+
+def accuracy_interval(
+    scores: Sequence[float],
+    confidence: float = 0.95,
+    method: str = 'wilson',
+    seed: Optional[int] = None
+) -> Tuple[float, float]:
+    """Confidence interval of the mean of 0/1 accuracy scores."""
+    low, high = accuracy_intervals([int(np.sum(scores))], [len(scores)], confidence, method, seed)
+    return float(low[0]), float(high[0])
+
+def intervals_separated(intervals: Dict[str, Tuple[float, float]]) -> bool:
+    """True when no two intervals overlap, i.e. the ranking they imply is settled."""
+    ordered = sorted(intervals.values())
+    return all(upper < next_lower for (_, upper), (next_lower, _) in zip(ordered, ordered[1:]))
@@ -0,0 +1,210 @@
+"""Offline store of prepared subsets, prompts and token ids.
+
+``mmlu-bench prepare`` writes, for every configured subset, the shuffled and
+sampled dataset, its rendered prompts and the prompt token ids of every
+configured tokenizer under ``dataset.prepared_dir``::
+
+    <prepared_dir>/<subset>/manifest.json
+    <prepared_dir>/<subset>/dataset/           (Arrow, memory-mapped on load)
+    <prepared_dir>/<subset>/prompts/           (Arrow, memory-mapped on load)
+    <prepared_dir>/<subset>/tokens/<tokenizer fingerprint>/{ids,offsets}.npy
+
+Runs then load subsets and prompts from the store without network access,
+and models whose tokenizer fingerprint matches skip prompt tokenization.
+"""
+
+import json
+import random
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SELECTION_KEYS = ('provider', 'split', 'sample_size', 'random_seed')
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _rng_state_hash() -> str:
+    """Fingerprint of the global ``random`` state that few-shot sampling draws from."""
+    return _hash(random.getstate())
+
+def _selection(config: Dict, subset_name: str) -> Dict:
+    """The dataset settings that decide which samples a subset holds, and in what order."""
+    selection = {key: config['dataset'].get(key) for key in SELECTION_KEYS}
+    selection['subset'] = subset_name
+    return selection
+
+def _prompt_settings(config: Dict) -> Dict:
+    return {"dataset": config['dataset']['name'], "prompt": config['prompt']}
+
+def subset_store_dir(config: Dict, subset_name: str) -> Optional[Path]:
+    """Returns the store directory of a subset, or None when no store is configured."""
+    prepared_dir = config['dataset'].get('prepared_dir')
+    if not prepared_dir:
+        return None
+    return Path(prepared_dir) / subset_name
+
+def _read_manifest(config: Dict, subset_name: str) -> Optional[Dict]:
+    """Returns the manifest of a stored subset if it holds the configured sample selection."""
+    store_dir = subset_store_dir(config, subset_name)
+    if store_dir is None or not (store_dir / "manifest.json").exists():
+        return None
+    with open(store_dir / "manifest.json") as f:
+        manifest = json.load(f)
+    if manifest.get('selection') != _selection(config, subset_name):
+        return None
+    return manifest
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """Hashes everything about a tokenizer that decides the ids a prompt encodes to."""
+    if getattr(tokenizer, 'is_fast', False):
+        definition = tokenizer.backend_tokenizer.to_str()
+    else:
+        definition = sorted(tokenizer.get_vocab().items())
+    return _hash([
+        type(tokenizer).__name__,
+        definition,
+        tokenizer.model_max_length,
+        tokenizer.special_tokens_map
+    ])[:16]
+
+def load_stored_dataset(config: Dict, subset_name: str) -> Optional[Any]:
+    """Memory-maps a prepared subset if the store holds the configured selection."""
+    if _read_manifest(config, subset_name) is None:
+        return None
+    from datasets import load_from_disk
+    return load_from_disk(str(subset_store_dir(config, subset_name) / "dataset"))
+
+def load_stored_prompts(config: Dict, subset_name: str) -> Optional[List[Any]]:
+    """Returns the stored prompts of a subset if they are what formatting would produce now.
+
+    Stored prompts are valid when the prompt settings match and the global
+    ``random`` state equals the one they were rendered from. On a match the
+    ``random`` state is advanced to where rendering would have left it.
+    """
+    from .prompting import MMLUPrompt
+
+    manifest = _read_manifest(config, subset_name)
+    if manifest is None or 'prompts' not in manifest:
+        return None
+    prompts_manifest = manifest['prompts']
+    if (prompts_manifest['settings'] != _hash(_prompt_settings(config))
+            or prompts_manifest['rng_state_before'] != _rng_state_hash()):
+        return None
+
+    from datasets import load_from_disk
+    columns = load_from_disk(str(subset_store_dir(config, subset_name) / "prompts"))[:]
+    # Stores written before few-shot indices were kept are rendered again
+    if 'shot_indices' not in columns:
+        return None
+    random.setstate(_state_from_json(prompts_manifest['rng_state_after']))
+    return [
+        MMLUPrompt(instructions, shots, question, tuple(shot_indices))
+        for instructions, shots, question, shot_indices in zip(
+            columns['instructions'], columns['shots'], columns['question'], columns['shot_indices']
+        )
+    ]
+
+class StoredTokenIds:
+    """Prompt token ids of one tokenizer, memory-mapped from the store."""
+
+    def __init__(self, token_dir: Path):
+        self.ids = np.load(token_dir / "ids.npy", mmap_mode='r')
+        self.offsets = np.load(token_dir / "offsets.npy", mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> List[int]:
+        return self.ids[self.offsets[index]:self.offsets[index + 1]].tolist()
+
+def load_stored_token_ids(config: Dict, subset_name: str, tokenizer: Any) -> Optional[StoredTokenIds]:
+    """Returns the stored prompt token ids of a subset for a tokenizer, if prepared."""
+    store_dir = subset_store_dir(config, subset_name)
+    if store_dir is None:
+        return None
+    token_dir = store_dir / "tokens" / tokenizer_fingerprint(tokenizer)
+    if not (token_dir / "ids.npy").exists():
+        return None
+    return StoredTokenIds(token_dir)
+
+def _state_to_json(state: tuple) -> list:
+    version, internal_state, gauss_next = state
+    return [version, list(internal_state), gauss_next]
+
+def _state_from_json(state: list) -> tuple:
+    version, internal_state, gauss_next = state
+    return (version, tuple(internal_state), gauss_next)
+
+def prepare_store(config: Dict) -> None:
+    """Materialises every configured subset, its prompts and token ids into the store."""
+    from datasets import Dataset
+    from transformers import AutoTokenizer
+
+    from .data import load_benchmark_data
+    from .evaluation import prepare_subset
+    from .generation import encode_prompts
+
+    if not config['dataset'].get('prepared_dir'):
+        raise ValueError("Missing 'dataset.prepared_dir' in configuration")
+
+    tokenizers = {}
+    for model_config in config['models'].values():
+        # Remote backends tokenize on the server
+        if model_config.get('backend', 'hf') != 'hf':
+            continue
+        tokenizer = AutoTokenizer.from_pretrained(model_config['name'], revision=model_config.get('revision'))
+        tokenizers[tokenizer_fingerprint(tokenizer)] = (model_config['display_name'], tokenizer)
+
+    # Seed like run_benchmark_pipeline so prompts are rendered from the same state
+    if config['dataset'].get('random_seed') is not None:
+        random.seed(config['dataset']['random_seed'])
+
+    for subset_name in config['dataset']['subsets']:
+        print(f"\n=== Preparing Dataset Subset: {subset_name} ===")
+        store_dir = subset_store_dir(config, subset_name)
+        store_dir.mkdir(parents=True, exist_ok=True)
+
+        # Always fetch fresh data here; runs are the ones that read the store
+        dataset = load_benchmark_data(subset_name, config, use_store=False)
+        dataset.save_to_disk(str(store_dir / "dataset"))
+
+        rng_state_before = _rng_state_hash()
+        prompt_parts = prepare_subset(dataset, config).prompt_parts
+        rng_state_after = random.getstate()
+        Dataset.from_dict({
+            "instructions": [parts.instructions for parts in prompt_parts],
+            "shots": [parts.shots for parts in prompt_parts],
+            "question": [parts.question for parts in prompt_parts],
+            "shot_indices": [list(parts.shot_indices) for parts in prompt_parts]
+        }).save_to_disk(str(store_dir / "prompts"))
+
+        texts = [parts.text for parts in prompt_parts]
+        for fingerprint, (display_name, tokenizer) in tokenizers.items():
+            encoded = encode_prompts(tokenizer, texts)
+            token_dir = store_dir / "tokens" / fingerprint
+            token_dir.mkdir(parents=True, exist_ok=True)
+            lengths = np.array([len(ids) for ids in encoded], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            flat = np.fromiter((token for ids in encoded for token in ids), dtype=np.int64, count=int(offsets[-1]))
+            np.save(token_dir / "ids.npy", flat)
+            np.save(token_dir / "offsets.npy", offsets)
+            print(f"Stored {int(offsets[-1])} prompt tokens for {display_name} ({fingerprint})")
+
+        manifest = {
+            "selection": _selection(config, subset_name),
+            "num_rows": len(dataset),
+            "prompts": {
+                "settings": _hash(_prompt_settings(config)),
+                "rng_state_before": rng_state_before,
+                "rng_state_after": _state_to_json(rng_state_after)
+            },
+            "tokenizers": {
+                fingerprint: display_name for fingerprint, (display_name, _) in tokenizers.items()
+            }
+        }
+        with open(store_dir / "manifest.json", 'w') as f:
+            json.dump(manifest, f)
+        print(f"Prepared {len(dataset)} samples of {subset_name} in {store_dir}")
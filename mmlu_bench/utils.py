@@ -1,17 +1,15 @@
 """Utility functions for configuration and setup."""
 
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import os
+import sys
+import json
 import yaml
 from pathlib import Path
 import torch
 import pandas as pd
 from datetime import datetime
 
-def load_config(config_path: str = "config.yaml") -> Dict:
-    """Loads configuration from YAML file."""
-    with open(config_path) as f:
-        return yaml.safe_load(f)
-
 def get_device_settings(config: Dict) -> Tuple[torch.device, torch.dtype]:
     """Determines device and dtype from config."""
     device = torch.device("cuda" if torch.cuda.is_available() and 
@@ -23,9 +21,123 @@ def get_device_settings(config: Dict) -> Tuple[torch.device, torch.dtype]:
         "float32": torch.float32
     }
     dtype = dtype_map.get(config['hardware'].get('dtype', 'float16'), torch.float16)
+    # Half-precision matmuls are slow or unsupported on CPU
+    if device.type == "cpu" and dtype == torch.float16:
+        dtype = torch.float32
     
     return device, dtype
 
+def get_cpu_mode(config: Dict) -> Dict:
+    """Returns the ``hardware.cpu_mode`` settings, which only apply when running on CPU."""
+    device, _ = get_device_settings(config)
+    if device.type != "cpu":
+        return {}
+    return config['hardware'].get('cpu_mode') or {}
+
+def bf16_autocast_supported() -> bool:
+    """Whether this CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    checks = ('_is_avx512_bf16_supported', '_is_amx_tile_supported')
+    return any(getattr(torch.cpu, check, lambda: False)() for check in checks)
+
+def _resolve_cores(pin_cores) -> List[int]:
+    """Turns ``cpu_mode.pin_cores`` (a list of core ids or "numa:N") into core ids."""
+    if isinstance(pin_cores, str) and pin_cores.startswith("numa:"):
+        node = int(pin_cores.split(":", 1)[1])
+        cpulist = Path(f"/sys/devices/system/node/node{node}/cpulist").read_text().strip()
+        cores = []
+        for part in cpulist.split(","):
+            first, _, last = part.partition("-")
+            cores.extend(range(int(first), int(last or first) + 1))
+        return cores
+    return [int(core) for core in pin_cores]
+
+def configure_cpu(config: Dict) -> None:
+    """Applies the process-wide thread and pinning settings of ``hardware.cpu_mode``.
+
+    Pinning keeps every thread on the given cores, e.g. the cores of one NUMA
+    node with ``pin_cores: "numa:0"``; without an explicit
+    ``intra_op_threads`` torch then uses one thread per pinned core.
+    """
+    cpu_mode = get_cpu_mode(config)
+    intra_op_threads = cpu_mode.get('intra_op_threads')
+
+    if cpu_mode.get('pin_cores') is not None:
+        cores = _resolve_cores(cpu_mode['pin_cores'])
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+            print(f"Pinned to CPU cores {cores}")
+            intra_op_threads = intra_op_threads or len(cores)
+        else:
+            print("Warning: CPU pinning is not supported on this platform")
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if cpu_mode.get('inter_op_threads'):
+        try:
+            torch.set_num_interop_threads(cpu_mode['inter_op_threads'])
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work in the process
+            print(f"Warning: could not set inter-op threads: {e}")
+
+def cpu_mode_label(config: Dict) -> str:
+    """Short description of the precision, compilation and threading a run used."""
+    device, dtype = get_device_settings(config)
+    if device.type != "cpu":
+        return f"{device.type}-{str(dtype).replace('torch.', '')}"
+
+    cpu_mode = get_cpu_mode(config)
+    parts = [f"cpu-{str(dtype).replace('torch.', '')}"]
+    if cpu_mode.get('quantize', 'none') != 'none':
+        parts.append(cpu_mode['quantize'])
+    if cpu_mode.get('autocast_bf16', False) and bf16_autocast_supported():
+        parts.append("autocast_bf16")
+    if cpu_mode.get('compile', False):
+        parts.append("compile")
+    parts.append(f"threads{torch.get_num_threads()}")
+    if cpu_mode.get('pin_cores') is not None:
+        parts.append("pinned")
+    return "+".join(parts)
+
+# Peak CUDA memory per device index from before resets made with keep_peak
+_kept_peak_bytes = {}
+
+def _cuda_index(device: torch.device) -> int:
+    return device.index if device.index is not None else torch.cuda.current_device()
+
+def reset_peak_memory(device: torch.device, keep_peak: bool = False) -> None:
+    """Resets the CUDA peak memory statistics of ``device``.
+
+    With ``keep_peak`` the peak so far still counts for ``get_peak_memory_mb``;
+    only ``torch.cuda.max_memory_allocated`` starts over, e.g. to measure
+    one step.
+    """
+    index = _cuda_index(device)
+    kept = 0
+    if keep_peak:
+        kept = max(_kept_peak_bytes.get(index, 0), torch.cuda.max_memory_allocated(device))
+    _kept_peak_bytes[index] = kept
+    torch.cuda.reset_peak_memory_stats(device)
+
+def get_peak_memory_mb(device: torch.device) -> float:
+    """Returns the peak memory of the process so far in MB.
+
+    On CUDA this is the peak allocated device memory since the last
+    ``reset_peak_memory`` without ``keep_peak``; on CPU it is the peak
+    resident set size of the process.
+    """
+    if device.type == "cuda":
+        peak = max(torch.cuda.max_memory_allocated(device), _kept_peak_bytes.get(_cuda_index(device), 0))
+        return peak / 2**20
+
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
 def setup_output_directory(config: Dict) -> Path:
     """Create output directory structure."""
     # Make sure we have the output configuration
@@ -56,4 +168,175 @@ def save_results(results_df: pd.DataFrame, config: Dict, run_dir: Path) -> None:
         elif format == 'json':
             results_df.to_json(run_dir / 'results.json', orient='records')
         elif format == 'pickle':
-            results_df.to_pickle(run_dir / 'results.pkl') 
\ No newline at end of file
+            results_df.to_pickle(run_dir / 'results.pkl') 
+
+def save_results_chunks(chunks: Iterable[pd.DataFrame], columns: List[str], config: Dict, run_dir: Path) -> None:
+    """Saves results that arrive in chunks in the csv and json formats, one chunk in memory at a time.
+
+    Every chunk is written with ``columns``. The pickle format needs the
+    whole DataFrame and is left to ``save_results``.
+    """
+    formats = config['output'].get('save_format', ['csv'])
+    csv_file = open(run_dir / 'results.csv', 'w', newline='') if 'csv' in formats else None
+    json_file = open(run_dir / 'results.json', 'w') if 'json' in formats else None
+    try:
+        if json_file:
+            json_file.write("[")
+        header = True
+        separator = ""
+        for chunk in chunks:
+            chunk = chunk.reindex(columns=columns)
+            if csv_file:
+                chunk.to_csv(csv_file, index=False, header=header)
+                header = False
+            if json_file and not chunk.empty:
+                # Join the records of each chunk into one array
+                json_file.write(separator + chunk.to_json(orient='records')[1:-1])
+                separator = ","
+        if json_file:
+            json_file.write("]")
+    finally:
+        for f in (csv_file, json_file):
+            if f:
+                f.close()
+
+RESULTS_STREAM = "results.jsonl"
+
+class ResultsWriter:
+    """Appends result rows to a JSONL file, flushing to disk every ``flush_every`` rows.
+
+    Rows that reached disk survive the process being killed, so an
+    interrupted run can be resumed from the file.
+    """
+
+    def __init__(self, path: Path, flush_every: int = 32):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = max(flush_every, 1)
+        self.buffer = []
+        self.file = open(self.path, 'a', encoding='utf-8')
+        # A run killed mid-write can leave a partial last line; start on a fresh one
+        if self.file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def write(self, rows: Iterable[Dict]) -> None:
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        for row in self.buffer:
+            self.file.write(json.dumps(row, default=str) + "\n")
+        self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def _read_stream(path: Path) -> List[Dict]:
+    """Reads the rows of a results stream, ignoring a line cut short by a crash."""
+    rows = []
+    if not path.exists():
+        return rows
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+def completed_samples(run_dir: Path, subsets: List[str]) -> Set[Tuple[str, str, int]]:
+    """Returns the (model, subset, sample index) triples already recorded without error."""
+    completed = set()
+    for subset in subsets:
+        for row in _read_stream(Path(run_dir) / subset / RESULTS_STREAM):
+            key = (row['model_name'], row['dataset_subset'], row['sample_index'])
+            if row.get('error') is None:
+                completed.add(key)
+            else:
+                completed.discard(key)
+    return completed
+
+def load_streamed_results(
+    run_dir: Path,
+    subsets: List[str],
+    model_names: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Rebuilds the results DataFrame of a run from its per-subset result streams.
+
+    Only the latest row per (model, subset, sample index) is kept, and rows are
+    ordered by subset, sample index and model, as a single pass produces them.
+    """
+    frames = []
+    for subset in subsets:
+        rows = _read_stream(Path(run_dir) / subset / RESULTS_STREAM)
+        if rows:
+            frames.append(pd.DataFrame(rows))
+    if not frames:
+        return pd.DataFrame()
+
+    results_df = pd.concat(frames, ignore_index=True)
+    results_df = results_df.drop_duplicates(
+        subset=['model_name', 'dataset_subset', 'sample_index'],
+        keep='last'
+    )
+
+    subset_order = {subset: i for i, subset in enumerate(subsets)}
+    model_names = model_names or list(dict.fromkeys(results_df['model_name']))
+    model_order = {name: i for i, name in enumerate(model_names)}
+    order = pd.DataFrame({
+        'subset': results_df['dataset_subset'].map(subset_order),
+        'sample': results_df['sample_index'],
+        'model': results_df['model_name'].map(model_order).fillna(len(model_order))
+    })
+    return results_df.loc[order.sort_values(['subset', 'sample', 'model'], kind='stable').index].reset_index(drop=True)
+
+def save_config_snapshot(config: Dict, run_dir: Path) -> None:
+    """Saves the configuration a run was started with, so it can be resumed."""
+    with open(Path(run_dir) / "config.yaml", 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+def save_model_stats(model_stats: Dict[str, Dict], run_dir: Path) -> None:
+    """Saves the per-model load/memory statistics of a run."""
+    with open(Path(run_dir) / "model_stats.json", 'w') as f:
+        json.dump(model_stats, f, indent=2)
+
+def load_model_stats(run_dir: Path) -> Dict[str, Dict]:
+    """Loads the per-model statistics saved by ``save_model_stats``, if any."""
+    path = Path(run_dir) / "model_stats.json"
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def combine_model_stats(stats_list: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Combines per-model statistics from several processes or attempts.
+
+    Loads and load times add up; model size and peak memory keep the maximum.
+    """
+    combined = {}
+    for model_stats in stats_list:
+        for name, stats in model_stats.items():
+            if name not in combined:
+                combined[name] = dict(stats)
+                continue
+            entry = combined[name]
+            entry["loads"] += stats["loads"]
+            entry["model_load_time_s"] += stats["model_load_time_s"]
+            entry["model_memory_mb"] = max(entry["model_memory_mb"], stats["model_memory_mb"])
+            entry["peak_memory_mb"] = max(entry["peak_memory_mb"], stats["peak_memory_mb"])
+    return combined
@@ -38,6 +38,7 @@ setup(
         "nltk>=3.9.1",
         "numpy>=2.2.4",
         "pandas>=2.2.3",
+        "pyarrow>=15.0.0",
         "matplotlib>=3.10.1",
         "tqdm>=4.67.1",
         "PyYAML>=6.0.2",
@@ -55,10 +56,13 @@ setup(
             "flake8>=6.0.0",
             "mypy>=1.0.0",
         ],
+        "http": [
+            "aiohttp>=3.9.0",
+        ],
     },
     entry_points={
         "console_scripts": [
-            "mmlu-bench=mmlu_bench.cli:main",
+            "mmlu-bench=mmlu_bench.cli:cli",
         ]
     },
     classifiers=[
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from mmlu_bench.benchmarks.fixtures import benchmark_config, build_tiny_model, synthetic_mmlu
+from mmlu_bench.evaluation import run_benchmark
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory):
+    """Tiny random GPT-2 from the benchmark fixtures, built once per session."""
+    return build_tiny_model(tmp_path_factory.mktemp("tiny-model"))
+
+@pytest.fixture
+def run_tiny(tiny_model_dir):
+    """Runs the tiny model on synthetic data; sections of the config are updated from keyword dicts."""
+
+    def run(num_samples=12, dataset=None, response_cache=None, **sections):
+        config = benchmark_config(tiny_model_dir)
+        for section, values in sections.items():
+            config[section].update(values)
+        random.seed(0)
+        results = run_benchmark(dataset or synthetic_mmlu(num_samples), config, "synthetic", response_cache=response_cache)
+        return results.sort_values("sample_index").reset_index(drop=True)
+
+    return run
+
+@pytest.fixture(scope="session")
+def tiny_model(tiny_model_dir):
+    """(model, tokenizer) of the tiny GPT-2, loaded as the harness loads models."""
+    from mmlu_bench.generation import load_model_and_tokenizer
+
+    return load_model_and_tokenizer(str(tiny_model_dir), benchmark_config(tiny_model_dir))
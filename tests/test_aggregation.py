@@ -0,0 +1,51 @@
+import json
+
+import pandas as pd
+
+from mmlu_bench.aggregation import result_chunks, result_columns, stream_chunks
+from mmlu_bench.utils import RESULTS_STREAM, load_streamed_results, save_results, save_results_chunks
+
+MODELS = ["Model-B", "Model-A"]
+
+def _row(model, sample, accuracy=1, **extra):
+    return {"model_name": model, "dataset_subset": "s1", "sample_index": sample,
+            "top1_accuracy": accuracy, "inference_time_s": 0.5 + sample, **extra}
+
+def _write_stream(run_dir):
+    rows = [_row(model, sample) for sample in (3, 0, 4, 1, 2) for model in ("Model-A", "Model-B")]
+    # A resumed run recomputes a failed sample, and the stream ends mid-line
+    rows[2] = _row("Model-A", 0, 0, error="out of memory")
+    rows.append(_row("Model-A", 0, 1, raw_generated_text='say "A"'))
+    lines = [json.dumps(row) for row in rows]
+    lines.append(lines[0][:20])
+    path = run_dir / "s1" / RESULTS_STREAM
+    path.parent.mkdir(parents=True)
+    path.write_text("\n".join(lines))
+
+def test_result_chunks_match_loaded_results(tmp_path):
+    _write_stream(tmp_path)
+    expected = load_streamed_results(tmp_path, ["s1"], MODELS)
+    columns = result_columns(tmp_path, ["s1"])
+    assert columns == list(expected.columns)
+
+    chunks = list(result_chunks(tmp_path, ["s1"], MODELS, chunk_rows=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    combined = pd.concat(chunks, ignore_index=True).reindex(columns=columns)
+    # The superseded error leaves an all-null column whose dtype depends on the rows read
+    pd.testing.assert_frame_equal(combined, expected, check_dtype=False)
+
+    reported = pd.concat(stream_chunks(tmp_path, ["s1"], chunk_rows=4))
+    assert len(reported) == len(expected)
+
+def test_save_results_chunks_matches_save_results(tmp_path):
+    _write_stream(tmp_path)
+    config = {"output": {"save_format": ["csv", "json"]}}
+    whole, chunked = tmp_path / "whole", tmp_path / "chunked"
+    whole.mkdir()
+    chunked.mkdir()
+
+    save_results(load_streamed_results(tmp_path, ["s1"], MODELS), config, whole)
+    save_results_chunks(result_chunks(tmp_path, ["s1"], MODELS, chunk_rows=4), result_columns(tmp_path, ["s1"]), config, chunked)
+
+    for name in ("results.csv", "results.json"):
+        assert (chunked / name).read_text() == (whole / name).read_text()
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from mmlu_bench import autobatch, backends
+from mmlu_bench.autobatch import BUDGET_FILL, BatchTuner, is_out_of_memory
+
+@pytest.fixture
+def tuner(monkeypatch):
+    """A tuner over a stand-in model whose rows cost 1 MiB each, with 1 GiB of a 2 GiB budget in use."""
+    monkeypatch.setattr(autobatch, "can_measure", lambda device: True)
+    monkeypatch.setattr(autobatch, "memory_in_use", lambda device: 2**30)
+    model = SimpleNamespace(device=torch.device("cpu"), dtype=torch.float32)
+    tuner = BatchTuner(model, tokenizer=None, memory_budget_gb=2)
+    tuner.measured = []
+
+    def measure(ids, length):
+        tuner.measured.append(length)
+        return 2**20
+
+    tuner._measure_row_bytes = measure
+    return tuner
+
+def test_limits_fit_the_free_budget(tuner):
+    config = {"generation": {"batch_size": 10_000, "max_new_tokens": 5}}
+    batch_size, max_tokens, bucket = tuner.limits([[1] * 20, [1] * 30], config)
+
+    assert bucket == 64
+    assert batch_size == int(2**30 * BUDGET_FILL // 2**20)
+    assert max_tokens == batch_size * 30
+
+def test_limits_are_capped_and_reuse_measurements(tuner):
+    config = {"generation": {"batch_size": 8, "max_new_tokens": 5}}
+
+    assert tuner.limits([[1] * 30], config) == (8, 8 * 30, 64)
+    assert tuner.limits([[1] * 40], config, max_length=48) == (8, 8 * 40, 48)
+    # 28 + 5 tokens fall into the first subset's bucket again
+    tuner.limits([[1] * 28], config)
+    assert tuner.measured == [64, 48]
+
+def test_is_out_of_memory():
+    assert is_out_of_memory(RuntimeError("CUDA out of memory. Tried to allocate 2 GiB"))
+    assert is_out_of_memory(RuntimeError("DefaultCPUAllocator: can't allocate memory"))
+    assert is_out_of_memory(MemoryError())
+    assert not is_out_of_memory(RuntimeError("shape mismatch"))
+
+def test_out_of_memory_halves_the_batch(run_tiny, monkeypatch):
+    expected = run_tiny(generation={"batch_size": 8})
+    run_batch = backends._run_batch
+
+    def small_batches_only(model, tokenizer, batch_ids, *args):
+        if len(batch_ids) > 2:
+            raise RuntimeError("CUDA out of memory")
+        return run_batch(model, tokenizer, batch_ids, *args)
+
+    monkeypatch.setattr(backends, "_run_batch", small_batches_only)
+    results = run_tiny(generation={"batch_size": 8})
+
+    assert (results["raw_generated_text"] == expected["raw_generated_text"]).all()
+    assert results["batch_rows"].max() == 2
+    # The first batch of 8 ran out, then its first half of 4; later batches are split up front
+    assert sorted(results["oom_retries"]) == [0] * 4 + [1] * 4 + [2] * 4
@@ -0,0 +1,19 @@
+import pytest
+
+from mmlu_bench.generation import make_batches
+
+def test_make_batches_groups_similar_lengths():
+    lengths = [5, 1, 9, 2, 8, 3]
+    assert make_batches(lengths, 2) == [[1, 3], [5, 0], [4, 2]]
+    # 3 rows of 3 tokens fit a cap of 9, a fourth row of 5 would not
+    assert make_batches(lengths, 8, max_tokens_per_batch=9) == [[1, 3, 5], [0], [4], [2]]
+    assert sorted(i for batch in make_batches(lengths, 4, 20) for i in batch) == list(range(len(lengths)))
+
+@pytest.mark.parametrize("batch_size", [4, 8])
+def test_batched_generation_matches_single_prompts(run_tiny, batch_size):
+    single = run_tiny(generation={"batch_size": 1})
+    batched = run_tiny(generation={"batch_size": batch_size})
+
+    assert (batched["raw_generated_text"] == single["raw_generated_text"]).all()
+    assert (batched["extracted_answer"] == single["extracted_answer"]).all()
+    assert batched["batch_rows"].max() > 1
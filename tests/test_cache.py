@@ -0,0 +1,56 @@
+import itertools
+
+from mmlu_bench import cache
+from mmlu_bench.cache import ResponseCache, cache_settings, response_key
+
+IDENTITY = {"model": "tiny", "revision": None, "tokenizer": ["tiny", "Fast", 300]}
+
+def _config(mode="generate", **generation):
+    return {
+        "evaluation": {"mode": mode},
+        "generation": {"max_new_tokens": 5, "do_sample": False, "batch_size": 8, **generation},
+        "prompt": {"fit_to_context": False}
+    }
+
+def test_key_covers_answer_settings_only():
+    settings = cache_settings(_config())
+    key = response_key(IDENTITY, "prompt", settings)
+    assert settings == {"mode": "generate", "generation": {"max_new_tokens": 5, "do_sample": False}}
+
+    # Batching and scheduling leave the key alone
+    for batching in ({"batch_size": 1}, {"prefix_cache": True}, {"pipeline": True, "pipeline_depth": 4}):
+        assert response_key(IDENTITY, "prompt", cache_settings(_config(**batching))) == key
+
+    assert response_key(IDENTITY, "other prompt", settings) != key
+    assert response_key({**IDENTITY, "revision": "abc"}, "prompt", settings) != key
+    assert response_key(IDENTITY, "prompt", cache_settings(_config(max_new_tokens=6))) != key
+    assert cache_settings(_config("loglikelihood")) == {"mode": "loglikelihood", "loglikelihood_scoring": "next_token"}
+    # Fitted prompts depend on the budget they were fitted to
+    assert cache_settings(_config(), prompt_budget=100) != cache_settings(_config(), prompt_budget=120)
+
+def test_hits_misses_refresh_and_eviction(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache.time, "time", lambda: next(clock))
+    path = tmp_path / "cache.sqlite"
+    response_cache = ResponseCache(path)
+    response_cache.put_many({"a": {"extracted_answer": "A"}, "b": {"extracted_answer": "B"}})
+    assert response_cache.get_many(["a", "c"]) == {"a": {"extracted_answer": "A"}}
+    assert (response_cache.hits, response_cache.misses) == (1, 1)
+    response_cache.close()
+
+    assert ResponseCache(path, refresh=True).get_many(["a", "b"]) == {}
+
+    # Each record is about 25 bytes; "b" was used least recently and goes first
+    small = ResponseCache(path, max_size_mb=60 / 2**20)
+    small.put_many({"d": {"extracted_answer": "D"}})
+    assert set(small.get_many(["a", "b", "d"])) == {"a", "d"}
+
+def test_second_run_is_served_from_cache(run_tiny, tmp_path):
+    response_cache = ResponseCache(tmp_path / "cache.sqlite")
+    first = run_tiny(response_cache=response_cache)
+    second = run_tiny(response_cache=response_cache)
+
+    assert not first["response_cache_hit"].any()
+    assert second["response_cache_hit"].all()
+    assert (second["raw_generated_text"] == first["raw_generated_text"]).all()
+    assert (second["extracted_answer"] == first["extracted_answer"]).all()
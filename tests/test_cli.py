@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ["torch", "transformers", "datasets"]
+
+def _run(*args):
+    return subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True, text=True)
+
+def test_cli_import_leaves_ml_libraries_unloaded():
+    probe = f"import sys, json, mmlu_bench.cli; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = _run("-c", probe)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+def test_invalid_config_exits_nonzero(tmp_path):
+    with open(REPO_ROOT / "config.yaml") as f:
+        config = yaml.safe_load(f)
+    config['generation']['batch_size'] = 0
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config))
+
+    for flags in ([], ["--validate_config"]):
+        result = _run("-m", "mmlu_bench.cli", "--config_path", str(config_path), *flags)
+        assert result.returncode == 1
+        assert "Invalid configuration" in result.stdout
+
+def test_validate_config_reports_malformed_sections():
+    from mmlu_bench.config import validate_config
+
+    with open(REPO_ROOT / "config.yaml") as f:
+        config = yaml.safe_load(f)
+    assert validate_config(config) == []
+
+    config['hardware']['cpu_mode'] = "dynamic_int8"
+    config['evaluation'] = ["wilson"]
+    errors = validate_config(config)
+    assert "hardware.cpu_mode must be a mapping, got 'dynamic_int8'" in errors
+    assert "evaluation must be a mapping, got ['wilson']" in errors
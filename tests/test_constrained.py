@@ -0,0 +1,23 @@
+import torch
+
+from mmlu_bench.generation import ANSWER_LETTERS, answer_token_variants, constrained_answer_batch
+
+def test_constrained_batch_returns_most_likely_letter(tiny_model):
+    model, tokenizer = tiny_model
+    prompts = ["Question: what is the mass?\nAnswer:", "Question: which acid is a base of the atom?\nAnswer:"]
+    batch_ids = [tokenizer(prompt)['input_ids'] for prompt in prompts]
+    variants = answer_token_variants(tokenizer)
+
+    for ids, (text, letter, _, timing) in zip(batch_ids, constrained_answer_batch(model, tokenizer, batch_ids)):
+        with torch.no_grad():
+            logits = model(input_ids=torch.tensor([ids])).logits[0, -1]
+        best = max(variants, key=lambda token: logits[token].item())
+        assert letter == variants[best]
+        assert text.strip() == letter
+        assert timing["output_tokens"] == 1
+
+def test_constrained_mode_always_answers_with_a_letter(run_tiny):
+    # The random model's free generations are rarely letters; constrained answers always are
+    results = run_tiny(evaluation={"mode": "constrained"})
+    assert results["extracted_answer"].isin(ANSWER_LETTERS).all()
+    assert (results["raw_generated_text"] == results["extracted_answer"]).all()
@@ -0,0 +1,23 @@
+import torch
+
+from mmlu_bench.cache import cache_settings
+from mmlu_bench.generation import ANSWER_LETTERS
+from mmlu_bench.utils import cpu_mode_label
+
+def _config(**cpu_mode):
+    return {"hardware": {"use_gpu": False, "dtype": "float32", "cpu_mode": cpu_mode}}
+
+def test_cpu_mode_label():
+    threads = torch.get_num_threads()
+    assert cpu_mode_label(_config()) == f"cpu-float32+threads{threads}"
+    assert cpu_mode_label(_config(quantize="dynamic_int8", compile=True)) == f"cpu-float32+dynamic_int8+compile+threads{threads}"
+
+def test_precision_modes_are_part_of_the_cache_key():
+    base = {"evaluation": {"mode": "constrained"}, "generation": {}}
+    assert "cpu_precision" not in cache_settings({**base, **_config(intra_op_threads=2, compile=True)})
+    assert cache_settings({**base, **_config(quantize="dynamic_int8")})["cpu_precision"] == {"quantize": "dynamic_int8"}
+
+def test_dynamic_int8_run(run_tiny):
+    results = run_tiny(hardware={"cpu_mode": {"quantize": "dynamic_int8"}}, evaluation={"mode": "constrained"})
+    assert results["cpu_mode"].str.contains("dynamic_int8").all()
+    assert results["extracted_answer"].isin(ANSWER_LETTERS).all()
@@ -0,0 +1,47 @@
+import pytest
+import torch
+
+from mmlu_bench.generation import ANSWER_LETTERS, answer_token_ids, score_choices_batch
+
+PROMPTS = ["Question: what is the mass of the atom?\nAnswer:", "Question: which force?\nAnswer:"]
+CHOICES = [["energy", "mass of a base", "the sum", "acid"], ["A value", "number", "the force of the atom", "B"]]
+
+def _log_probs(model, ids):
+    with torch.no_grad():
+        return torch.log_softmax(model(input_ids=torch.tensor([ids])).logits[0].float(), dim=-1)
+
+def _normalised(scores):
+    return torch.softmax(torch.tensor(scores), dim=-1).tolist()
+
+def test_next_token_scores_answer_letters(tiny_model):
+    model, tokenizer = tiny_model
+    batch_ids = [tokenizer(prompt)['input_ids'] for prompt in PROMPTS]
+    results = score_choices_batch(model, tokenizer, batch_ids)
+
+    letter_ids = list(answer_token_ids(tokenizer).values())
+    for ids, (predicted, probs, _, timing) in zip(batch_ids, results):
+        expected = _normalised(_log_probs(model, ids)[-1, letter_ids].tolist())
+        assert list(probs) == ANSWER_LETTERS
+        assert list(probs.values()) == pytest.approx(expected, abs=1e-5)
+        assert predicted == max(probs, key=probs.get)
+        assert timing["output_tokens"] == 0
+
+def test_continuation_scores_sum_choice_token_log_probs(tiny_model):
+    model, tokenizer = tiny_model
+    batch_ids = [tokenizer(prompt)['input_ids'] for prompt in PROMPTS]
+    results = score_choices_batch(model, tokenizer, batch_ids, CHOICES)
+
+    for ids, choices, (predicted, probs, _, _) in zip(batch_ids, CHOICES, results):
+        scores = []
+        for choice in choices:
+            continuation = tokenizer.encode(f" {choice}", add_special_tokens=False)
+            log_probs = _log_probs(model, ids + continuation)
+            scores.append(sum(log_probs[len(ids) - 1 + k, token].item() for k, token in enumerate(continuation)))
+        assert list(probs.values()) == pytest.approx(_normalised(scores), abs=1e-4)
+        assert predicted == ANSWER_LETTERS[max(range(len(scores)), key=scores.__getitem__)]
+
+def test_loglikelihood_mode_records_probabilities(run_tiny):
+    results = run_tiny(evaluation={"mode": "loglikelihood"})
+    probs = results[[f"prob_{letter}" for letter in ANSWER_LETTERS]]
+    assert probs.sum(axis=1).to_numpy() == pytest.approx(1.0)
+    assert (results["extracted_answer"] == probs.idxmax(axis=1).str[-1]).all()
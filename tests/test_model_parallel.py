@@ -0,0 +1,49 @@
+import json
+
+from mmlu_bench import core
+from mmlu_bench.benchmarks.fixtures import benchmark_config, synthetic_mmlu
+from mmlu_bench.evaluation import prepare_subset
+from mmlu_bench.model_workers import allocate_cores, load_shared_subset, write_shared_subset
+from mmlu_bench.utils import RESULTS_STREAM
+
+def _results(tiny_model_dir, tmp_path, monkeypatch, schedule):
+    tmp_path.mkdir()
+    monkeypatch.setattr(core, "load_benchmark_data", lambda subset, config: synthetic_mmlu(8))
+    config = benchmark_config(tiny_model_dir)
+    config['models'] = {
+        "first": {"name": str(tiny_model_dir), "display_name": "First"},
+        "second": {"name": str(tiny_model_dir), "display_name": "Second"}
+    }
+    config['evaluation']['schedule'] = schedule
+    config['output'].update({"results_dir": str(tmp_path), "results_store": False})
+    core.run_benchmark_pipeline(config, tmp_path)
+
+    rows = [json.loads(line) for line in (tmp_path / "synthetic" / RESULTS_STREAM).read_text().splitlines()]
+    return {(row["model_name"], row["sample_index"]): row for row in rows}
+
+def test_model_parallel_matches_subset_major(tiny_model_dir, tmp_path, monkeypatch):
+    sequential = _results(tiny_model_dir, tmp_path / "subset_major", monkeypatch, "subset_major")
+    parallel = _results(tiny_model_dir, tmp_path / "model_parallel", monkeypatch, "model_parallel")
+
+    assert sorted(parallel) == sorted(sequential)
+    assert {model for model, _ in parallel} == {"First", "Second"}
+    for key, row in sequential.items():
+        assert parallel[key]["raw_generated_text"] == row["raw_generated_text"]
+        assert parallel[key]["top1_accuracy"] == row["top1_accuracy"]
+
+def test_shared_subset_round_trip(tiny_model_dir, tmp_path):
+    config = benchmark_config(tiny_model_dir)
+    dataset = synthetic_mmlu(6)
+    prepared = prepare_subset(dataset, config, "synthetic")
+    write_shared_subset(tmp_path / "synthetic", dataset, prepared)
+    loaded_dataset, loaded = load_shared_subset(tmp_path / "synthetic")
+
+    assert loaded_dataset["question"] == dataset["question"]
+    assert loaded.prompt_parts == list(prepared.prompt_parts)
+    assert loaded.expected_letters == list(prepared.expected_letters)
+
+def test_allocate_cores_honours_pinned_models(monkeypatch):
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: {0, 1, 2, 3, 4, 5}, raising=False)
+    config = {"models": {"a": {"cores": [0]}, "b": {}, "c": {}}}
+
+    assert allocate_cores(config, ["a", "b", "c"]) == {"a": [0], "b": [1, 2], "c": [3, 4, 5]}
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from mmlu_bench.backends import OpenAIBackend
+
+def _prepared(texts):
+    return SimpleNamespace(prompt_parts=[SimpleNamespace(text=text, shot_indices=[]) for text in texts])
+
+def _config(mode="generate"):
+    return {
+        "evaluation": {"mode": mode},
+        "generation": {"max_new_tokens": 5, "do_sample": False, "temperature": 1.0}
+    }
+
+@pytest.fixture
+def stub_server():
+    """Starts an OpenAI-style stub server on the backend's event loop and returns the backend."""
+    started = []
+
+    def start(handler, **model_config):
+        backend = OpenAIBackend({"display_name": "Stub", "name": "stub", "base_url": "http://unused", **model_config}, {})
+        app = web.Application()
+        app.router.add_post("/v1/completions", handler)
+        server = TestServer(app)
+        backend.loop.run_until_complete(server.start_server())
+        backend.base_url = str(server.make_url("/v1"))
+        started.append((backend, server))
+        return backend
+
+    yield start
+    for backend, server in started:
+        backend.loop.run_until_complete(server.close())
+        backend.close()
+
+def _score(backend, texts, mode="generate"):
+    outputs = {}
+    for scored in backend.score(list(range(len(texts))), _prepared(texts), _config(mode), "stub"):
+        outputs.update(zip(scored.indices, scored.outputs))
+    return outputs
+
+def _completion(text, top_logprobs=None):
+    choice = {"text": text}
+    if top_logprobs is not None:
+        choice["logprobs"] = {"top_logprobs": [top_logprobs]}
+    return web.json_response({"choices": [choice], "usage": {"prompt_tokens": 7, "completion_tokens": 1}})
+
+def test_generate_success(stub_server):
+    async def handler(request):
+        body = await request.json()
+        return _completion(" The answer is " + body["prompt"][-1])
+
+    outputs = _score(stub_server(handler), ["Question 1 A", "Question 2 C"])
+    assert outputs[0]["extracted_answer"] == "A"
+    assert outputs[1]["extracted_answer"] == "C"
+    assert outputs[0]["request_attempts"] == 1
+    assert outputs[0]["input_tokens"] == 7
+
+def test_retries_after_429(stub_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return web.Response(status=429, text="slow down")
+        return _completion("B")
+
+    outputs = _score(stub_server(handler, retry_backoff_s=0.01), ["Question"])
+    assert len(calls) == 2
+    assert outputs[0]["request_attempts"] == 2
+    assert outputs[0]["extracted_answer"] == "B"
+
+def test_timeout_fails_after_retries(stub_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(1)
+        return _completion("A")
+
+    outputs = _score(stub_server(handler, timeout_s=0.1, max_retries=1, retry_backoff_s=0.01), ["Question"])
+    assert len(calls) == 2
+    assert isinstance(outputs[0], asyncio.TimeoutError)
+
+def test_constrained_picks_letters_from_top_logprobs(stub_server):
+    async def handler(request):
+        if (await request.json())["prompt"] == "letters":
+            return _completion(" the", {" the": -0.1, " B": -1.0, " C": -2.0})
+        return _completion(" E", {" E": -0.1, " the": -1.0})
+
+    outputs = _score(stub_server(handler), ["letters", "no letters"], mode="constrained")
+    assert outputs[0]["extracted_answer"] == "B"
+    assert outputs[0]["prob_B"] > outputs[0]["prob_C"] > 0
+    assert outputs[0]["prob_A"] == 0
+    # A token outside the answer letters is not recorded as an answer
+    assert outputs[1]["extracted_answer"] is None
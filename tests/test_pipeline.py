@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+from mmlu_bench.pipeline import Pipeline
+
+def test_pipeline_yields_results_in_order():
+    def slow_square(x):
+        time.sleep(0.001 * (x % 3))
+        return x * x
+
+    pipeline = Pipeline(range(20), [("square", slow_square), ("inc", lambda x: x + 1)], depth=2)
+    assert list(pipeline) == [x * x + 1 for x in range(20)]
+    assert [stage["items"] for stage in pipeline.summary()] == [20, 20, 20, 20]
+
+def test_pipeline_reraises_stage_errors():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    with pytest.raises(ValueError, match="bad item"):
+        list(Pipeline(range(10), [("check", fail_on_three)], depth=1))
+
+def test_pipelined_run_matches_sequential(run_tiny):
+    sequential = run_tiny(generation={"batch_size": 4, "pipeline": False})
+    piped = run_tiny(generation={"batch_size": 4, "pipeline": True, "pipeline_depth": 2})
+
+    assert (piped["raw_generated_text"] == sequential["raw_generated_text"]).all()
+    assert (piped["extracted_answer"] == sequential["extracted_answer"]).all()
+    assert piped["pipeline_queue_depth"].notna().all()
+    assert "pipeline_queue_depth" not in sequential or sequential["pipeline_queue_depth"].isna().all()
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from mmlu_bench.benchmarks.fixtures import benchmark_config, synthetic_mmlu
+from mmlu_bench.evaluation import run_benchmark
+from mmlu_bench.generation import shared_prefix_ids
+
+PROB_COLUMNS = ["prob_A", "prob_B", "prob_C", "prob_D"]
+
+def _run(model_dir, prefix_cache, num_shots, scoring):
+    config = benchmark_config(model_dir, batch_size=4)
+    config['prompt'].update({"fixed_shots": True, "num_shots": num_shots, "fit_to_context": False})
+    config['generation']['prefix_cache'] = prefix_cache
+    config['evaluation'].update({"mode": "loglikelihood", "loglikelihood_scoring": scoring})
+    random.seed(0)
+    return run_benchmark(synthetic_mmlu(30), config, "synthetic").sort_values("sample_index").reset_index(drop=True)
+
+def test_shared_prefix_ids_stops_at_first_differing_token():
+    assert shared_prefix_ids([1, 2, 3], [[1, 2, 4, 5], [1, 2, 3, 6]], 10) == (1, 2)
+    # The last token of every prompt stays out of the prefix
+    assert shared_prefix_ids([1, 2, 3], [[1, 2, 3]], 10) == (1, 2)
+    assert shared_prefix_ids([1, 2, 3], [[9, 2, 3]], 10) == ()
+    assert shared_prefix_ids([1, 2, 3], [[1, 2, 3, 4]], 3) == ()
+
+@pytest.mark.parametrize("scoring", ["next_token", "continuation"])
+@pytest.mark.parametrize("num_shots", [2, 25])
+def test_prefix_cache_matches_uncached_run(tiny_model_dir, scoring, num_shots):
+    # 25 shots fill the tiny model's 480-token window with the prefix alone
+    uncached = _run(tiny_model_dir, False, num_shots, scoring)
+    cached = _run(tiny_model_dir, True, num_shots, scoring)
+
+    for results in (uncached, cached):
+        assert "error" not in results or results["error"].isna().all()
+    assert (cached[PROB_COLUMNS] - uncached[PROB_COLUMNS]).abs().max().max() < 1e-4
+    assert (cached["extracted_answer"] == uncached["extracted_answer"]).all()
+    if num_shots == 2:
+        assert cached["prefix_cache_hit"].any()
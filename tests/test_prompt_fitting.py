@@ -0,0 +1,58 @@
+from mmlu_bench.generation import encode_prompts
+from mmlu_bench.prompting import MMLUPrompt, PromptFitter
+
+def _token_count(tokenizer, text):
+    return len(tokenizer(text)['input_ids'])
+
+def _prompts(blocks):
+    return {
+        0: MMLUPrompt("You are a helpful assistant.\n\n", "".join(blocks[1:4]), "Question: what is the sum?\nAnswer:", (1, 2, 3)),
+        1: MMLUPrompt("You are a helpful assistant.\n\n", "".join(blocks[2:4]), "Question: which atom?\nAnswer:", (2, 3))
+    }
+
+BLOCKS = [f"Question: what is the value of {word} mass energy?\nAnswer: {letter}\n\n" for word, letter in
+          zip(["atom", "acid", "base", "force"], "ABCD")]
+
+def test_fitter_keeps_prompts_that_fit(tiny_model):
+    _, tokenizer = tiny_model
+    prompts = _prompts(BLOCKS)
+    fitted = PromptFitter(tokenizer, BLOCKS, budget=10_000).fit(prompts)
+
+    assert all(fitted[i] is prompts[i] for i in prompts)
+
+def test_fitter_drops_shots_from_the_end(tiny_model):
+    _, tokenizer = tiny_model
+    prompts = _prompts(BLOCKS)
+    with_one_shot = MMLUPrompt(prompts[0].instructions, BLOCKS[1], prompts[0].question, (1,))
+    budget = _token_count(tokenizer, with_one_shot.text) + 2
+    fitted = PromptFitter(tokenizer, BLOCKS, budget).fit(prompts)
+
+    assert fitted[0] == with_one_shot
+    assert fitted[1].shot_indices == (2,)
+    assert all(_token_count(tokenizer, parts.text) <= budget for parts in fitted.values())
+
+def test_fitter_reports_prompts_that_overflow_without_shots(tiny_model, capsys):
+    _, tokenizer = tiny_model
+    fitted = PromptFitter(tokenizer, BLOCKS, budget=5).fit(_prompts(BLOCKS))
+
+    assert all(parts.shot_indices == () and parts.shots == "" for parts in fitted.values())
+    assert "2 prompts are longer than the 5 tokens" in capsys.readouterr().out
+
+def test_encode_prompts_keeps_the_last_tokens(tiny_model):
+    _, tokenizer = tiny_model
+    text = "Question: what is the value of atom mass energy?\nAnswer:"
+    full = encode_prompts(tokenizer, [text])[0]
+
+    assert encode_prompts(tokenizer, [text], max_length=4) == [full[-4:]]
+    assert encode_prompts(tokenizer, [text], max_length=len(full) + 10) == [full]
+
+def test_fitted_run_stays_within_the_context_window(run_tiny, tiny_model_dir):
+    window = 120
+    results = run_tiny(
+        models={"tiny": {"name": str(tiny_model_dir), "display_name": "Tiny-Random", "context_window": window}},
+        prompt={"fit_to_context": True}
+    )
+
+    assert "error" not in results or results["error"].isna().all()
+    assert (results["input_tokens"] <= window - 5).all()
+    assert (results["effective_shots"] < results["num_shots"]).any()
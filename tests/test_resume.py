@@ -0,0 +1,50 @@
+import json
+
+from mmlu_bench import core
+from mmlu_bench.benchmarks.fixtures import benchmark_config, synthetic_mmlu
+from mmlu_bench.utils import RESULTS_STREAM, ResultsWriter, completed_samples
+
+def _stream_rows(path):
+    # A line cut short by the interruption stays in the stream and is skipped by readers
+    return [json.loads(line) for line in path.read_text().splitlines() if line.endswith("}")]
+
+def test_completed_samples_skip_errors_and_cut_lines(tmp_path):
+    writer = ResultsWriter(tmp_path / "s1" / RESULTS_STREAM)
+    writer.write([
+        {"model_name": "m", "dataset_subset": "s1", "sample_index": 0},
+        {"model_name": "m", "dataset_subset": "s1", "sample_index": 1, "error": "out of memory"}
+    ])
+    writer.close()
+    with open(tmp_path / "s1" / RESULTS_STREAM, "a") as f:
+        f.write('{"model_name": "m", "dataset_sub')
+
+    assert completed_samples(tmp_path, ["s1"]) == {("m", "s1", 0)}
+    # A reopened writer starts on a fresh line after the cut one
+    writer = ResultsWriter(tmp_path / "s1" / RESULTS_STREAM)
+    writer.write([{"model_name": "m", "dataset_subset": "s1", "sample_index": 2}])
+    writer.close()
+    assert completed_samples(tmp_path, ["s1"]) == {("m", "s1", 0), ("m", "s1", 2)}
+
+def test_resume_runs_only_missing_and_failed_samples(tiny_model_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "load_benchmark_data", lambda subset, config: synthetic_mmlu(10))
+    config = benchmark_config(tiny_model_dir)
+    config['output'].update({"results_dir": str(tmp_path), "results_store": False})
+    stream = tmp_path / "synthetic" / RESULTS_STREAM
+
+    core.run_benchmark_pipeline(config, tmp_path)
+    full = {row["sample_index"]: row for row in _stream_rows(stream)}
+    assert sorted(full) == list(range(10))
+
+    # Interrupted after four rows, one of which failed, in the middle of a fifth
+    kept = stream.read_text().splitlines()[:4]
+    failed = json.loads(kept[1])
+    failed["error"] = "out of memory"
+    kept[1] = json.dumps(failed)
+    stream.write_text("\n".join(kept) + "\n" + kept[2][:30])
+
+    core.run_benchmark_pipeline(config, tmp_path, resume=True)
+    rows = _stream_rows(stream)[4:]
+    rerun = sorted(row["sample_index"] for row in rows)
+    assert rerun == sorted(set(range(10)) - {json.loads(line)["sample_index"] for line in kept[:4]} | {failed["sample_index"]})
+    for row in rows:
+        assert row["raw_generated_text"] == full[row["sample_index"]]["raw_generated_text"]
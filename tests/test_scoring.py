@@ -0,0 +1,40 @@
+import json
+
+import pandas as pd
+
+from mmlu_bench.benchmarks.fixtures import synthetic_generations
+from mmlu_bench.scoring import extract_answer, extract_answers, rescore_stream, score_answers
+
+EDGE_CASES = ["", "   ", "b", "the answer is c", "c. because", "Maybe D.", "none of these", "E", "\nA", "answer: b"]
+
+def test_extract_answers_matches_extract_answer():
+    texts = synthetic_generations(500) + EDGE_CASES
+    expected = [extract_answer(text) for text in texts]
+
+    assert extract_answers(texts).tolist() == expected
+    assert extract_answers(pd.Series(texts)).tolist() == expected
+
+def test_extract_answers_keeps_nulls_and_index():
+    texts = pd.Series(["The answer is B", None, "C."], index=[10, 11, 12])
+    answers = extract_answers(texts)
+
+    assert list(answers.index) == [10, 11, 12]
+    assert answers[10] == "B" and answers[11] is None and answers[12] == "C"
+
+def test_score_answers():
+    scores = score_answers(["a ", "B", None, "D"], ["A", "C", "C", "D"])
+    assert scores.tolist() == [1, 0, 0, 1]
+
+def test_rescore_stream(tmp_path):
+    rows = [
+        {"raw_generated_text": "The answer is B", "extracted_answer": "X", "expected_answer": "B", "top1_accuracy": 0, "error": None},
+        {"raw_generated_text": "A.", "extracted_answer": "A", "expected_answer": "C", "top1_accuracy": 0, "error": None},
+        {"raw_generated_text": None, "extracted_answer": None, "expected_answer": "C", "top1_accuracy": None, "error": "boom"}
+    ]
+    path = tmp_path / "results.jsonl"
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows) + '{"cut', encoding="utf-8")
+    config = {"dataset": {"name": "mmlu"}, "evaluation": {"mode": "generate"}}
+
+    assert rescore_stream(path, config, chunk_rows=2) == 1
+    rescored = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(row["extracted_answer"], row["top1_accuracy"]) for row in rescored] == [("B", 1), ("A", 0), (None, None)]
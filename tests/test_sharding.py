@@ -0,0 +1,35 @@
+import json
+
+from mmlu_bench.benchmarks.fixtures import benchmark_config
+from mmlu_bench.sharding import merge_runs
+from mmlu_bench.utils import RESULTS_STREAM, save_config_snapshot
+
+def _row(sample_index):
+    return {
+        "model_name": "Tiny-Random", "dataset_subset": "synthetic", "sample_index": sample_index,
+        "top1_accuracy": sample_index % 2, "inference_time_s": 0.1, "expected_answer": "A"
+    }
+
+def test_merge_runs_writes_strict_jsonl(tmp_path):
+    config = benchmark_config(tmp_path / "model")
+    config['output']['results_store'] = False
+    shard_lines = [
+        [json.dumps(_row(0)) + "\n", json.dumps(_row(1)) + "\n"],
+        # Cut off after its last row, before the newline
+        [json.dumps(_row(2)) + "\n", json.dumps(_row(3))],
+        [json.dumps(_row(4)) + "\n"]
+    ]
+    shard_dirs = []
+    for index, lines in enumerate(shard_lines):
+        shard_dir = tmp_path / "shards" / f"shard_{index}"
+        (shard_dir / "synthetic").mkdir(parents=True)
+        save_config_snapshot(config, shard_dir)
+        (shard_dir / "synthetic" / RESULTS_STREAM).write_text("".join(lines))
+        shard_dirs.append(shard_dir)
+
+    merge_runs(tmp_path, shard_dirs)
+
+    merged = (tmp_path / "synthetic" / RESULTS_STREAM).read_text()
+    assert merged.endswith("\n")
+    lines = merged.split("\n")[:-1]
+    assert [json.loads(line)["sample_index"] for line in lines] == [0, 1, 2, 3, 4]
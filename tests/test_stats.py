@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from mmlu_bench import core
+from mmlu_bench.benchmarks.fixtures import benchmark_config, synthetic_mmlu
+from mmlu_bench.stats import accuracy_intervals, bootstrap_intervals, intervals_separated, wilson_interval
+from mmlu_bench.utils import RESULTS_STREAM
+
+def test_wilson_interval():
+    assert wilson_interval(50, 100) == pytest.approx((0.4038, 0.5962), abs=1e-4)
+    assert wilson_interval(0, 10) == pytest.approx((0.0, 0.2775), abs=1e-4)
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+def test_bootstrap_intervals():
+    low, high = bootstrap_intervals([30, 0, 20], [60, 32, 20], seed=0)
+    assert low[0] < 0.5 < high[0]
+    assert (high[0] - low[0]) / 2 == pytest.approx(0.126, abs=0.03)
+    # All wrong or all right would resample to a single value; these get Wilson intervals
+    wilson_low, wilson_high = accuracy_intervals([0, 20], [32, 20], method='wilson')
+    np.testing.assert_allclose([low[1:], high[1:]], [wilson_low, wilson_high])
+    assert (high - low > 0).all()
+    np.testing.assert_array_equal(low, bootstrap_intervals([30, 0, 20], [60, 32, 20], seed=0)[0])
+
+def test_intervals_separated():
+    assert intervals_separated({"a": (0.1, 0.3), "b": (0.4, 0.6), "c": (0.7, 0.9)})
+    assert not intervals_separated({"a": (0.1, 0.5), "b": (0.4, 0.6)})
+
+def test_adaptive_chunks_grow():
+    assert [len(chunk) for chunk in core._adaptive_chunks(list(range(100)), 8, 2.0)] == [8, 16, 32, 44]
+
+@pytest.mark.parametrize("target, expected_rows", [(0.5, 8), (0.0, 40)])
+def test_adaptive_run_stops_at_target_half_width(tiny_model_dir, tmp_path, monkeypatch, target, expected_rows):
+    monkeypatch.setattr(core, "load_benchmark_data", lambda subset, config: synthetic_mmlu(40))
+    config = benchmark_config(tiny_model_dir)
+    config['output'].update({"results_dir": str(tmp_path), "results_store": False})
+    config['evaluation'].update({
+        "adaptive": True,
+        "adaptive_initial_samples": 8,
+        "adaptive_target_half_width": target,
+        "interval_method": "bootstrap"
+    })
+
+    core.run_benchmark_pipeline(config, tmp_path)
+    rows = (tmp_path / "synthetic" / RESULTS_STREAM).read_text().splitlines()
+    assert len(rows) == expected_rows
+
+def test_accuracy_counts_pass_rows_on():
+    written = []
+    writer = type("Writer", (), {"write": lambda self, rows: written.extend(rows), "flush": lambda self: None})()
+    counts = core._AccuracyCounts(writer)
+    counts.write([
+        {"model_name": "a", "top1_accuracy": 1},
+        {"model_name": "a", "top1_accuracy": None, "error": "out of memory"},
+        {"model_name": "b", "top1_accuracy": 0}
+    ])
+    assert len(written) == 3
+    assert (counts.correct["a"], counts.total["a"], counts.correct["b"], counts.total["b"]) == (1, 2, 0, 1)
+
+def test_all_wrong_first_chunk_is_not_precise_enough():
+    # 32 wrong answers used to give a zero-width bootstrap interval and stop adaptive runs at once
+    low, high = accuracy_intervals([0], [32], method='bootstrap', seed=0)
+    assert (high[0] - low[0]) / 2 > 0.05